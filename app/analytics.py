@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import Date, Integer, cast, func, select
+from sqlalchemy.orm import Session
+
+from app import deletes, etags, hierarchy, models
+
+# Trend and anomaly scoring of many metrics at once. The daily rollups of
+# the last `days` days are loaded with one query into a dense
+# (metrics x days) matrix of daily averages, NaN where a metric has no
+# result that day, and every statistic is computed on the whole matrix with
+# NumPy, no per-metric Python loop:
+#
+#   - rolling mean and standard deviation over the trailing `window` days,
+#     from cumulative sums (missing days are skipped, not counted as zeros)
+#   - z-score of each day against the window before it, a day being an
+#     anomaly when |z| exceeds the threshold
+#   - least squares slope over the last `window` days, and the days until
+#     the fitted line reaches limit_threshold (in the metric's direction,
+#     see snapshots.breach_status)
+#
+# Scores are cached per worker under the change counters of the results
+# and the metrics (etags.RESULTS), so they are recomputed only once new
+# results or threshold changes arrive (or the day changes).
+
+MIN_POINTS = 5  # Observed days needed in a window for a z-score or a slope
+CACHE_ENTRIES = 32  # Parameter combinations kept per worker
+
+_cache = OrderedDict()  # parameters -> (version, scores)
+_cache_lock = threading.Lock()
+
+
+def _day_index(dialect_name, column, start):
+    """SQL expression of the day number of a timestamp column counted from `start` (a date)."""
+    if dialect_name == "postgresql":
+        return cast(column, Date) - start
+    return cast(func.julianday(func.date(column)) - func.julianday(start.isoformat()), Integer)
+
+
+def _metrics(risk_type_id=None, business_unit_id=None):
+    """Select of the scored metrics, optionally within a risk type / business unit subtree."""
+    query = select(
+        models.Metric.id, models.Metric.name, models.Metric.warning_threshold, models.Metric.limit_threshold
+    ).where(models.Metric.status != deletes.DELETING)
+    if risk_type_id is not None:
+        tree = hierarchy.subtree(models.RiskType, risk_type_id)
+        query = query.where(models.Metric.risk_type_id.in_(select(tree.c.id)))
+    if business_unit_id is not None:
+        tree = hierarchy.subtree(models.BusinessUnit, business_unit_id)
+        query = query.where(models.Metric.business_unit_id.in_(select(tree.c.id)))
+    return query
+
+
+def load_matrix(db: Session, metric_ids, metric_query, start, days):
+    """Daily averages of the metrics as a (len(metric_ids), days) array, NaN for no data.
+
+    metric_ids are the sorted ids returned by metric_query, a select of the metrics.
+    """
+    matrix = np.full((len(metric_ids), days), np.nan)
+    if not metric_ids:
+        return matrix
+    daily = models.MetricRollupDaily
+    day = _day_index(db.bind.dialect.name, daily.bucket, start)
+    ids = np.asarray(metric_ids)
+    # On the connection, the ORM's row processing would double the fetch time
+    result = db.connection().execute(
+        select(daily.metric_id, day, daily.sum / daily.count)
+        .where(daily.bucket >= datetime.combine(start, datetime.min.time()), daily.metric_id.in_(metric_query.with_only_columns(models.Metric.id)))
+    )
+    for rows in result.partitions(100000):
+        # Columns as tuples first, numpy is slow at converting Row objects
+        row_ids, columns, values = (np.asarray(column) for column in zip(*rows))
+        columns = columns.astype(int)
+        inside = (columns >= 0) & (columns < days)
+        matrix[np.searchsorted(ids, row_ids[inside]), columns[inside]] = values[inside].astype(float)
+    return matrix
+
+
+def _trailing(cumulative, window):
+    """Sums over the `window` columns ending at each column (inclusive), from cumulative sums."""
+    padded = np.concatenate([np.zeros((cumulative.shape[0], 1)), cumulative], axis=1)
+    starts = np.maximum(np.arange(1, padded.shape[1]) - window, 0)
+    return padded[:, 1:] - padded[:, starts]
+
+
+def rolling_stats(matrix, window):
+    """Rolling (count, mean, sample std) over the trailing window of each day, NaN days skipped."""
+    observed = ~np.isnan(matrix)
+    values = np.where(observed, matrix, 0.0)
+    count = _trailing(np.cumsum(observed, axis=1, dtype=float), window)
+    total = _trailing(np.cumsum(values, axis=1), window)
+    squares = _trailing(np.cumsum(values * values, axis=1), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        variance = (squares - count * mean * mean) / (count - 1)
+    return count, mean, np.sqrt(np.clip(variance, 0.0, None))
+
+
+def zscores(matrix, window):
+    """Z-score of every observed day against the `window` days before it (NaN without enough history)."""
+    count, mean, std = rolling_stats(matrix, window)
+    # Shift by one day so a value isn't part of its own baseline
+    count, mean, std = (np.roll(array, 1, axis=1) for array in (count, mean, std))
+    count[:, 0] = 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = (matrix - mean) / std
+    scores[(count < MIN_POINTS) | ~(std > 0)] = np.nan
+    return scores
+
+
+def slopes(matrix, window):
+    """Least squares (slope per day, fitted value on the last day) over the last `window` days."""
+    recent = matrix[:, -window:]
+    observed = ~np.isnan(recent)
+    x = np.broadcast_to(np.arange(matrix.shape[1] - recent.shape[1], matrix.shape[1], dtype=float), recent.shape)
+    y = np.where(observed, recent, 0.0)
+    x = np.where(observed, x, 0.0)
+    n = observed.sum(axis=1).astype(float)
+    sum_x, sum_y = x.sum(axis=1), y.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * (x * y).sum(axis=1) - sum_x * sum_y) / (n * (x * x).sum(axis=1) - sum_x * sum_x)
+        intercept = (sum_y - slope * sum_x) / n
+    slope[n < MIN_POINTS] = np.nan
+    return slope, intercept + slope * (matrix.shape[1] - 1)
+
+
+def days_to_breach(latest, fitted, slope, warning, limit):
+    """Days until the trend reaches the limit, 0 if already there, NaN if not heading there."""
+    lower_is_worse = limit < warning  # False when either threshold is NaN
+    breached = np.where(lower_is_worse, latest <= limit, latest >= limit)
+    heading = np.where(lower_is_worse, slope < 0, slope > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        days = np.maximum((limit - fitted) / slope, 0.0)
+    return np.where(breached, 0.0, np.where(heading, days, np.nan))
+
+
+def _value(number, digits=4):
+    return None if np.isnan(number) else round(float(number), digits)
+
+
+def score(db: Session, days=365, window=30, z_threshold=3.0, horizon=90, risk_type_id=None, business_unit_id=None, today=None):
+    """Trend and anomaly scores of every metric with results in the last `days` days."""
+    today = today or datetime.now().date()
+    start = today - timedelta(days=days - 1)
+    metric_query = _metrics(risk_type_id, business_unit_id)
+    metrics = db.execute(metric_query.order_by(models.Metric.id)).all()
+    matrix = load_matrix(db, [metric.id for metric in metrics], metric_query, start, days)
+
+    observed = ~np.isnan(matrix)
+    has_data = observed.any(axis=1)
+    last = days - 1 - np.argmax(observed[:, ::-1], axis=1)  # Last observed day of each metric
+    rows = np.arange(len(metrics))
+    latest = matrix[rows, last]
+
+    _, mean, std = rolling_stats(matrix, window)
+    z = zscores(matrix, window)
+    anomalous = np.abs(np.nan_to_num(z[:, -window:])) > z_threshold
+    slope, fitted = slopes(matrix, window)
+    warning = np.array([np.nan if metric.warning_threshold is None else metric.warning_threshold for metric in metrics])
+    limit = np.array([np.nan if metric.limit_threshold is None else metric.limit_threshold for metric in metrics])
+    to_breach = days_to_breach(latest, fitted, slope, warning, limit)
+
+    scores = []
+    for i in np.flatnonzero(has_data):
+        latest_z = z[i, last[i]]
+        scores.append(dict(
+            metric_id=metrics[i].id,
+            name=metrics[i].name,
+            points=int(observed[i].sum()),
+            latest_value=_value(latest[i]),
+            latest_at=datetime.combine(start + timedelta(days=int(last[i])), datetime.min.time()),
+            rolling_mean=_value(mean[i, last[i]]),
+            rolling_std=_value(std[i, last[i]]),
+            zscore=_value(latest_z, 3),
+            anomaly=bool(abs(latest_z) > z_threshold) if not np.isnan(latest_z) else False,
+            anomalies=int(anomalous[i].sum()),
+            slope_per_day=_value(slope[i], 6),
+            days_to_breach=_value(to_breach[i], 1),
+            at_risk=bool(to_breach[i] <= horizon) if not np.isnan(to_breach[i]) else False,
+        ))
+    # Closest to a breach first, then the strongest anomalies
+    scores.sort(key=lambda row: (
+        row["days_to_breach"] if row["days_to_breach"] is not None else float("inf"),
+        -abs(row["zscore"] or 0.0),
+    ))
+    return scores
+
+
+def cached_score(db: Session, **params):
+    """score(), cached until results or metrics change (or the day does)."""
+    params["today"] = params.get("today") or datetime.now().date()
+    key = tuple(sorted(params.items()))
+    version = etags.current(db, etags.RESULTS)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            _cache.move_to_end(key)
+            return entry[1]
+    scores = score(db, **params)
+    with _cache_lock:
+        _cache[key] = (version, scores)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return scores
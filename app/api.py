@@ -1,70 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app import models, schemas
+from app.database import get_db, get_read_db, pool_stats
+from app.notifications import notifier
+from app import models, schemas, cache, etags, instrumentation, hierarchy, risk_engine, breaches, queries, snapshots, rollups, ingest, export, pagination, serialization, timeseries, deletes, imports, analytics, events, search, history, jobs, reports, report_rendering, config
 from datetime import datetime
+from typing import Literal, Optional
+import os
+import tempfile
 
 router = APIRouter()
 
+RESULTS_PAGE_SIZE = 1000  # Default page size of GET /results/
+RESULTS_MAX_PAGE_SIZE = 10000
+
+def _get_metric_response(db: Session, id: int):
+    row = db.execute(queries.metric_rows().where(models.Metric.id == id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    return serialization.json_response(serialization.metric_row(row), schemas.MetricResponse)
+
 # Create a metric
 @router.post("/metrics/", response_model=schemas.MetricResponse)
 def create_metric(metric: schemas.MetricCreate, db: Session = Depends(get_db)):
     new_metric = models.Metric(**metric.model_dump())
     db.add(new_metric)
-    db.commit()
-    db.refresh(new_metric)
-    return new_metric
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A metric with this name already exists")
+    return _get_metric_response(db, new_metric.id)
 
-# Get all metrics
+# Get all metrics, or as they were at a past time (as_of: definitions, thresholds, latest values then)
 @router.get("/metrics/", response_model=list[schemas.MetricResponse])
-def get_metrics(db: Session = Depends(get_db)):
-    metrics = db.query(models.Metric).all()
-    return [schemas.MetricResponse(
-        id=metric.id,
-        name=metric.name,
-        type=metric.type,
-        level=metric.level,
-        description=metric.description,
-        unit=metric.unit,
-        status=metric.status,
-        warning_threshold=metric.warning_threshold,
-        limit_threshold=metric.limit_threshold,
-        risk_type_id=metric.risk_type_id,
-        risk_type=metric.risk_type.name if metric.risk_type.name else None ,
-        business_unit_id=metric.business_unit_id,
-        business_unit=metric.business_unit.name if metric.business_unit.name else None ,
-        latest_value=metric.latest_value if metric.latest_value is not None else 0.0,
-        created_by=metric.created_by,
-        created_at=metric.created_at,
-        updated_at=metric.updated_at
-    ) for metric in metrics]
+def get_metrics(request: Request, response: Response, as_of: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    not_modified = etags.not_modified(db, request, response, etags.METRICS)
+    if not_modified:
+        return not_modified
+    if as_of is not None:
+        rows = db.execute(history.metric_rows(as_of, db.bind.dialect.name))
+    else:
+        rows = db.execute(queries.metric_rows().order_by(models.Metric.id))
+    return serialization.json_response([serialization.metric_row(row) for row in rows], list[schemas.MetricResponse], response)
 
-# Get a single metric by ID
+# Search metrics by text (name, description) and filters, with facet counts and keyset pagination
+# (declared before /metrics/{id} so "search" isn't taken for an id)
+@router.get("/metrics/search", response_model=schemas.MetricSearchResponse)
+def search_metrics(
+    request: Request,
+    response: Response,
+    q: Optional[str] = Query(None, max_length=200),
+    type: Optional[list[str]] = Query(None),
+    level: Optional[list[int]] = Query(None),
+    status: Optional[list[str]] = Query(None),
+    unit: Optional[list[str]] = Query(None),
+    created_by: Optional[list[str]] = Query(None),
+    risk_type_id: Optional[int] = None,  # With its descendants
+    business_unit_id: Optional[int] = None,  # With its descendants
+    breach_status: Optional[list[Literal["ok", "warning", "breach", "no_data"]]] = Query(None),
+    sort: Optional[Literal["relevance", "name", "created_at", "updated_at", "id"]] = None,
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    facets: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    not_modified = etags.not_modified(db, request, response, etags.METRICS)
+    if not_modified:
+        return not_modified
+    filters = dict(
+        type=type, level=level, status=status, unit=unit, created_by=created_by,
+        risk_type_id=risk_type_id, business_unit_id=business_unit_id, breach_status=breach_status,
+    )
+    try:
+        items, next_cursor = search.search(db, q, filters, sort, order, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    content = {"items": items, "next_cursor": next_cursor, "total": None, "facets": None}
+    if facets:
+        content["total"], content["facets"] = search.facets(db, q, filters)
+    return serialization.json_response(content, schemas.MetricSearchResponse, response)
+
+# Get a single metric by ID, optionally as it was at a past time
 @router.get("/metrics/{id}", response_model=schemas.MetricResponse)
-def get_metric(id: int, db: Session = Depends(get_db)):
-    metric = db.query(models.Metric).filter(models.Metric.id == id).first()
-    if metric is None:
+def get_metric(id: int, request: Request, response: Response, as_of: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    not_modified = etags.not_modified(db, request, response, etags.METRICS)
+    if not_modified:
+        return not_modified
+    if as_of is not None:
+        row = db.execute(history.metric_rows(as_of, db.bind.dialect.name, metric_id=id)).first()
+    else:
+        row = db.execute(queries.metric_rows().where(models.Metric.id == id)).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Metric not found")
-    
-    return schemas.MetricResponse(
-        id=metric.id,
-        name=metric.name,
-        type=metric.type,
-        level=metric.level,
-        description=metric.description,
-        unit=metric.unit,
-        status=metric.status,
-        warning_threshold=metric.warning_threshold,
-        limit_threshold=metric.limit_threshold,
-        risk_type_id=metric.risk_type_id,
-        risk_type=metric.risk_type.name if metric.risk_type.name else None ,
-        business_unit_id=metric.business_unit_id,
-        business_unit=metric.business_unit.name if metric.business_unit.name else None ,
-        latest_value=metric.latest_value if metric.latest_value is not None else 0.0,
-        created_by=metric.created_by,
-        created_at=metric.created_at,
-        updated_at=metric.updated_at
-    )
+    return serialization.json_response(serialization.metric_row(row), schemas.MetricResponse, response)
+
+# Get every recorded version of a metric (definition and thresholds), oldest first
+@router.get("/metrics/{id}/versions", response_model=list[schemas.MetricVersionResponse])
+def get_metric_versions(id: int, db: Session = Depends(get_read_db)):
+    versions = db.execute(history.metric_versions(id)).all()
+    if not versions:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    return versions
 
 # Update a metric
 @router.put("/metrics/{id}", response_model=schemas.MetricResponse)
@@ -74,19 +115,32 @@ def update_metric(id: int, updated_metric: schemas.MetricUpdate, db: Session = D
         raise HTTPException(status_code=404, detail="Metric not found")
     for key, value in updated_metric.model_dump(exclude_unset=True).items():
         setattr(metric, key, value)
-    db.commit()
-    db.refresh(metric)
-    return metric
+    snapshots.refresh_breach_status(metric)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="A metric with this name already exists")
+    return _get_metric_response(db, id)
 
 # Delete a metric
 @router.delete("/metrics/{id}")
-def delete_metric(id: int, db: Session = Depends(get_db)):
+def delete_metric(id: int, response: Response, db: Session = Depends(get_db)):
     metric = db.query(models.Metric).filter(models.Metric.id == id).first()
     if metric is None:
         raise HTTPException(status_code=404, detail="Metric not found")
-    db.delete(metric)
+    if metric.status == deletes.DELETING:
+        raise HTTPException(status_code=409, detail="Metric is already being deleted")
+
+    # Small histories are deleted right away, large ones by a background job (see app/deletes.py)
+    if deletes.result_count(db, id, config.DELETE_INLINE_MAX_RESULTS) <= config.DELETE_INLINE_MAX_RESULTS:
+        deletes.delete_metric(db, id)
+        db.commit()
+        return {"message": "Metric deleted successfully"}
+    job = deletes.start_metric_deletion(db, metric)
     db.commit()
-    return {"message": "Metric deleted successfully"}
+    response.status_code = 202
+    return {"message": "Metric deletion started", "job_id": job.id}
 
 
 
@@ -99,6 +153,8 @@ def create_metric_result_for_specific_metric(result: schemas.MetricResultCreate,
     metric = db.query(models.Metric).filter(models.Metric.id == metric_id).first()
     if not metric:
         raise HTTPException(status_code=404, detail="Metric not found")
+    if metric.status == deletes.DELETING:
+        raise HTTPException(status_code=409, detail="Metric is being deleted")
 
     # Create a new MetricResult using the result data
     new_result = models.MetricResult(
@@ -108,27 +164,76 @@ def create_metric_result_for_specific_metric(result: schemas.MetricResultCreate,
 
     )
     db.add(new_result)
+    db.flush()
+    db.refresh(new_result)  # Load the server-side uploaded_at
+    snapshots.record_result(db, metric, new_result)
+    rollups.add_result(db, new_result)
     db.commit()
     db.refresh(new_result)
 
     return new_result
 
-# Get all results for a specific metric
+# Create many metric results at once (JSON array, NDJSON or CSV body)
+@router.post("/results/bulk", response_model=schemas.BulkIngestResponse)
+async def create_metric_results_in_bulk(request: Request, db: Session = Depends(get_db)):
+    fmt = ingest.body_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Use application/json, application/x-ndjson or text/csv")
+
+    # Spool the upload, it is then parsed as a stream (a JSON array one element at a time), not held in memory
+    with tempfile.SpooledTemporaryFile(max_size=ingest.SPOOL_SIZE) as body:
+        async for data in request.stream():
+            body.write(data)
+        body.seek(0)
+        try:
+            return await run_in_threadpool(ingest.ingest, db, fmt, body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+# Get all results for a specific metric, or the ones recorded at a past time (as_of)
 @router.get("/metrics/{metric_id}/results/", response_model=list[schemas.MetricResultResponse])
-def get_all_metric_results_for_specific_metric(metric_id: int, db: Session = Depends(get_db)):
-    results = db.query(models.MetricResult).filter(models.MetricResult.metric_id == metric_id).order_by(models.MetricResult.uploaded_at.desc()).all()
+def get_all_metric_results_for_specific_metric(metric_id: int, as_of: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    if as_of is not None:
+        results = db.execute(history.metric_results(as_of, metric_id)).all()
+    else:
+        results = db.scalars(queries.metric_results(metric_id)).all()
     if not results:
         raise HTTPException(status_code=404, detail="No results found for this metric")
     return results
 
-# Get the latest result for a specific metric
+# Get the latest result for a specific metric, optionally as of a past time
 @router.get("/metrics/{metric_id}/results/latest/", response_model=schemas.MetricResultResponse)
-def get_latest_metric_result_for_specific_metric(metric_id: int, db: Session = Depends(get_db)):
-    latest_result = db.query(models.MetricResult).filter(models.MetricResult.metric_id == metric_id).order_by(models.MetricResult.uploaded_at.desc()).first()
+def get_latest_metric_result_for_specific_metric(metric_id: int, as_of: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    if as_of is not None:
+        latest_result = db.execute(history.metric_results(as_of, metric_id).limit(1)).first()
+    else:
+        latest_result = db.scalars(queries.latest_metric_result(metric_id, db.bind.dialect.name)).first()
     if not latest_result:
         raise HTTPException(status_code=404, detail="No results found for this metric")
     return latest_result
 
+# Get a metric's results aggregated per time bucket, reduced to at most `points` buckets
+@router.get("/metrics/{metric_id}/results/aggregate/", response_model=schemas.MetricResultSeries)
+def get_aggregated_metric_results_for_specific_metric(
+    metric_id: int,
+    bucket: Optional[Literal["minute", "hour", "day", "month"]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: Optional[int] = Query(None, ge=3, le=10000),
+    db: Session = Depends(get_read_db),
+):
+    if bucket is None:
+        points = points or timeseries.DEFAULT_POINTS
+        bucket = timeseries.choose_bucket(db, metric_id, start, end, points)
+    buckets = timeseries.aggregate(db, metric_id, bucket, start, end)
+    if not buckets:
+        raise HTTPException(status_code=404, detail="No results found for this metric")
+
+    downsampled = points is not None and len(buckets) > points
+    if downsampled:
+        buckets = timeseries.lttb(buckets, points, x=lambda b: b["bucket"].timestamp(), y=lambda b: b["avg"])
+    return schemas.MetricResultSeries(metric_id=metric_id, bucket=bucket, downsampled=downsampled, points=buckets)
+
 # Update a specific metric result
 @router.put("/results/{result_id}", response_model=schemas.MetricResultResponse)
 def update_specific_metric_result(result_id: int, updated_result: schemas.MetricResultUpdate, db: Session = Depends(get_db)):
@@ -136,11 +241,15 @@ def update_specific_metric_result(result_id: int, updated_result: schemas.Metric
     if not result:
         raise HTTPException(status_code=404, detail="Metric result not found")
     
+    previous_uploaded_at = result.uploaded_at
     result.uploaded_at = datetime.now()
     
     for key, value in updated_result.model_dump(exclude_unset=True).items():
         setattr(result, key, value)
     
+    db.flush()
+    snapshots.record_result(db, result.metric, result)
+    rollups.recompute(db, result.metric_id, [previous_uploaded_at, result.uploaded_at])
     db.commit()
     db.refresh(result)
     return result
@@ -152,27 +261,81 @@ def delete_specific_metric_result(result_id: int, db: Session = Depends(get_db))
     if not result:
         raise HTTPException(status_code=404, detail="Metric result not found")
     
+    metric = result.metric
     db.delete(result)
+    db.flush()
+    snapshots.remove_result(db, metric, result)
+    rollups.recompute(db, result.metric_id, [result.uploaded_at])
     db.commit()
     return {"message": "Metric result deleted successfully"}
 
-# Get all metric_results
+# Get every recorded version of a result (corrections, deletion), oldest first
+@router.get("/results/{result_id}/versions", response_model=list[schemas.MetricResultVersionResponse])
+def get_metric_result_versions(result_id: int, db: Session = Depends(get_read_db)):
+    versions = db.execute(history.result_versions(result_id)).all()
+    if not versions:
+        raise HTTPException(status_code=404, detail="Metric result not found")
+    return versions
+
+# Get all metric_results, a page at a time (keyset pagination on uploaded_at, id)
+# or as an NDJSON/CSV stream with format=ndjson|csv; as_of gives the results recorded at a past time
 @router.get("/results/", response_model=list[schemas.MetricResultResponse])
-def get_all_results(db: Session = Depends(get_db)):
-    metrics_results = db.query(models.MetricResult).all()
-    if not metrics_results:
+def get_all_results(
+    response: Response,
+    metric_id: Optional[int] = None,
+    uploaded_by: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    as_of: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    format: Literal["json", "ndjson", "csv"] = "json",
+    db: Session = Depends(get_read_db),
+):
+    results = history.result_states(as_of, metric_id) if as_of is not None else models.MetricResult.__table__
+    statement = select(
+        results.c.id,
+        results.c.metric_id,
+        results.c.value,
+        results.c.uploaded_by,
+        results.c.uploaded_at,
+    ).order_by(results.c.uploaded_at, results.c.id)
+    if metric_id is not None:
+        statement = statement.where(results.c.metric_id == metric_id)
+    if uploaded_by is not None:
+        statement = statement.where(results.c.uploaded_by == uploaded_by)
+    if start is not None:
+        statement = statement.where(results.c.uploaded_at >= start)
+    if end is not None:
+        statement = statement.where(results.c.uploaded_at < end)
+    if cursor is not None:
+        try:
+            last = pagination.decode_cursor(cursor, datetime, int)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        statement = statement.where(pagination.after((results.c.uploaded_at, results.c.id), last))
+
+    # Streaming export: no page size unless one is asked for
+    if format != "json":
+        if limit is not None:
+            statement = statement.limit(limit)
+        return StreamingResponse(export.stream_rows(statement, format), media_type=export.MEDIA_TYPES[format])
+
+    limit = min(limit or RESULTS_PAGE_SIZE, RESULTS_MAX_PAGE_SIZE)
+    metrics_results = db.execute(statement.limit(limit)).all()
+    if not metrics_results and cursor is None:
         raise HTTPException(status_code=404, detail="No Metric Results found")
+
+    # The cursor of the next page is returned in a header to keep the body a plain list
+    if len(metrics_results) == limit:
+        last = metrics_results[-1]
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(last.uploaded_at, last.id)
     
-    return [
-        schemas.MetricResultResponse(
-            id=metric_result.id,
-            metric_id=metric_result.metric_id,
-            value=metric_result.value if metric_result.value is not None else 0.0,  # Ensure float value
-            uploaded_by=metric_result.uploaded_by, 
-            uploaded_at=metric_result.uploaded_at, 
-        )
-        for metric_result in metrics_results
-    ]
+    return serialization.json_response(
+        [serialization.metric_result_row(metric_result) for metric_result in metrics_results],
+        list[schemas.MetricResultResponse],
+        response,
+    )
     
 # ------------------- Risk Type API -------------------
 
@@ -182,35 +345,52 @@ def create_risk_type(risk_type: schemas.RiskTypeCreate, db: Session = Depends(ge
     new_risk_type = models.RiskType(**risk_type.model_dump())
     db.add(new_risk_type)
     db.commit()
+    cache.invalidate("risk_types")
     db.refresh(new_risk_type)
     return new_risk_type
 
 # Get all metrics
 @router.get("/risk_types/", response_model=list[schemas.RiskTypeResponse])
-def get_risk_types(db: Session = Depends(get_db)):
-    risk_types = db.query(models.RiskType).all()
-    return [schemas.RiskTypeResponse(
-        id=risk_type.id,
-        level=risk_type.level,
-        status=risk_type.status,
-        name=risk_type.name,
-        description=risk_type.description,
-    ) for risk_type in risk_types]
+def get_risk_types(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = etags.not_modified(db, request, response, etags.RISK_TYPES)
+    if not_modified:
+        return not_modified
+    return serialization.json_response(list(cache.risk_types(db, response.headers["ETag"]).values()), list[schemas.RiskTypeResponse], response)
 
 # Get a single metric by ID
 @router.get("/risk_types/{id}", response_model=schemas.RiskTypeResponse)
-def get_risk_type(id: int, db: Session = Depends(get_db)):
-    risk_type = db.query(models.RiskType).filter(models.RiskType.id == id).first()
+def get_risk_type(id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = etags.not_modified(db, request, response, etags.RISK_TYPES)
+    if not_modified:
+        return not_modified
+    risk_type = cache.risk_types(db, response.headers["ETag"]).get(id)
     if risk_type is None:
         raise HTTPException(status_code=404, detail="Risk Type not found")
-    
-    return schemas.RiskTypeResponse(
-        id=risk_type.id,
-        level=risk_type.level,
-        status=risk_type.status,
-        name=risk_type.name,
-        description=risk_type.description
-    )
+    return risk_type
+
+# Get a risk type and all its descendants, level by level
+@router.get("/risk_types/{id}/subtree", response_model=list[schemas.RiskTypeResponse])
+def get_risk_type_subtree(id: int, db: Session = Depends(get_read_db)):
+    nodes = hierarchy.subtree_rows(db, models.RiskType, id)
+    if not nodes:
+        raise HTTPException(status_code=404, detail="Risk Type not found")
+    return nodes
+
+# Get the ancestors of a risk type, from the root down to its parent
+@router.get("/risk_types/{id}/ancestors", response_model=list[schemas.RiskTypeResponse])
+def get_risk_type_ancestors(id: int, db: Session = Depends(get_read_db)):
+    if id not in cache.risk_types(db):
+        raise HTTPException(status_code=404, detail="Risk Type not found")
+    return hierarchy.ancestor_rows(db, models.RiskType, id)
+
+# Get all metrics of a risk type and its descendants
+@router.get("/risk_types/{id}/metrics", response_model=list[schemas.MetricResponse])
+def get_risk_type_metrics(id: int, db: Session = Depends(get_read_db)):
+    if id not in cache.risk_types(db):
+        raise HTTPException(status_code=404, detail="Risk Type not found")
+    tree = hierarchy.subtree(models.RiskType, id)
+    statement = queries.metric_rows().where(models.Metric.risk_type_id.in_(select(tree.c.id))).order_by(models.Metric.id)
+    return serialization.json_response([serialization.metric_row(row) for row in db.execute(statement)], list[schemas.MetricResponse])
 
 # Update a metric
 @router.put("/risk_types/{id}", response_model=schemas.RiskTypeResponse)
@@ -218,20 +398,35 @@ def update_risk_type(id: int, updated_risk_type: schemas.RiskTypeUpdate, db: Ses
     risk_type = db.query(models.RiskType).filter(models.RiskType.id == id).first()
     if risk_type is None:
         raise HTTPException(status_code=404, detail="Risk Type not found")
+    parent_id = updated_risk_type.parent_id
+    if parent_id is not None and hierarchy.is_descendant(db, models.RiskType, id, parent_id):
+        raise HTTPException(status_code=400, detail="A risk type can't be moved under itself or one of its descendants")
     for key, value in updated_risk_type.model_dump(exclude_unset=True).items():
         setattr(risk_type, key, value)
     db.commit()
+    cache.invalidate("risk_types")
     db.refresh(risk_type)
     return risk_type
 
 # Delete a metric
 @router.delete("/risk_types/{id}")
 def delete_risk_type(id: int, db: Session = Depends(get_db)):
-    risk_type = db.query(models.RiskType).filter(models.RiskType.id == id).first()
-    if risk_type is None:
+    if db.get(models.RiskType, id) is None:
         raise HTTPException(status_code=404, detail="Risk Type not found")
-    db.delete(risk_type)
-    db.commit()
+    # The node and its whole subtree go in one statement, unless metrics still use them
+    conflict = HTTPException(status_code=409, detail="Risk Type or one of its sub risk types still has metrics")
+    if hierarchy.subtree_has(db, models.RiskType, id, models.Metric.risk_type_id):
+        raise conflict
+    try:
+        hierarchy.delete_subtree(db, models.RiskType, id)
+        etags.touch(db, "risk_types")
+        events.emit(db, dict(type="reload", resource="risk_types"))
+        risk_engine.invalidate_on_commit(db)
+        db.commit()
+    except IntegrityError:  # A metric was attached in the meantime
+        db.rollback()
+        raise conflict
+    cache.invalidate("risk_types")
     return {"message": "Risk Type deleted successfully"}
 
 # ------------------- Business Unit API -------------------
@@ -242,35 +437,52 @@ def create_business_unit(business_unit: schemas.BusinessUnitCreate, db: Session
     new_business_unit = models.BusinessUnit(**business_unit.model_dump())
     db.add(new_business_unit)
     db.commit()
+    cache.invalidate("business_units")
     db.refresh(new_business_unit)
     return new_business_unit
 
 # Get all metrics
 @router.get("/business_units/", response_model=list[schemas.BusinessUnitResponse])
-def get_business_units(db: Session = Depends(get_db)):
-    business_units = db.query(models.BusinessUnit).all()
-    return [schemas.BusinessUnitResponse(
-        id=business_unit.id,
-        level=business_unit.level,
-        status=business_unit.status,
-        name=business_unit.name,
-        description=business_unit.description,
-    ) for business_unit in business_units]
+def get_business_units(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = etags.not_modified(db, request, response, etags.BUSINESS_UNITS)
+    if not_modified:
+        return not_modified
+    return serialization.json_response(list(cache.business_units(db, response.headers["ETag"]).values()), list[schemas.BusinessUnitResponse], response)
 
 # Get a single metric by ID
 @router.get("/business_units/{id}", response_model=schemas.BusinessUnitResponse)
-def get_business_unit(id: int, db: Session = Depends(get_db)):
-    business_unit = db.query(models.BusinessUnit).filter(models.BusinessUnit.id == id).first()
+def get_business_unit(id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = etags.not_modified(db, request, response, etags.BUSINESS_UNITS)
+    if not_modified:
+        return not_modified
+    business_unit = cache.business_units(db, response.headers["ETag"]).get(id)
     if business_unit is None:
         raise HTTPException(status_code=404, detail="Business Unit not found")
-    
-    return schemas.BusinessUnitResponse(
-        id=business_unit.id,
-        level=business_unit.level,
-        status=business_unit.status,
-        name=business_unit.name,
-        description=business_unit.description
-    )
+    return business_unit
+
+# Get a business unit and all its descendants, level by level
+@router.get("/business_units/{id}/subtree", response_model=list[schemas.BusinessUnitResponse])
+def get_business_unit_subtree(id: int, db: Session = Depends(get_read_db)):
+    nodes = hierarchy.subtree_rows(db, models.BusinessUnit, id)
+    if not nodes:
+        raise HTTPException(status_code=404, detail="Business Unit not found")
+    return nodes
+
+# Get the ancestors of a business unit, from the root down to its parent
+@router.get("/business_units/{id}/ancestors", response_model=list[schemas.BusinessUnitResponse])
+def get_business_unit_ancestors(id: int, db: Session = Depends(get_read_db)):
+    if id not in cache.business_units(db):
+        raise HTTPException(status_code=404, detail="Business Unit not found")
+    return hierarchy.ancestor_rows(db, models.BusinessUnit, id)
+
+# Get all metrics of a business unit and its descendants
+@router.get("/business_units/{id}/metrics", response_model=list[schemas.MetricResponse])
+def get_business_unit_metrics(id: int, db: Session = Depends(get_read_db)):
+    if id not in cache.business_units(db):
+        raise HTTPException(status_code=404, detail="Business Unit not found")
+    tree = hierarchy.subtree(models.BusinessUnit, id)
+    statement = queries.metric_rows().where(models.Metric.business_unit_id.in_(select(tree.c.id))).order_by(models.Metric.id)
+    return serialization.json_response([serialization.metric_row(row) for row in db.execute(statement)], list[schemas.MetricResponse])
 
 # Update a metric
 @router.put("/business_units/{id}", response_model=schemas.BusinessUnitResponse)
@@ -278,18 +490,199 @@ def update_business_unit(id: int, updated_business_unit: schemas.BusinessUnitUpd
     business_unit = db.query(models.BusinessUnit).filter(models.BusinessUnit.id == id).first()
     if business_unit is None:
         raise HTTPException(status_code=404, detail="Business Unit not found")
+    parent_id = updated_business_unit.parent_id
+    if parent_id is not None and hierarchy.is_descendant(db, models.BusinessUnit, id, parent_id):
+        raise HTTPException(status_code=400, detail="A business unit can't be moved under itself or one of its descendants")
     for key, value in updated_business_unit.model_dump(exclude_unset=True).items():
         setattr(business_unit, key, value)
     db.commit()
+    cache.invalidate("business_units")
     db.refresh(business_unit)
     return business_unit
 
 # Delete a metric
 @router.delete("/business_units/{id}")
 def delete_business_unit(id: int, db: Session = Depends(get_db)):
-    business_unit = db.query(models.BusinessUnit).filter(models.BusinessUnit.id == id).first()
-    if business_unit is None:
+    if db.get(models.BusinessUnit, id) is None:
         raise HTTPException(status_code=404, detail="Business Unit not found")
-    db.delete(business_unit)
-    db.commit()
+    # The node and its whole subtree go in one statement, unless metrics still use them
+    conflict = HTTPException(status_code=409, detail="Business Unit or one of its sub business units still has metrics")
+    if hierarchy.subtree_has(db, models.BusinessUnit, id, models.Metric.business_unit_id):
+        raise conflict
+    try:
+        hierarchy.delete_subtree(db, models.BusinessUnit, id)
+        etags.touch(db, "business_units")
+        events.emit(db, dict(type="reload", resource="business_units"))
+        risk_engine.invalidate_on_commit(db)
+        db.commit()
+    except IntegrityError:  # A metric was attached in the meantime
+        db.rollback()
+        raise conflict
+    cache.invalidate("business_units")
     return {"message": "Business Unit deleted successfully"}
+
+# ------------------- Risk Heatmap API -------------------
+
+# Get metric breach counts per (risk type, business unit), rolled up both hierarchies
+@router.get("/risk_heatmap", response_model=list[schemas.RiskHeatmapCell])
+def get_risk_heatmap(
+    risk_type_id: Optional[int] = None,
+    business_unit_id: Optional[int] = None,
+    db: Session = Depends(get_read_db),
+):
+    cells = risk_engine.engine.get_heatmap(db)
+    if risk_type_id is not None:
+        cells = [cell for cell in cells if cell["risk_type_id"] == risk_type_id]
+    if business_unit_id is not None:
+        cells = [cell for cell in cells if cell["business_unit_id"] == business_unit_id]
+    return cells
+
+# ------------------- Analytics API -------------------
+
+# Get trend and anomaly scores of all metrics (or of a risk type / business unit subtree), closest to a breach first
+@router.get("/analytics/trends", response_model=list[schemas.MetricTrend])
+def get_metric_trends(
+    days: int = Query(365, ge=7, le=3660),
+    window: int = Query(30, ge=7, le=365),
+    z_threshold: float = Query(3.0, gt=0),
+    horizon: int = Query(90, ge=1, le=3660),
+    risk_type_id: Optional[int] = None,
+    business_unit_id: Optional[int] = None,
+    at_risk: bool = False,
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_read_db),
+):
+    scores = analytics.cached_score(
+        db, days=days, window=window, z_threshold=z_threshold, horizon=horizon,
+        risk_type_id=risk_type_id, business_unit_id=business_unit_id,
+    )
+    if at_risk:
+        scores = [row for row in scores if row["at_risk"]]
+    return serialization.json_response(scores[:limit], list[schemas.MetricTrend])
+
+# ------------------- Breach Events API -------------------
+
+# Get the most recent breach status changes, optionally of one metric or to one status
+@router.get("/breach_events/", response_model=list[schemas.BreachEventResponse])
+def get_breach_events(
+    metric_id: Optional[int] = None,
+    status: Optional[Literal["ok", "warning", "breach"]] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+):
+    query = db.query(models.BreachEvent)
+    if metric_id is not None:
+        query = query.filter(models.BreachEvent.metric_id == metric_id)
+    if status is not None:
+        query = query.filter(models.BreachEvent.status == status)
+    return query.order_by(models.BreachEvent.created_at.desc(), models.BreachEvent.id.desc()).limit(limit).all()
+
+# ------------------- Import API -------------------
+
+# Create or update metrics, risk types or business units from a CSV or Excel file, matched on name
+@router.post("/import/{kind}", response_model=schemas.ImportResponse)
+async def import_catalog(
+    kind: Literal["metrics", "risk_types", "business_units"],
+    request: Request,
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+):
+    fmt = imports.body_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail=f"Use text/csv or {imports.XLSX}")
+    if fmt == "xlsx" and imports.openpyxl is None:
+        raise HTTPException(status_code=501, detail="Excel imports need the openpyxl package, upload a CSV file")
+
+    # Spool the upload so large catalogs are parsed as a stream, not held in memory
+    with tempfile.SpooledTemporaryFile(max_size=ingest.SPOOL_SIZE) as body:
+        async for data in request.stream():
+            body.write(data)
+        body.seek(0)
+        try:
+            return await run_in_threadpool(imports.run_import, db, kind, fmt, body, dry_run)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+# ------------------- Jobs API -------------------
+
+# Get the status and progress of a background job (e.g. a metric deletion)
+@router.get("/jobs/{id}", response_model=schemas.JobResponse)
+def get_job(id: int, db: Session = Depends(get_db)):  # Primary, the replica may lag behind the progress
+    job = db.get(models.Job, id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# ------------------- Reports API -------------------
+
+# Queue a board pack (every metric with its history chart, thresholds and breach status), poll GET /jobs/{job_id}
+@router.post("/reports")
+def create_report(report: schemas.ReportCreate, response: Response, db: Session = Depends(get_db)):
+    if report.format == "xlsx" and report_rendering.openpyxl is None:
+        raise HTTPException(status_code=501, detail="Excel board packs need the openpyxl package, use html or csv")
+    if report.risk_type_id is not None and db.get(models.RiskType, report.risk_type_id) is None:
+        raise HTTPException(status_code=404, detail="Risk type not found")
+    if report.business_unit_id is not None and db.get(models.BusinessUnit, report.business_unit_id) is None:
+        raise HTTPException(status_code=404, detail="Business unit not found")
+    job = reports.start_report(db, report.model_dump(mode="json"))
+    db.commit()
+    response.status_code = 202
+    return {"message": "Board pack queued", "job_id": job.id}
+
+# Download a finished board pack: a zip of the section files and their index
+@router.get("/reports/{job_id}/download")
+def download_report(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(models.Job, job_id)
+    if job is None or job.kind != reports.KIND:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if job.status != jobs.DONE:
+        raise HTTPException(status_code=409, detail=f"Report is {job.status}")
+    path = reports.pack_path(job.id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Report expired, queue it again")
+    return FileResponse(path, media_type="application/zip", filename=os.path.basename(path))
+
+# ------------------- Live Events API -------------------
+
+# Stream new results, metric changes and breaches as Server-Sent Events (types: comma separated filter)
+@router.get("/events")
+async def stream_events(types: Optional[str] = None):
+    if len(events.broker.subscribers) >= config.EVENTS_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many live event subscribers, retry later")
+    wanted = {name.strip() for name in types.split(",")} if types else None
+    return StreamingResponse(
+        events.stream(wanted),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # No proxy buffering
+    )
+
+# ------------------- Status API -------------------
+
+# Connection pool usage per engine (checked out, overflow, pool wait time)
+@router.get("/status/db_pool")
+def get_db_pool_status():
+    return {name: stats.snapshot() for name, stats in pool_stats.items()}
+
+# Reference data cache counters (hits, misses, evictions)
+@router.get("/status/cache")
+def get_cache_status():
+    return cache.snapshot()
+
+# Breach notification counters (queued, delivered, failed, overflowed to the sweep)
+@router.get("/status/notifications")
+def get_notifications_status():
+    return notifier.snapshot()
+
+# Live event counters (subscribers of this worker, published, lagging clients)
+@router.get("/status/events")
+def get_events_status():
+    return {"backend": config.EVENTS_BACKEND, **events.broker.snapshot()}
+
+# Request metrics in the Prometheus text format (needs prometheus_client)
+@router.get("/prometheus", include_in_schema=False)
+def get_prometheus_metrics():
+    exposition = instrumentation.prometheus_exposition()
+    if exposition is None:
+        raise HTTPException(status_code=501, detail="prometheus_client is not installed")
+    body, media_type = exposition
+    return Response(content=body, media_type=media_type)
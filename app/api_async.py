@@ -0,0 +1,84 @@
+from datetime import datetime
+from functools import partial
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, get_async_read_db
+from app import api, cache, etags, history, models, schemas, queries, serialization
+
+# Async versions of the hot routes, used when EGRC_DB_MODE=async. app.main
+# includes this router before app.api.router so these handlers take
+# precedence; every other route keeps its sync handler.
+
+router = APIRouter()
+
+# Get all metrics, or as they were at a past time
+@router.get("/metrics/", response_model=list[schemas.MetricResponse])
+async def get_metrics(request: Request, response: Response, as_of: Optional[datetime] = None, db: AsyncSession = Depends(get_async_read_db)):
+    not_modified = await db.run_sync(etags.not_modified, request, response, etags.METRICS)
+    if not_modified:
+        return not_modified
+    if as_of is not None:
+        rows = await db.execute(history.metric_rows(as_of, db.bind.dialect.name))
+    else:
+        rows = await db.execute(queries.metric_rows().order_by(models.Metric.id))
+    return serialization.json_response([serialization.metric_row(row) for row in rows], list[schemas.MetricResponse], response)
+
+# Get a single metric by ID, optionally as it was at a past time
+# (int path converter: this router is included before the sync one, /metrics/search must not match here)
+@router.get("/metrics/{id:int}", response_model=schemas.MetricResponse)
+async def get_metric(id: int, request: Request, response: Response, as_of: Optional[datetime] = None, db: AsyncSession = Depends(get_async_read_db)):
+    not_modified = await db.run_sync(etags.not_modified, request, response, etags.METRICS)
+    if not_modified:
+        return not_modified
+    if as_of is not None:
+        row = (await db.execute(history.metric_rows(as_of, db.bind.dialect.name, metric_id=id))).first()
+    else:
+        row = (await db.execute(queries.metric_rows().where(models.Metric.id == id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    return serialization.json_response(serialization.metric_row(row), schemas.MetricResponse, response)
+
+# Create a new metric result, the write path itself is shared with the sync handler
+@router.post("/metrics/{metric_id}/results/", response_model=schemas.MetricResultResponse)
+async def create_metric_result_for_specific_metric(result: schemas.MetricResultCreate, metric_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(partial(api.create_metric_result_for_specific_metric, result, metric_id))
+
+# Get all results for a specific metric, or the ones recorded at a past time
+@router.get("/metrics/{metric_id}/results/", response_model=list[schemas.MetricResultResponse])
+async def get_all_metric_results_for_specific_metric(metric_id: int, as_of: Optional[datetime] = None, db: AsyncSession = Depends(get_async_read_db)):
+    if as_of is not None:
+        results = (await db.execute(history.metric_results(as_of, metric_id))).all()
+    else:
+        results = (await db.scalars(queries.metric_results(metric_id))).all()
+    if not results:
+        raise HTTPException(status_code=404, detail="No results found for this metric")
+    return results
+
+# Get the latest result for a specific metric, optionally as of a past time
+@router.get("/metrics/{metric_id}/results/latest/", response_model=schemas.MetricResultResponse)
+async def get_latest_metric_result_for_specific_metric(metric_id: int, as_of: Optional[datetime] = None, db: AsyncSession = Depends(get_async_read_db)):
+    if as_of is not None:
+        latest_result = (await db.execute(history.metric_results(as_of, metric_id).limit(1))).first()
+    else:
+        latest_result = (await db.scalars(queries.latest_metric_result(metric_id, db.bind.dialect.name))).first()
+    if not latest_result:
+        raise HTTPException(status_code=404, detail="No results found for this metric")
+    return latest_result
+
+# Get all risk types
+@router.get("/risk_types/", response_model=list[schemas.RiskTypeResponse])
+async def get_risk_types(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
+    not_modified = await db.run_sync(etags.not_modified, request, response, etags.RISK_TYPES)
+    if not_modified:
+        return not_modified
+    return serialization.json_response(list((await db.run_sync(cache.risk_types, response.headers["ETag"])).values()), list[schemas.RiskTypeResponse], response)
+
+# Get all business units
+@router.get("/business_units/", response_model=list[schemas.BusinessUnitResponse])
+async def get_business_units(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
+    not_modified = await db.run_sync(etags.not_modified, request, response, etags.BUSINESS_UNITS)
+    if not_modified:
+        return not_modified
+    return serialization.json_response(list((await db.run_sync(cache.business_units, response.headers["ETag"])).values()), list[schemas.BusinessUnitResponse], response)
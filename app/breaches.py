@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import config, models, notifications
+
+# Breach events. Every write path (single results, bulk ingest, result edits
+# and deletes, threshold changes) goes through app.snapshots, which sets
+# MetricLatest.breach_status; a status transition found at flush time is
+# recorded as a BreachEvent in the same transaction. Once the transaction
+# commits the events are handed to the notification worker, the request
+# never waits for delivery.
+
+
+@event.listens_for(Session, "before_flush")
+def _record_transitions(session, flush_context, instances):
+    if not config.BREACH_EVENTS_ENABLED:
+        return
+    now = datetime.now()
+    for obj in session.new | session.dirty:
+        if not isinstance(obj, models.MetricLatest):
+            continue
+        history = inspect(obj).attrs.breach_status.history
+        if not history.added:
+            continue
+        previous = history.deleted[0] if history.deleted else None
+        status = history.added[0]
+        # A metric's first result is only an event when it is already out of bounds
+        if status == previous or (previous is None and status == "ok"):
+            continue
+        session.add(models.BreachEvent(
+            metric_id=obj.metric_id,
+            result_id=obj.result_id,
+            previous_status=previous,
+            status=status,
+            value=obj.value,
+            created_at=now,
+        ))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    events = [notifications.event_payload(obj) for obj in session.new if isinstance(obj, models.BreachEvent)]
+    if events:
+        session.info.setdefault("breach_events", []).extend(events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    events = session.info.pop("breach_events", None)
+    if events:
+        notifications.notifier.publish(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop("breach_events", None)
@@ -0,0 +1,157 @@
+import importlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from app import config, etags, models
+
+# Cache of the small reference tables (risk types, business units). Each table
+# is cached as a whole under one key, as {id: row dict}, and the write handlers
+# invalidate it after commit. An entry is stored with the table's change
+# counter (app.etags) read before loading it, and a lookup with another
+# version reloads it: a worker that didn't see the write (per-process backend)
+# reloads as soon as the counter moves, so a body is never older than the ETag
+# it is served with. The TTL and max_entries only bound memory.
+
+MISSING = object()
+
+
+class CacheBackend(ABC):
+    """Storage interface of the cache.
+
+    The default LRUCache is per-process. A shared backend (e.g. one talking to
+    Redis) implements the same four methods and is selected with
+    EGRC_CACHE_BACKEND=package.module:ClassName; it is constructed with the
+    ttl and max_entries settings as keyword arguments. A backend missing one
+    of them can't be instantiated, so it fails at startup.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """Return the cached value or MISSING."""
+
+    @abstractmethod
+    def set(self, key, value):
+        """Store a value under a key."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a key (no error if it isn't cached)."""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every key."""
+
+
+class LRUCache(CacheBackend):
+    """In-process cache with a TTL per entry and least-recently-used eviction."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _create_backend():
+    if config.CACHE_BACKEND == "lru":
+        return LRUCache(ttl=config.CACHE_TTL_SECONDS, max_entries=config.CACHE_MAX_ENTRIES)
+    module, _, name = config.CACHE_BACKEND.partition(":")
+    backend_class = getattr(importlib.import_module(module), name)
+    return backend_class(ttl=config.CACHE_TTL_SECONDS, max_entries=config.CACHE_MAX_ENTRIES)
+
+
+backend = _create_backend()
+_stats_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+def _count(outcome):
+    with _stats_lock:
+        stats[outcome] += 1
+
+
+def cached(key, loader, version=None):
+    """Return the cached value of a key, loading and storing it on a miss or when stored under another version."""
+    entry = backend.get(key)
+    if entry is not MISSING and entry[0] == version:
+        _count("hits")
+        return entry[1]
+    _count("misses")
+    value = loader()
+    backend.set(key, (version, value))
+    return value
+
+
+def invalidate(key):
+    backend.delete(key)
+
+
+def _rows(db: Session, model):
+    return {
+        row.id: dict(
+            id=row.id,
+            level=row.level,
+            status=row.status,
+            name=row.name,
+            description=row.description,
+            parent_id=row.parent_id,
+        )
+        for row in db.query(model).order_by(model.id)
+    }
+
+
+def risk_types(db: Session, version=None):
+    """All risk types as {id: row dict}; version is the ETag of etags.RISK_TYPES if the caller has read it."""
+    version = version or etags.current(db, etags.RISK_TYPES)
+    return cached("risk_types", lambda: _rows(db, models.RiskType), version)
+
+
+def business_units(db: Session, version=None):
+    """All business units as {id: row dict}; version is the ETag of etags.BUSINESS_UNITS if the caller has read it."""
+    version = version or etags.current(db, etags.BUSINESS_UNITS)
+    return cached("business_units", lambda: _rows(db, models.BusinessUnit), version)
+
+
+def snapshot():
+    """Hit/miss counters for GET /status/cache."""
+    with _stats_lock:
+        counters = dict(stats)
+    lookups = counters["hits"] + counters["misses"]
+    counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+    counters["backend"] = config.CACHE_BACKEND
+    if isinstance(backend, LRUCache):
+        counters["entries"] = len(backend.entries)
+        counters["evictions"] = backend.evictions
+    return counters
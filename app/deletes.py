@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.orm import Session
+
+from app import config, etags, events, history, jobs, models, risk_engine
+
+# Metric deletion. The rows of a metric (results, snapshot, rollups, breach
+# events) are removed by the database's ON DELETE CASCADE, the ORM doesn't
+# load them (passive_deletes). A metric with few results is deleted in the
+# request; for a larger history the cascade would hold its locks for the
+# whole delete, so the metric is marked "deleting" and a background job
+# deletes its results DELETE_CHUNK_SIZE at a time, one short transaction per
+# chunk, before deleting the metric itself. While being deleted the metric
+# stays listed (with its status) but takes no new results.
+#
+# The as-of views (app.history) still show a deleted metric and its results
+# at the times before the delete: the metric's last state and the states of
+# its results are appended to the version tables, ending at the delete, with
+# one INSERT ... SELECT before each DELETE.
+
+DELETING = "deleting"
+
+
+def result_count(db: Session, metric_id, limit):
+    """Number of results of a metric, counting no further than limit + 1."""
+    results = (
+        select(models.MetricResult.id)
+        .where(models.MetricResult.metric_id == metric_id)
+        .limit(limit + 1)
+        .subquery()
+    )
+    return db.scalar(select(func.count()).select_from(results))
+
+
+def delete_metric(db: Session, metric_id):
+    """Delete a metric, its remaining rows go with the cascade (their last states are kept in the version tables)."""
+    now = datetime.now()
+    history.record_metrics(db, models.Metric.id == metric_id, now)
+    history.record_results(db, models.MetricResult.metric_id == metric_id, now)
+    deleted = db.execute(
+        delete(models.Metric).where(models.Metric.id == metric_id).execution_options(synchronize_session=False)
+    ).rowcount
+    etags.touch(db, "metrics", "metric_latest")
+    risk_engine.invalidate_on_commit(db)
+    if deleted:
+        events.emit(db, dict(type="metric", metric_id=metric_id, action="deleted"))
+    return deleted
+
+
+def start_metric_deletion(db: Session, metric: models.Metric):
+    """Mark a metric as being deleted and queue its deletion job (started on commit)."""
+    metric.status = DELETING
+    metric.updated_at = datetime.now()
+    return jobs.create(db, "delete_metric", {"metric_id": metric.id})
+
+
+@jobs.handler("delete_metric")
+def _delete_metric_job(db: Session, job, progress):
+    metric_id = job.params["metric_id"]
+    total = db.scalar(select(func.count()).where(models.MetricResult.metric_id == metric_id)) or 1
+    deleted = 0
+    while True:
+        chunk = (
+            select(models.MetricResult.id)
+            .where(models.MetricResult.metric_id == metric_id)
+            .order_by(models.MetricResult.id)  # The same rows for the versions and the delete
+            .limit(config.DELETE_CHUNK_SIZE)
+        )
+        in_chunk = and_(models.MetricResult.metric_id == metric_id, models.MetricResult.id.in_(chunk.scalar_subquery()))
+        history.record_results(db, in_chunk, datetime.now())
+        count = db.execute(
+            delete(models.MetricResult).where(in_chunk).execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if not count:
+            break
+        deleted += count
+        progress(deleted / total)
+    delete_metric(db, metric_id)
+    db.commit()
+    return {"metric_id": metric_id, "results_deleted": deleted}
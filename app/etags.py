@@ -0,0 +1,93 @@
+from fastapi import Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Conditional GET for the read endpoints. Every transaction that writes to one
+# of the TRACKED tables increments that table's row in change_counters before
+# it commits, so the counters always move together with the data. A response's
+# ETag is built from the counters of the tables it reads from: checking
+# If-None-Match costs one primary key lookup, and an unchanged resource is
+# answered with 304 without running its query or serializing it.
+#
+# ORM writes are tracked automatically; code writing to a tracked table with
+# Core statements (bulk paths) calls touch() on its session.
+
+TRACKED = {"metrics", "metric_latest", "metric_results", "risk_types", "business_units"}
+
+# Tables behind each cached resource
+METRICS = ("metrics", "metric_latest", "risk_types", "business_units")  # Metric responses include names and latest values
+RISK_TYPES = ("risk_types",)
+BUSINESS_UNITS = ("business_units",)
+RESULTS = ("metrics", "metric_results")  # Result history and the thresholds it is judged against (app.analytics)
+
+# Clients may keep responses but must revalidate them (cheap thanks to the ETag)
+CACHE_CONTROL = "no-cache"
+
+
+def touch(db: Session, *tables):
+    """Mark tables as written by the session's current transaction."""
+    db.info.setdefault("touched_tables", set()).update(tables)
+
+
+def _bump(db: Session, tables):
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(models.ChangeCounter).values([{"name": name, "version": 1} for name in sorted(tables)])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[models.ChangeCounter.name],
+        set_={"version": models.ChangeCounter.version + 1},
+    ))
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_tables(session, flush_context, instances):
+    tables = {obj.__table__.name for obj in session.new} | {obj.__table__.name for obj in session.deleted}
+    tables |= {obj.__table__.name for obj in session.dirty if session.is_modified(obj)}
+    tables &= TRACKED
+    if tables:
+        touch(session, *tables)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_counters(session):
+    session.flush()
+    tables = session.info.pop("touched_tables", None)
+    if tables:
+        # Takes the counter rows' locks only for the duration of the commit
+        _bump(session, tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tables(session):
+    session.info.pop("touched_tables", None)
+
+
+def current(db: Session, tables):
+    """Weak ETag of the current versions of the given tables."""
+    versions = dict(db.execute(
+        select(models.ChangeCounter.name, models.ChangeCounter.version)
+        .where(models.ChangeCounter.name.in_(tables))
+    ).all())
+    return 'W/"' + ".".join(str(versions.get(name, 0)) for name in tables) + '"'
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, ignore the W/ prefix on both sides
+    return "*" in candidates or etag.removeprefix("W/") in {candidate.removeprefix("W/") for candidate in candidates}
+
+
+def not_modified(db: Session, request: Request, response: Response, tables):
+    """Set ETag and Cache-Control on the response, return a 304 response if the client's copy is current."""
+    etag = current(db, tables)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,304 @@
+import asyncio
+import importlib
+import json
+import logging
+import select
+import threading
+from collections import Counter
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app import config, history, models
+from app.notifications import event_payload
+
+# Live changes pushed to the dashboards with Server-Sent Events (GET /events).
+#
+# Writes are turned into compact delta events by session listeners, so every
+# write path (handlers, bulk ingest, imports, jobs) is covered and events
+# only go out once their transaction commits:
+#
+#   result   {metric_id, value, uploaded_at, breach_status}  new latest value
+#   metric   {metric_id, action: created/updated/deleted}    refetch the metric
+#   breach   a breach event (see app.notifications.event_payload)
+#   reload   {resource}  too many changes at once, refetch the listing
+#
+# Code writing with Core statements calls emit() itself. A transaction with
+# more than EVENTS_MAX_PER_COMMIT events sends one reload instead.
+#
+# Each worker fans the events out to its subscribers with an asyncio broker:
+# one bounded queue per connection and no thread per client, so thousands of
+# idle streams cost little more than their sockets. A client too slow to
+# keep up loses its backlog and gets a reload. Events reach other workers
+# through the backend (EGRC_EVENTS_BACKEND): "local" only delivers to the
+# worker that committed, "postgres" sends them with pg_notify inside the
+# writing transaction and every worker LISTENs, "package.module:ClassName"
+# selects a custom one.
+
+logger = logging.getLogger(__name__)
+
+RELOAD = {"type": "reload", "resource": "metrics"}
+
+
+class Broker:
+    """Fan-out of events to the subscribers of this worker, on its event loop."""
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.loop = None
+        self.stats = Counter()
+
+    def subscribe(self):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, events):
+        """Deliver events to every subscriber, from any thread."""
+        if not events or self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out, events)
+        except RuntimeError:  # Loop closed (shutdown)
+            pass
+
+    def _fan_out(self, events):
+        self.stats["published"] += len(events)
+        for queue in list(self.subscribers):
+            for item in events:
+                try:
+                    queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    # Too slow to keep up: drop its backlog, it refetches instead
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RELOAD)
+                    self.stats["lagged"] += 1
+                    break
+
+    def snapshot(self):
+        return {"subscribers": len(self.subscribers), **self.stats}
+
+
+class LocalBackend:
+    """Delivers events to the subscribers of the worker that committed them."""
+
+    transactional = False  # send() is called after the commit
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def send(self, session, events):
+        self.broker.publish(events)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PostgresBackend:
+    """PostgreSQL LISTEN/NOTIFY: every worker receives the events of every worker.
+
+    Events are sent with pg_notify in the writing transaction, so PostgreSQL
+    delivers them exactly when (and if) it commits. A thread per worker
+    LISTENs on its own connection and hands them to the broker; after a lost
+    connection it reconnects and sends a reload, notifications may be missed.
+    """
+
+    transactional = True  # send() is called in the transaction, before it commits
+    CHANNEL = "egrc_events"
+    MAX_PAYLOAD = 7000  # pg_notify payloads must stay under 8000 bytes
+    RECONNECT_SECONDS = 5
+
+    def __init__(self, broker, url=None):
+        self.broker = broker
+        url = make_url(url or config.DATABASE_URL)
+        self.dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def _payloads(self, events):
+        batch = []
+        size = 2
+        for item in events:
+            encoded = json.dumps(item, separators=(",", ":"))
+            if batch and size + len(encoded) + 1 > self.MAX_PAYLOAD:
+                yield "[" + ",".join(batch) + "]"
+                batch, size = [], 2
+            batch.append(encoded)
+            size += len(encoded) + 1
+        if batch:
+            yield "[" + ",".join(batch) + "]"
+
+    def send(self, session, events):
+        for payload in self._payloads(events):
+            session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.CHANNEL, "payload": payload})
+
+    def start(self):
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.RECONNECT_SECONDS)
+            self.thread = None
+
+    def _listen(self):
+        import psycopg2
+
+        connected_before = False
+        while not self.stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(self.dsn)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.CHANNEL}")
+                if connected_before:
+                    self.broker.publish([RELOAD])  # Notifications sent while disconnected are lost
+                connected_before = True
+                while not self.stopping.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    events = []
+                    while connection.notifies:
+                        events.extend(json.loads(connection.notifies.pop(0).payload))
+                    self.broker.publish(events)
+            except Exception:
+                logger.exception("Event listener connection failed, reconnecting")
+                self.stopping.wait(self.RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def _create_backend(broker):
+    if config.EVENTS_BACKEND == "local":
+        return LocalBackend(broker)
+    if config.EVENTS_BACKEND == "postgres":
+        return PostgresBackend(broker)
+    module, _, name = config.EVENTS_BACKEND.partition(":")
+    return getattr(importlib.import_module(module), name)(broker)
+
+
+broker = Broker(config.EVENTS_QUEUE_SIZE)
+backend = _create_backend(broker)
+
+
+def emit(session: Session, *events):
+    """Queue events to publish when the session's transaction commits."""
+    session.info.setdefault("live_events", []).extend(events)
+
+
+def _result_event(latest: models.MetricLatest):
+    return dict(
+        type="result",
+        metric_id=latest.metric_id,
+        value=latest.value,
+        uploaded_at=latest.uploaded_at.isoformat() if latest.uploaded_at else None,
+        breach_status=latest.breach_status,
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    events = []
+    for obj in session.new:
+        if isinstance(obj, models.MetricLatest):
+            events.append(_result_event(obj))
+        elif isinstance(obj, models.Metric):
+            events.append(dict(type="metric", metric_id=obj.id, action="created"))
+        elif isinstance(obj, models.BreachEvent):
+            events.append(dict(type="breach", **event_payload(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, models.MetricLatest) and session.is_modified(obj):
+            events.append(_result_event(obj))
+        elif isinstance(obj, models.Metric) and history.columns_changed(obj):  # Not metric.latest
+            events.append(dict(type="metric", metric_id=obj.id, action="updated"))
+    for obj in session.deleted:
+        if isinstance(obj, models.Metric):
+            events.append(dict(type="metric", metric_id=obj.id, action="deleted"))
+        elif isinstance(obj, models.MetricLatest):
+            events.append(dict(type="metric", metric_id=obj.metric_id, action="updated"))
+    if events:
+        emit(session, *events)
+
+
+def _take(session):
+    """The session's pending events, the last one per metric and kind, or a reload if there are too many."""
+    events = session.info.pop("live_events", None)
+    if not events:
+        return []
+    latest = {}
+    for index, item in enumerate(events):
+        key = (item["type"], item["metric_id"]) if item["type"] in ("result", "metric") else index
+        latest.pop(key, None)  # Keep the order of the last occurrence
+        latest[key] = item
+    events = list(latest.values())
+    if len(events) > config.EVENTS_MAX_PER_COMMIT:
+        return [RELOAD]
+    return events
+
+
+@event.listens_for(Session, "before_commit")
+def _send_in_transaction(session):
+    if backend.transactional:
+        session.flush()  # commit() flushes after this hook, collect the pending changes first
+        events = _take(session)
+        if events:
+            backend.send(session, events)
+
+
+@event.listens_for(Session, "after_commit")
+def _send_committed(session):
+    if not backend.transactional:
+        events = _take(session)
+        if events:
+            backend.send(session, events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("live_events", None)
+
+
+def _format(item):
+    return f"event: {item['type']}\ndata: {json.dumps(item, separators=(',', ':'))}\n\n"
+
+
+async def stream(types=None):
+    """Server-Sent Events of one subscriber, optionally only of some event types (reloads always pass)."""
+    queue = broker.subscribe()
+    try:
+        yield f"retry: {config.EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=config.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"  # Keeps proxies from closing idle streams
+                continue
+            if types and item["type"] not in types and item["type"] != "reload":
+                continue
+            yield _format(item)
+    finally:
+        broker.unsubscribe(queue)
+
+
+def start():
+    backend.start()
+
+
+def stop():
+    backend.stop()
@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+from app.database import ReadSessionLocal
+
+# Streaming exports of query results. Rows are read through a server-side
+# cursor (yield_per) and written out batch by batch, so memory stays flat
+# whatever the size of the export.
+
+YIELD_PER = 2000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def stream_rows(statement, fmt):
+    """Yield an NDJSON or CSV export of a select statement, chunk by chunk.
+
+    The generator opens its own session: it runs after the request handler
+    returned, when the request's session has already been closed.
+    """
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=YIELD_PER))
+        columns = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(columns)
+        for rows in result.partitions():
+            for row in rows:
+                if fmt == "csv":
+                    writer.writerow([_encode(value) for value in row])
+                else:
+                    buffer.write(json.dumps({key: _encode(value) for key, value in zip(columns, row)}))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
@@ -0,0 +1,75 @@
+from sqlalchemy import delete, literal, select
+from sqlalchemy.orm import Session
+
+# Subtree and ancestor lookups over the self-referential RiskType and
+# BusinessUnit trees, each resolved in one round trip with a recursive CTE.
+# The recursion is capped at MAX_DEPTH so a corrupted (cyclic) tree can't
+# make a query run forever.
+
+MAX_DEPTH = 64
+
+
+def subtree(model, root_id):
+    """CTE of (id, depth) for a node and all its descendants."""
+    tree = (
+        select(model.id, literal(0).label("depth"))
+        .where(model.id == root_id)
+        .cte(f"{model.__tablename__}_subtree", recursive=True)
+    )
+    children = (
+        select(model.id, (tree.c.depth + 1).label("depth"))
+        .join(tree, model.parent_id == tree.c.id)
+        .where(tree.c.depth < MAX_DEPTH)
+    )
+    return tree.union_all(children)
+
+
+def ancestors(model, node_id):
+    """CTE of (id, parent_id, depth) for a node and all its ancestors, depth 0 being the node."""
+    chain = (
+        select(model.id, model.parent_id, literal(0).label("depth"))
+        .where(model.id == node_id)
+        .cte(f"{model.__tablename__}_ancestors", recursive=True)
+    )
+    parents = (
+        select(model.id, model.parent_id, (chain.c.depth + 1).label("depth"))
+        .join(chain, model.id == chain.c.parent_id)
+        .where(chain.c.depth < MAX_DEPTH)
+    )
+    return chain.union_all(parents)
+
+
+def subtree_rows(db: Session, model, root_id):
+    """Nodes of a subtree, the root first and then level by level."""
+    tree = subtree(model, root_id)
+    return db.scalars(
+        select(model).join(tree, model.id == tree.c.id).order_by(tree.c.depth, model.id)
+    ).all()
+
+
+def ancestor_rows(db: Session, model, node_id):
+    """Ancestors of a node from the root down to its parent (the node itself excluded)."""
+    chain = ancestors(model, node_id)
+    return db.scalars(
+        select(model).join(chain, model.id == chain.c.id).where(chain.c.depth > 0).order_by(chain.c.depth.desc())
+    ).all()
+
+
+def is_descendant(db: Session, model, node_id, candidate_id):
+    """True if candidate_id is node_id or one of its descendants (re-parenting there makes a cycle)."""
+    tree = subtree(model, node_id)
+    return db.execute(select(tree.c.id).where(tree.c.id == candidate_id).limit(1)).first() is not None
+
+
+def subtree_has(db: Session, model, root_id, column):
+    """True if a row has `column` (a foreign key to `model`) pointing into the subtree of root_id."""
+    tree = subtree(model, root_id)
+    return db.execute(select(column).where(column.in_(select(tree.c.id))).limit(1)).first() is not None
+
+
+def delete_subtree(db: Session, model, root_id):
+    """Delete a node and all its descendants in one statement, return the number of deleted nodes."""
+    tree = subtree(model, root_id)
+    return db.execute(
+        delete(model).where(model.id.in_(select(tree.c.id))).execution_options(synchronize_session=False)
+    ).rowcount
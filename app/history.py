@@ -0,0 +1,232 @@
+from datetime import datetime
+
+from sqlalchemy import and_, case, event, func, inspect, insert, literal, or_, select, true, union_all
+from sqlalchemy.orm import Session
+
+from app import models, snapshots
+
+# Point-in-time history of metrics (definitions and thresholds) and results,
+# for as-of reporting ("what did the dashboard show at quarter end?").
+#
+# The live tables hold the current version of each row: a metric from its
+# updated_at, a result from its recorded_at (the results recorded before
+# this history existed have none, they count as recorded at uploaded_at).
+# When a row is updated or deleted, its previous state is first appended to
+# metric_versions / metric_result_versions with the period it was current
+# [valid_from, valid_to), and the new state starts at that same valid_to.
+# Version rows are never updated. Ingest only inserts, so it writes no
+# version rows, only corrections do.
+#
+# Two time axes: a result's uploaded_at is the time the value is for, and
+# the recording periods above are the times it was known. A state as of T
+# is the one recorded at T, and a metric's latest result as of T is the
+# most recent one uploaded at or before T among the results recorded then.
+# Results late-loaded after T with an earlier uploaded_at are not part of
+# the past view.
+#
+# ORM writes are recorded automatically; code updating or deleting metrics
+# with Core statements calls record_metrics() first, and record_results()
+# before deleting results (app.deletes does, for a deleted metric's results).
+# Retention is a purge, not a correction: the results it removes keep no
+# versions, the past views only reach back as far as the retention. Risk
+# type and business unit names are the current ones.
+
+METRIC_COLUMNS = (
+    "name", "type", "level", "description", "unit", "status", "warning_threshold", "limit_threshold",
+    "retention_days", "risk_type_id", "business_unit_id", "created_by", "created_at",
+)
+RESULT_COLUMNS = ("metric_id", "value", "uploaded_by", "uploaded_at")
+
+
+def columns_changed(obj):
+    """True if a column of a dirty object changed (a relationship, e.g. metric.latest, doesn't count)."""
+    state = inspect(obj)
+    return any(state.attrs[prop.key].history.has_changes() for prop in state.mapper.column_attrs)
+
+
+def record_metrics(db: Session, condition, now):
+    """Append the current state of the metrics matching condition as versions ending at now."""
+    metric = models.Metric
+    db.execute(insert(models.MetricVersion).from_select(
+        ["metric_id", *METRIC_COLUMNS, "valid_from", "valid_to"],
+        select(
+            metric.id,
+            *(getattr(metric, column) for column in METRIC_COLUMNS),
+            func.coalesce(metric.updated_at, metric.created_at),
+            literal(now, models.MetricVersion.valid_to.type),
+        ).where(condition),
+    ))
+
+
+def record_results(db: Session, condition, now):
+    """Append the current state of the results matching condition as versions ending at now."""
+    result = models.MetricResult
+    db.execute(insert(models.MetricResultVersion).from_select(
+        ["result_id", *RESULT_COLUMNS, "valid_from", "valid_to"],
+        select(
+            result.id,
+            *(getattr(result, column) for column in RESULT_COLUMNS),
+            func.coalesce(result.recorded_at, result.uploaded_at),
+            literal(now, models.MetricResultVersion.valid_to.type),
+        ).where(condition),
+    ))
+
+
+@event.listens_for(Session, "before_flush")
+def _record_versions(session, flush_context, instances):
+    # Before the flush, so the previous states are still the ones in the database
+    now = datetime.now()
+    metric_ids, result_ids = [], []
+    for obj in session.dirty:
+        if isinstance(obj, models.Metric) and columns_changed(obj):
+            metric_ids.append(obj.id)
+            obj.updated_at = now  # The new state starts where the version ends
+        elif isinstance(obj, models.MetricResult) and columns_changed(obj):
+            result_ids.append(obj.id)
+            obj.recorded_at = now
+    for obj in session.deleted:
+        if isinstance(obj, models.Metric):
+            metric_ids.append(obj.id)
+        elif isinstance(obj, models.MetricResult):
+            result_ids.append(obj.id)
+    if metric_ids:
+        record_metrics(session, models.Metric.id.in_(metric_ids), now)
+    if result_ids:
+        record_results(session, models.MetricResult.id.in_(result_ids), now)
+
+
+def metric_states(as_of):
+    """Subquery of the metrics as they were at as_of (id and the metric columns, updated_at their start)."""
+    metric, version = models.Metric, models.MetricVersion
+    return union_all(
+        select(metric.id, *(getattr(metric, column) for column in METRIC_COLUMNS), metric.updated_at)
+        .where(metric.updated_at <= as_of),
+        select(
+            version.metric_id.label("id"),
+            *(getattr(version, column) for column in METRIC_COLUMNS),
+            version.valid_from.label("updated_at"),
+        )
+        .where(version.valid_to > as_of, version.valid_from <= as_of),
+    ).subquery("metrics_as_of")
+
+
+def result_states(as_of, metric_id=None):
+    """Subquery of the results recorded at as_of and uploaded at or before it, optionally of one metric."""
+    result, version = models.MetricResult, models.MetricResultVersion
+    current = select(result.id, *(getattr(result, column) for column in RESULT_COLUMNS)).where(
+        result.uploaded_at <= as_of,
+        or_(result.recorded_at.is_(None), result.recorded_at <= as_of),
+    )
+    previous = select(version.result_id.label("id"), *(getattr(version, column) for column in RESULT_COLUMNS)).where(
+        version.uploaded_at <= as_of,
+        version.valid_to > as_of,
+        version.valid_from <= as_of,
+    )
+    if metric_id is not None:
+        current = current.where(result.metric_id == metric_id)
+        previous = previous.where(version.metric_id == metric_id)
+    return union_all(current, previous).subquery("metric_results_as_of")
+
+
+def metric_results(as_of, metric_id):
+    """A metric's results as of a time, most recent first (same columns as MetricResultResponse)."""
+    results = result_states(as_of, metric_id)
+    return select(results).order_by(results.c.uploaded_at.desc(), results.c.id.desc())
+
+
+def _latest_results(as_of, states, dialect_name):
+    """(from clause, join condition) of the latest result of each metric state as of a time."""
+    results = result_states(as_of)
+    if dialect_name == "postgresql":
+        # One index probe per metric (metric_id, uploaded_at desc) in each branch of the union
+        latest = (
+            select(results.c.value, results.c.uploaded_at)
+            .where(results.c.metric_id == states.c.id)
+            .order_by(results.c.uploaded_at.desc(), results.c.id.desc())
+            .limit(1)
+            .lateral("latest")
+        )
+        return latest, true()
+    ranked = select(
+        results.c.metric_id,
+        results.c.value,
+        results.c.uploaded_at,
+        func.row_number().over(
+            partition_by=results.c.metric_id, order_by=(results.c.uploaded_at.desc(), results.c.id.desc())
+        ).label("position"),
+    ).subquery("latest")
+    return ranked, and_(ranked.c.metric_id == states.c.id, ranked.c.position == 1)
+
+
+def metric_rows(as_of, dialect_name="postgresql", metric_id=None):
+    """queries.metric_rows() as of a time: each metric's state then, its latest value and breach status then."""
+    states = metric_states(as_of)
+    latest, on = _latest_results(as_of, states, dialect_name)
+    statement = (
+        select(
+            states.c.id,
+            states.c.name,
+            states.c.type,
+            states.c.level,
+            states.c.description,
+            states.c.unit,
+            states.c.status,
+            states.c.warning_threshold,
+            states.c.limit_threshold,
+            states.c.retention_days,
+            states.c.risk_type_id,
+            models.RiskType.name.label("risk_type"),
+            states.c.business_unit_id,
+            models.BusinessUnit.name.label("business_unit"),
+            latest.c.value.label("latest_value"),
+            case(
+                (latest.c.value.is_(None), None),
+                else_=snapshots.breach_status_expr(latest.c.value, states.c.warning_threshold, states.c.limit_threshold),
+            ).label("breach_status"),
+            states.c.created_by,
+            states.c.created_at,
+            states.c.updated_at,
+        )
+        .select_from(states)
+        .outerjoin(models.RiskType, states.c.risk_type_id == models.RiskType.id)
+        .outerjoin(models.BusinessUnit, states.c.business_unit_id == models.BusinessUnit.id)
+        .outerjoin(latest, on)
+        .order_by(states.c.id)
+    )
+    if metric_id is not None:
+        statement = statement.where(states.c.id == metric_id)
+    return statement
+
+
+def metric_versions(metric_id):
+    """Every recorded state of a metric, oldest first, the current one last (valid_to None)."""
+    metric, version = models.Metric, models.MetricVersion
+    states = union_all(
+        select(
+            version.metric_id, *(getattr(version, column) for column in METRIC_COLUMNS), version.valid_from, version.valid_to,
+        ).where(version.metric_id == metric_id),
+        select(
+            metric.id.label("metric_id"),
+            *(getattr(metric, column) for column in METRIC_COLUMNS),
+            func.coalesce(metric.updated_at, metric.created_at).label("valid_from"),
+            literal(None, version.valid_to.type).label("valid_to"),
+        ).where(metric.id == metric_id),
+    ).subquery("metric_states")
+    return select(states).order_by(states.c.valid_from, states.c.valid_to.is_(None))
+
+
+def result_versions(result_id):
+    """Every recorded state of a result, oldest first, the current one last (valid_to None)."""
+    result, version = models.MetricResult, models.MetricResultVersion
+    states = union_all(
+        select(
+            version.result_id, *(getattr(version, column) for column in RESULT_COLUMNS), version.valid_from, version.valid_to,
+        ).where(version.result_id == result_id),
+        select(
+            result.id.label("result_id"),
+            *(getattr(result, column) for column in RESULT_COLUMNS),
+            func.coalesce(result.recorded_at, result.uploaded_at).label("valid_from"),
+            literal(None, version.valid_to.type).label("valid_to"),
+        ).where(result.id == result_id),
+    ).subquery("result_states")
+    return select(states).order_by(states.c.valid_from, states.c.valid_to.is_(None))
@@ -0,0 +1,360 @@
+import csv
+import io
+import time
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models, schemas, cache, deletes, etags, events, history, risk_engine, snapshots
+
+try:
+    import openpyxl
+except ImportError:  # In requirements.txt, Excel imports answer 501 without it
+    openpyxl = None
+
+# Catalog imports: metric definitions, risk types and business units from a
+# CSV or Excel (.xlsx, first sheet) file with a header row. Records are
+# matched on their unique name and references are by name too (a node's
+# parent, a metric's risk type and business unit), so a catalog can be
+# exported from another system and imported as is, again and again.
+#
+# The file is read as a stream and validated row by row, the names are
+# resolved in memory against one load of the reference tables, and only new
+# or changed records are written, CHUNK_SIZE at a time with
+# INSERT ... ON CONFLICT (name) DO UPDATE. Parents are written before their
+# children (by depth), whatever their order in the file. The whole import
+# is one transaction and the response is a diff report: created names,
+# changed fields per updated record and rejected rows. With dry_run the
+# report is computed and nothing is written. Columns left out of the file,
+# and empty cells, keep the stored values of existing records.
+
+CHUNK_SIZE = 1000
+MAX_REPORTED = 1000  # Entries per list of the report
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FORMATS = {"text/csv": "csv", XLSX: "xlsx"}
+
+REFERENCE_MODELS = {"risk_types": models.RiskType, "business_units": models.BusinessUnit}
+KINDS = ("metrics", *REFERENCE_MODELS)
+
+REFERENCE_FIELDS = ("level", "status", "description", "parent")
+METRIC_FIELDS = (
+    "type", "level", "description", "unit", "status", "warning_threshold", "limit_threshold",
+    "retention_days", "risk_type", "business_unit",
+)
+
+
+def body_format(content_type):
+    """Map a Content-Type header to csv/xlsx (None if unsupported)."""
+    if not content_type:
+        return None
+    return FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+def _read_rows(fmt, body):
+    """Yield (row number, raw dict) from an upload file object, empty cells left out."""
+    if fmt == "csv":
+        text = io.TextIOWrapper(body, encoding="utf-8-sig", newline="")
+        for index, row in enumerate(csv.DictReader(text)):
+            yield index, {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and isinstance(value, str) and value.strip()
+            }
+        return
+
+    try:
+        workbook = openpyxl.load_workbook(body, read_only=True, data_only=True)
+    except Exception as e:  # Not a zip, not a workbook...
+        raise ValueError(f"Invalid Excel file: {e}")
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        keys = [str(cell).strip() if cell is not None else None for cell in header]
+        for index, values in enumerate(rows):
+            row = {
+                key: value.strip() if isinstance(value, str) else value
+                for key, value in zip(keys, values)
+                if key and value not in (None, "")
+            }
+            if row:
+                yield index, row
+    finally:
+        workbook.close()
+
+
+def _validate(schema, raw):
+    try:
+        return schema.model_validate(raw), None
+    except ValidationError as e:
+        first = e.errors()[0]
+        location = ".".join(str(part) for part in first["loc"])
+        return None, f"{location}: {first['msg']}" if location else first["msg"]
+
+
+def _dialect_insert(db: Session):
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _upsert(db: Session, model, rows, update_columns):
+    """Insert or update rows on their name, return {name: id}."""
+    statement = _dialect_insert(db)(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.name],
+        set_={column: statement.excluded[column] for column in update_columns},
+    ).returning(model.name, model.id)
+    return dict(db.execute(statement).all())
+
+
+def _merge(current, new, provided):
+    """New values of an existing record: the stored ones for the fields not provided by the file."""
+    return {field: value if field in provided else current[field] for field, value in new.items()}
+
+
+def _changes(old, new, fields):
+    return {field: [old[field], new[field]] for field in fields if old[field] != new[field]}
+
+
+class _Report:
+    def __init__(self, kind, dry_run):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.received = 0
+        self.created = []
+        self.updated = []
+        self.unchanged = 0
+        self.errors = []
+
+    def reject(self, index, error):
+        self.errors.append(schemas.BulkRowError(row=index, error=error))
+
+    def response(self, elapsed):
+        lists = (self.created, self.updated, self.errors)
+        return schemas.ImportResponse(
+            kind=self.kind,
+            dry_run=self.dry_run,
+            received=self.received,
+            created=len(self.created),
+            updated=len(self.updated),
+            unchanged=self.unchanged,
+            failed=len(self.errors),
+            created_names=self.created[:MAX_REPORTED],
+            updates=self.updated[:MAX_REPORTED],
+            errors=sorted(self.errors, key=lambda error: error.row)[:MAX_REPORTED],
+            truncated=any(len(entries) > MAX_REPORTED for entries in lists),
+            elapsed_seconds=round(elapsed, 3),
+        )
+
+
+def _depths(rows, parents):
+    """Depth of each imported node in the tree as it will be after the import, or an error.
+
+    `parents` maps every node name (stored and imported) to its parent name
+    after the import. Returns ({name: depth}, {name: error}).
+    """
+    depths, errors = {}, {}
+    for name in rows:
+        path = []
+        node = name
+        while node is not None and node not in depths and node not in errors:
+            if node in path:
+                cycle = path[path.index(node):]
+                for member in cycle:
+                    errors[member] = "Parent cycle: " + " > ".join(cycle + [node])
+                break
+            path.append(node)
+            parent = parents[node]
+            if parent is not None and parent not in parents:
+                errors[node] = f"Unknown parent {parent!r}"
+                break
+            node = parent
+        for member in reversed(path):
+            if member in depths or member in errors:
+                continue
+            parent = parents[member]
+            if parent is None:
+                depths[member] = 0
+            elif parent in errors:
+                errors[member] = f"Parent {parent!r} was rejected"
+            else:
+                depths[member] = depths[parent] + 1
+    return depths, errors
+
+
+def _import_reference(db: Session, model, rows, report):
+    stored = {
+        row.name: row
+        for row in db.execute(select(model.id, model.name, model.level, model.status, model.description, model.parent_id))
+    }
+    names_by_id = {row.id: row.name for row in stored.values()}
+    parents = {name: names_by_id.get(row.parent_id) for name, row in stored.items()}
+    parents.update({
+        name: row.parent if "parent" in row.model_fields_set else parents.get(name)
+        for name, (_, row) in rows.items()
+    })
+    depths, errors = _depths(rows, parents)
+
+    changed = []  # (depth, values)
+    for name, (index, row) in rows.items():
+        if name in errors:
+            report.reject(index, errors[name])
+            continue
+        new = row.model_dump(include=set(REFERENCE_FIELDS))
+        old = stored.get(name)
+        if old is None:
+            report.created.append(name)
+        else:
+            current = dict(level=old.level, status=old.status, description=old.description, parent=names_by_id.get(old.parent_id))
+            new = _merge(current, new, row.model_fields_set)
+            changes = _changes(current, new, REFERENCE_FIELDS)
+            if not changes:
+                report.unchanged += 1
+                continue
+            report.updated.append(schemas.ImportUpdate(name=name, changes=changes))
+        changed.append((depths[name], name, new))
+
+    if report.dry_run or not changed:
+        return
+    ids = {name: row.id for name, row in stored.items()}
+    changed.sort(key=lambda item: item[0])
+    for start in range(0, len(changed), CHUNK_SIZE):
+        chunk = changed[start:start + CHUNK_SIZE]
+        # Sorted by depth: a parent is written by an earlier chunk or statement than its children
+        for depth in sorted({depth for depth, _, _ in chunk}):
+            values = [
+                dict(
+                    name=name,
+                    level=new["level"],
+                    status=new["status"],
+                    description=new["description"],
+                    parent_id=ids[new["parent"]] if new["parent"] is not None else None,
+                )
+                for row_depth, name, new in chunk
+                if row_depth == depth
+            ]
+            ids.update(_upsert(db, model, values, ("level", "status", "description", "parent_id")))
+    etags.touch(db, model.__tablename__)
+    risk_engine.invalidate_on_commit(db)
+
+
+def _level(value):
+    # Metric levels are stored as strings, typed as int in the API
+    return int(value) if value is not None and value.lstrip("-").isdigit() else value
+
+
+def _import_metrics(db: Session, rows, report):
+    risk_type_ids = dict(db.execute(select(models.RiskType.name, models.RiskType.id)).all())
+    business_unit_ids = dict(db.execute(select(models.BusinessUnit.name, models.BusinessUnit.id)).all())
+    risk_type_names = {id: name for name, id in risk_type_ids.items()}
+    business_unit_names = {id: name for name, id in business_unit_ids.items()}
+    now = datetime.now()
+    written = False
+
+    items = list(rows.items())
+    for start in range(0, len(items), CHUNK_SIZE):
+        chunk = items[start:start + CHUNK_SIZE]
+        stored = {
+            metric.name: metric
+            for metric in db.execute(
+                select(models.Metric).where(models.Metric.name.in_([name for name, _ in chunk]))
+            ).scalars()
+        }
+        values = []
+        updated_ids = []
+        threshold_changes = []
+        for name, (index, row) in chunk:
+            if row.risk_type not in risk_type_ids:
+                report.reject(index, f"Unknown risk type {row.risk_type!r}")
+                continue
+            if row.business_unit not in business_unit_ids:
+                report.reject(index, f"Unknown business unit {row.business_unit!r}")
+                continue
+            old = stored.get(name)
+            if old is not None and old.status == deletes.DELETING:
+                report.reject(index, "Metric is being deleted")
+                continue
+            new = row.model_dump(include=set(METRIC_FIELDS))
+            if old is None:
+                report.created.append(name)
+            else:
+                current = {field: getattr(old, field) for field in METRIC_FIELDS if field not in ("risk_type", "business_unit")}
+                current.update(
+                    level=_level(old.level),
+                    risk_type=risk_type_names.get(old.risk_type_id),
+                    business_unit=business_unit_names.get(old.business_unit_id),
+                )
+                new = _merge(current, new, row.model_fields_set)
+                changes = _changes(current, new, METRIC_FIELDS)
+                if not changes:
+                    report.unchanged += 1
+                    continue
+                report.updated.append(schemas.ImportUpdate(name=name, changes=changes))
+                updated_ids.append(old.id)
+                if changes.keys() & {"warning_threshold", "limit_threshold"}:
+                    threshold_changes.append(old.id)
+            new.update(
+                level=str(new["level"]),
+                risk_type_id=risk_type_ids[new.pop("risk_type")],
+                business_unit_id=business_unit_ids[new.pop("business_unit")],
+                name=name,
+                created_by=row.created_by,
+                created_at=now,
+                updated_at=now,
+            )
+            values.append(new)
+
+        if report.dry_run or not values:
+            continue
+        update_columns = [column for column in values[0] if column not in ("name", "created_by", "created_at")]
+        if updated_ids:
+            history.record_metrics(db, models.Metric.id.in_(updated_ids), now)  # The new states start at now (updated_at)
+        _upsert(db, models.Metric, values, update_columns)
+        # The snapshots' breach status follows the new thresholds (and records breach events)
+        snapshots.refresh_many(db, threshold_changes)
+        written = True
+
+    if written:
+        etags.touch(db, "metrics")
+        risk_engine.invalidate_on_commit(db)
+        events.emit(db, events.RELOAD)
+
+
+def run_import(db: Session, kind, fmt, body, dry_run=False):
+    """Import an uploaded file (a binary file object) of `kind` records and return an ImportResponse."""
+    started = time.perf_counter()
+    report = _Report(kind, dry_run)
+    schema = schemas.MetricImportRow if kind == "metrics" else schemas.ReferenceImportRow
+
+    rows = {}  # name -> (row number, validated row), in file order
+    for index, raw in _read_rows(fmt, body):
+        report.received += 1
+        row, error = _validate(schema, raw)
+        if error is not None:
+            report.reject(index, error)
+        elif row.name in rows:
+            report.reject(index, f"Duplicate name {row.name!r}, first at row {rows[row.name][0]}")
+        else:
+            rows[row.name] = (index, row)
+
+    try:
+        if kind == "metrics":
+            _import_metrics(db, rows, report)
+        else:
+            _import_reference(db, REFERENCE_MODELS[kind], rows, report)
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise ValueError(f"Import failed, nothing was written: {e.orig}")
+    if kind in REFERENCE_MODELS and not dry_run:
+        cache.invalidate(kind)
+    return report.response(time.perf_counter() - started)
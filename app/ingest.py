@@ -0,0 +1,245 @@
+import csv
+import io
+import itertools
+import json
+import time
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import models, schemas, snapshots, rollups, deletes, etags
+
+# Bulk ingestion of metric results. Rows are validated and written in chunks,
+# each chunk in its own transaction: metric ids are checked with one set-based
+# lookup, rows go in through PostgreSQL COPY (multi-row INSERT on other
+# databases), the latest value snapshots are refreshed for the touched
+# metrics and the rows are merged into the rollups. A bad row or a failing
+# chunk is reported without aborting the rest.
+#
+# Bodies are read as a stream, only the current chunk is in memory: NDJSON
+# and CSV line by line, a JSON array one element at a time (_json_array). A
+# JSON syntax error can't be skipped like a bad NDJSON line: the element
+# where it is found is reported and the rest of the body is not read (the
+# chunks before it are ingested).
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+SPOOL_SIZE = 8 * 1024 * 1024  # Uploads bigger than this are spooled to disk
+READ_SIZE = 64 * 1024  # Characters read at a time from a JSON array body
+
+FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "text/csv": "csv",
+}
+
+COPY_COLUMNS = ("metric_id", "value", "uploaded_by", "uploaded_at")
+
+
+def body_format(content_type):
+    """Map a Content-Type header to json/ndjson/csv (None if unsupported)."""
+    if not content_type:
+        return None
+    return FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+def _json_array(text):
+    """Yield (index, element or error message) from a JSON array read READ_SIZE characters at a time.
+
+    Raises ValueError if the body isn't an array or its first element is
+    invalid; a later syntax error ends it with an error for that element.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def peek():
+        # The next non-whitespace character ("" at the end), reading more as needed
+        nonlocal buffer, position, eof
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            buffer, position = text.read(READ_SIZE), 0
+            eof = not buffer
+
+    if peek() != "[":
+        raise ValueError("JSON body must be an array of results")
+    position += 1
+    if peek() == "]":
+        position += 1
+        index = 0
+    else:
+        for index in itertools.count():
+            peek()  # raw_decode doesn't skip whitespace
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                    # A number ending the buffer may go on in the next read
+                    if end < len(buffer) or eof:
+                        break
+                except json.JSONDecodeError as e:
+                    if eof:
+                        # e.msg without the position, which is in the buffer, not in the body
+                        if index == 0:
+                            raise ValueError(f"Invalid JSON body: {e.msg}")
+                        yield index, f"Invalid JSON: {e.msg}"
+                        return
+                more = text.read(READ_SIZE)
+                buffer, position, eof = buffer[position:] + more, 0, not more
+            position = end
+            yield index, element
+            separator = peek()
+            position += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                yield index + 1, "Invalid JSON: expected ',' or ']' after the previous row"
+                return
+        index += 1
+    if peek():
+        yield index, "Invalid JSON: data after the end of the array"
+
+
+def _read_rows(fmt, body):
+    """Yield (row number, raw dict or error message) from an upload file object."""
+    text = io.TextIOWrapper(body, encoding="utf-8", newline="")
+    if fmt == "json":
+        yield from _json_array(text)
+    elif fmt == "ndjson":
+        index = 0
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, f"Invalid JSON: {e}"
+            index += 1
+    else:
+        for index, row in enumerate(csv.DictReader(text)):
+            # Empty CSV cells mean "not provided"
+            yield index, {key: value for key, value in row.items() if value not in ("", None)}
+
+
+def _validate(raw):
+    if not isinstance(raw, dict):
+        return None, raw if isinstance(raw, str) else "Row must be an object"
+    try:
+        return schemas.MetricResultBulkRow.model_validate(raw), None
+    except ValidationError as e:
+        first = e.errors()[0]
+        location = ".".join(str(part) for part in first["loc"])
+        return None, f"{location}: {first['msg']}" if location else first["msg"]
+
+
+def _copy_rows(db: Session, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in COPY_COLUMNS])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY metric_results ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _write_chunk(db: Session, rows, use_copy):
+    if use_copy:
+        _copy_rows(db, rows)
+    else:
+        db.execute(insert(models.MetricResult), rows)
+    snapshots.refresh_many(db, {row["metric_id"] for row in rows})
+    rollups.add_rows(db, rows)
+    etags.touch(db, "metric_results")
+
+
+class _Batch:
+    def __init__(self, db: Session):
+        self.db = db
+        self.use_copy = db.bind.dialect.name == "postgresql" and db.bind.dialect.driver == "psycopg2"
+        self.known_metrics = {}  # metric_id -> exists, shared by all chunks
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def reject(self, index, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.BulkRowError(row=index, error=error))
+
+    def flush(self, chunk, uploaded_at):
+        if not chunk:
+            return
+        unknown = {row.metric_id for _, row in chunk} - self.known_metrics.keys()
+        if unknown:
+            found = {
+                metric_id
+                for (metric_id,) in self.db.query(models.Metric.id).filter(
+                    models.Metric.id.in_(unknown), models.Metric.status != deletes.DELETING
+                )
+            }
+            self.known_metrics.update({metric_id: metric_id in found for metric_id in unknown})
+
+        rows = []
+        indexes = []
+        for index, row in chunk:
+            if not self.known_metrics[row.metric_id]:
+                self.reject(index, f"Metric {row.metric_id} not found")
+                continue
+            values = row.model_dump()
+            if values["uploaded_at"] is None:
+                values["uploaded_at"] = uploaded_at
+            rows.append(values)
+            indexes.append(index)
+        if not rows:
+            return
+
+        try:
+            _write_chunk(self.db, rows, self.use_copy)
+            self.db.commit()
+            self.inserted += len(rows)
+        except Exception as e:
+            self.db.rollback()
+            message = f"Chunk failed: {getattr(e, 'orig', e)}"
+            for index in indexes:
+                self.reject(index, message)
+
+
+def ingest(db: Session, fmt, body):
+    """Ingest an uploaded body (a binary file object) and return a BulkIngestResponse."""
+    started = time.perf_counter()
+    uploaded_at = datetime.now()
+    batch = _Batch(db)
+    chunk = []
+    for index, raw in _read_rows(fmt, body):
+        batch.received += 1
+        row, error = _validate(raw)
+        if error is not None:
+            batch.reject(index, error)
+            continue
+        chunk.append((index, row))
+        if len(chunk) >= CHUNK_SIZE:
+            batch.flush(chunk, uploaded_at)
+            chunk = []
+    batch.flush(chunk, uploaded_at)
+
+    elapsed = time.perf_counter() - started
+    return schemas.BulkIngestResponse(
+        received=batch.received,
+        inserted=batch.inserted,
+        failed=batch.failed,
+        errors=sorted(batch.errors, key=lambda error: error.row),
+        errors_truncated=batch.failed > len(batch.errors),
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round(batch.inserted / elapsed, 1) if elapsed > 0 else 0.0,
+    )
@@ -0,0 +1,248 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from app import config
+
+try:
+    import prometheus_client
+except ImportError:  # Optional, /prometheus is unavailable without it
+    prometheus_client = None
+
+# Per-request performance counters. The middleware starts a RequestStats for
+# each HTTP request in a context variable; SQLAlchemy cursor events on the
+# engines (see app.database) add every statement's count and duration to it,
+# and app.serialization adds the JSON encoding time. The context is copied
+# into the threadpool running sync handlers, and the stats object is shared,
+# so both kinds of handlers are covered.
+#
+# Rows are the rows read plus the rows written. Drivers don't report a row
+# count for SELECTs (-1, or 0 for server-side cursors), so the cursor of a
+# statement returning rows is wrapped to count them as the result fetches
+# them; other statements add their rowcount. Serialization time only covers serialization.json_response:
+# handlers returning models are encoded by FastAPI inside the route, that
+# time is part of "app". Streamed responses (exports) read after the
+# response started, their rows and time aren't in the header or histograms.
+#
+# When the response starts the stats go out as a Server-Timing header and
+# into Prometheus histograms labeled by route template (GET /prometheus, when
+# prometheus_client is installed). Statements slower than
+# EGRC_SLOW_QUERY_MS are logged with their parameters and EXPLAIN plan.
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "db_seconds", "rows", "serialize_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current():
+    """Stats of the request being handled, None outside of a request."""
+    return _current.get()
+
+
+class timed_serialization:
+    """Context manager adding the enclosed time to the request's serialization time."""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        stats = _current.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - self.started
+
+
+# ------------------- SQLAlchemy hooks -------------------
+
+class _CountingCursor:
+    """DBAPI cursor proxy adding the rows fetched through it to a request's stats."""
+
+    def __init__(self, cursor, stats):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_stats", stats)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()[1]
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if context is not None and cursor.description is not None:
+            # Returns rows: the result is set up from context.cursor right after this event
+            context.cursor = _CountingCursor(cursor, stats)
+        elif cursor.rowcount and cursor.rowcount > 0:  # Rows written, -1 when the driver doesn't know
+            stats.rows += cursor.rowcount
+    if config.SLOW_QUERY_MS and elapsed * 1000 >= config.SLOW_QUERY_MS:
+        _log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(exception_context):
+    # A statement failing in the driver never reaches after_cursor_execute, drop
+    # its start time, or the next statements on this pooled connection would be
+    # timed from it (errors after after_cursor_execute have nothing left to pop)
+    connection, context = exception_context.connection, exception_context.execution_context
+    started = connection.info.get("query_started") if connection is not None else None
+    if started and context is not None and started[-1][0] is context:
+        elapsed = time.perf_counter() - started.pop()[1]
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+
+def _explain(conn, statement, parameters):
+    """Plan of a read statement, through a raw DBAPI cursor so it isn't instrumented itself."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed):
+    plan = None
+    if config.SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+    logger.warning(
+        "Slow query (%.1f ms): %s\nParameters: %r%s",
+        elapsed * 1000, statement, parameters, f"\nPlan:\n{plan}" if plan else "",
+    )
+
+
+def instrument_engine(engine):
+    """Record the statements of a (sync) engine in the request stats."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ------------------- Prometheus -------------------
+
+if prometheus_client is not None:
+    _LABELS = ("method", "route")
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        "egrc_request_duration_seconds", "Time until the response starts", _LABELS + ("status",)
+    )
+    DB_SECONDS = prometheus_client.Histogram("egrc_request_db_seconds", "Time spent in SQL statements", _LABELS)
+    SERIALIZE_SECONDS = prometheus_client.Histogram(
+        "egrc_request_serialize_seconds", "Time spent encoding JSON", _LABELS,
+        buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+    QUERIES = prometheus_client.Histogram(
+        "egrc_request_queries", "SQL statements per request", _LABELS,
+        buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+    )
+    ROWS = prometheus_client.Histogram(
+        "egrc_request_rows", "Rows returned or affected per request", _LABELS,
+        buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000),
+    )
+
+
+def prometheus_exposition():
+    """(body, content type) of the Prometheus metrics, None without prometheus_client."""
+    if prometheus_client is None:
+        return None
+    registry = prometheus_client.REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Several uvicorn workers, aggregate their metric files
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def _observe(method, route, status, stats, elapsed):
+    labels = (method, route)
+    REQUEST_SECONDS.labels(*labels, str(status)).observe(elapsed)
+    DB_SECONDS.labels(*labels).observe(stats.db_seconds)
+    SERIALIZE_SECONDS.labels(*labels).observe(stats.serialize_seconds)
+    QUERIES.labels(*labels).observe(stats.queries)
+    ROWS.labels(*labels).observe(stats.rows)
+
+
+# ------------------- Middleware -------------------
+
+def server_timing(stats, elapsed):
+    return ", ".join((
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries, {stats.rows} rows"',
+        f"serialize;dur={stats.serialize_seconds * 1000:.2f}",
+        f"app;dur={max(0.0, elapsed - stats.db_seconds - stats.serialize_seconds) * 1000:.2f}",
+        f"total;dur={elapsed * 1000:.2f}",
+    ))
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware collecting RequestStats for every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - stats.started
+                if config.SERVER_TIMING:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"server-timing", server_timing(stats, elapsed).encode("latin-1"))
+                    ]
+                if prometheus_client is not None:
+                    route = scope.get("route")
+                    _observe(scope["method"], route.path if route is not None else "unmatched", message["status"], stats, elapsed)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
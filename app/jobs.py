@@ -0,0 +1,163 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from app import config, models
+from app.database import SessionLocal
+
+# Background jobs for work too long for a request (large deletes, reports).
+# A job is a row of the jobs table, created in the request's transaction with
+# create() and started on a worker thread once that transaction commits, so
+# a rolled back request never leaves a running job behind. Clients poll
+# GET /jobs/{id} for the status and progress.
+#
+# Handlers are registered per kind with @handler("kind"), and are called as
+# fn(db, job, progress) with their own session. They should work in short
+# transactions and call progress(fraction) between them: it records the
+# progress and a heartbeat, and raises JobInterrupted when the process is
+# shutting down (the job is requeued). A job whose heartbeat is older than
+# JOB_STALE_SECONDS (its process died) is requeued by recover() at startup,
+# so handlers must be safe to run again from the start. Several processes
+# may run recover(): a job is claimed with a conditional UPDATE, only one of
+# them runs it.
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+HANDLERS = {}
+
+session_factory = SessionLocal
+
+
+class JobInterrupted(Exception):
+    """Raised by progress() on shutdown, the job goes back to the queue."""
+
+
+def handler(kind):
+    """Register fn(db, job, progress) -> result (JSON-ready) as the handler of a job kind."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.JOB_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def create(db: Session, kind, params=None):
+    """Add a queued job to the session, it is started when the session commits."""
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler for job kind {kind!r}")
+    job = models.Job(kind=kind, status=QUEUED, params=params, progress=0.0, created_at=datetime.now())
+    db.add(job)
+    db.flush()
+    db.info.setdefault("jobs_to_start", []).append(job.id)
+    return job
+
+
+def start(job_id):
+    _get_executor().submit(_run, job_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _start_committed(session):
+    for job_id in session.info.pop("jobs_to_start", ()):
+        start(job_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("jobs_to_start", None)
+
+
+def _claim(db: Session, job_id):
+    now = datetime.now()
+    claimed = db.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == QUEUED)
+        .values(status=RUNNING, started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def _finish(db: Session, job_id, **values):
+    db.execute(update(models.Job).where(models.Job.id == job_id).values(**values))
+    db.commit()
+
+
+def _run(job_id):
+    db = session_factory()
+    try:
+        if not _claim(db, job_id):
+            return  # Already taken by another worker
+        job = db.get(models.Job, job_id)
+
+        def progress(fraction):
+            if _stopping.is_set():
+                raise JobInterrupted()
+            db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id)
+                .values(progress=round(min(max(fraction, 0.0), 1.0), 4), heartbeat_at=datetime.now())
+            )
+            db.commit()
+
+        try:
+            result = HANDLERS[job.kind](db, job, progress)
+        except JobInterrupted:
+            db.rollback()
+            _finish(db, job_id, status=QUEUED, heartbeat_at=None)
+        except Exception as e:
+            db.rollback()
+            logger.exception("Job %s (%s) failed", job_id, job.kind)
+            _finish(db, job_id, status=FAILED, error=str(e)[:2000], finished_at=datetime.now())
+        else:
+            _finish(db, job_id, status=DONE, progress=1.0, result=result, finished_at=datetime.now())
+    except Exception:
+        logger.exception("Could not run job %s", job_id)
+    finally:
+        db.close()
+
+
+def recover(db: Session):
+    """Requeue jobs of dead processes and start the queued ones, return their ids."""
+    stale = datetime.now() - timedelta(seconds=config.JOB_STALE_SECONDS)
+    db.execute(
+        update(models.Job)
+        .where(models.Job.status == RUNNING, models.Job.heartbeat_at < stale)
+        .values(status=QUEUED, heartbeat_at=None)
+    )
+    db.commit()
+    job_ids = list(db.scalars(
+        select(models.Job.id).where(models.Job.status == QUEUED).order_by(models.Job.created_at)
+    ))
+    for job_id in job_ids:
+        start(job_id)
+    return job_ids
+
+
+def stop():
+    """Interrupt the running jobs at their next progress() call and wait for the workers."""
+    global _executor
+    _stopping.set()
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    _stopping.clear()
@@ -1,18 +1,72 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from app.api import router  # Import the router
-from app.database import engine, Base
+from app import api_async, config, events, jobs, partitions
+from app.database import SessionLocal
+from app.instrumentation import InstrumentationMiddleware
+from app.notifications import notifier
 
-app = FastAPI()
+def _recover_jobs():
+    db = SessionLocal()
+    try:
+        jobs.recover(db)
+    except Exception:
+        db.rollback()
+        logging.getLogger(__name__).exception("Could not recover the background jobs")
+    finally:
+        db.close()
 
-# Ensure tables are created
-Base.metadata.create_all(bind=engine)
+def _ensure_partitions():
+    db = SessionLocal()
+    try:
+        partitions.ensure_partitions(db)
+        db.commit()
+    except Exception:
+        # Not fatal, rows outside of the partitions land in the default one
+        db.rollback()
+        logging.getLogger(__name__).exception("Could not create the metric_results partitions")
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Partitions of the coming months (also created by scripts/manage_partitions.py)
+    _ensure_partitions()
+    # Background delivery of breach events
+    notifier.start()
+    # Live events of the other workers (EGRC_EVENTS_BACKEND=postgres)
+    events.start()
+    # Jobs left queued, or running in a process that died (e.g. large metric deletions)
+    _recover_jobs()
+    yield
+    jobs.stop()
+    events.stop()
+    notifier.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Tables are managed by Alembic migrations, run `alembic upgrade head` before starting the API
+
+# In async mode the async handlers are registered first so they take precedence
+if config.DB_MODE == "async":
+    app.include_router(api_async.router)
 
 # Include the API router
 app.include_router(router)
 
+# Compress large responses with brotli (brotli-asgi, in requirements.txt), or
+# gzip for clients without brotli support; gzip only if it isn't installed
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
+
 # Allow frontend to access API
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +76,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Query counts and timings per request (Server-Timing header, Prometheus histograms),
+# added last so it wraps the other middleware
+app.add_middleware(InstrumentationMiddleware)
+
 @app.get("/")
 def home():
     return {"message": "Welcome to the eGRC API"}
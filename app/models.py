@@ -1,38 +1,44 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, func
-from sqlalchemy.orm import relationship
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import JSON, BigInteger, Column, Integer, String, Float, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import column_property, relationship
+from app.database import Base
 
-Base = declarative_base()
+# Schema changes go through Alembic (migrations/versions), keep both in sync
 
 class Metric(Base):
     __tablename__ = "metrics"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)  # Metric name
-    type = Column(String, nullable=False) # Metric Type
+    name = Column(String, unique=True, nullable=False)  # Metric name, the key of catalog imports
+    type = Column(String, nullable=False, index=True) # Metric Type
     level = Column(String, nullable=False) # Metric level
     description = Column(String, nullable=True)  # Optional description
     unit = Column(String, nullable=True)  # Unit of measurement (%, $, count, etc.)
-    status = Column(String, default="active")  # Status: active/inactive/archived
+    status = Column(String, default="active", index=True)  # Status: active/inactive/archived
     warning_threshold = Column(Float, nullable=True)  # Warning threshold
     limit_threshold = Column(Float, nullable=True)  # Limit threshold (critical)
+    retention_days = Column(Integer, nullable=True)  # Results older than this are deleted (app.partitions), None keeps them
     # risk_type = Column(String, nullable=True)  # Risk category/type
-    risk_type_id = Column(Integer, ForeignKey("risk_types.id"), nullable=False)  # Foreign Key to RiskType
+    risk_type_id = Column(Integer, ForeignKey("risk_types.id"), nullable=False, index=True)  # Foreign Key to RiskType
     risk_type = relationship("RiskType", back_populates="metric")  # Establish relationship
     # business_unit = Column(String, nullable=True)  # Business unit related to metric
-    business_unit_id = Column(Integer, ForeignKey("business_units.id"), nullable=False)  # Foreign Key to RiskType
+    business_unit_id = Column(Integer, ForeignKey("business_units.id"), nullable=False, index=True)  # Foreign Key to RiskType
     business_unit = relationship("BusinessUnit", back_populates="metric")  # Establish relationship
-    created_by = Column(String, nullable=True)  # User who created the metric
+    created_by = Column(String, nullable=True, index=True)  # User who created the metric
     created_at = Column(DateTime, default=func.now())  # Auto timestamp on creation
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())  # Auto update timestamp
+    # Text search indexes (trigram, full text) are PostgreSQL only, created by the "metric search" migration
     
     # Relationship to MetricResult (1-to-Many)
-    results = relationship("MetricResult", back_populates="metric", order_by="MetricResult.uploaded_at.desc()", cascade="all, delete-orphan")
+    # The database cascades deletes to the results (passive_deletes: the ORM doesn't load them)
+    results = relationship("MetricResult", back_populates="metric", order_by="MetricResult.uploaded_at.desc()", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Snapshot of the most recent result (1-to-1), maintained by app.snapshots
+    latest = relationship("MetricLatest", back_populates="metric", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
     
     @property
     def latest_value(self):
         """Return the most recent metric result value (if available)."""
-        return self.results[0].value if self.results else None
+        return self.latest.value if self.latest else None
     
 class MetricResult(Base):
     __tablename__ = "metric_results"
@@ -41,11 +47,149 @@ class MetricResult(Base):
     metric_id = Column(Integer, ForeignKey("metrics.id", ondelete="CASCADE"), nullable=False)  # Foreign key to Metric
     value = Column(Float, nullable=False)  # Recorded value
     uploaded_by = Column(String, nullable=True)  # User who created the metric
-    uploaded_at = Column(DateTime, default=func.now())  # Auto timestamp on creation
+    uploaded_at = Column(DateTime, nullable=False, default=func.now())  # Auto timestamp on creation, partition key
+    # Since when this value is known: set on insert by the database, and on correction (see app.history).
+    # None for results recorded before the history existed, they count as recorded at uploaded_at
+    recorded_at = Column(DateTime, nullable=True, server_default=func.now())
     
     # Relationship back to Metric
     metric = relationship("Metric", back_populates="results")
+
+    # On PostgreSQL the table is range partitioned by month on uploaded_at and
+    # its primary key is (id, uploaded_at), see app.partitions. Ids are still
+    # unique (one sequence), so the mapping keeps id as the identity.
+
+    # Every hot query filters by metric_id and orders by uploaded_at desc;
+    # on PostgreSQL the value is included so latest-value lookups are index-only
+    __table_args__ = (
+        Index(
+            "ix_metric_results_metric_id_uploaded_at",
+            metric_id,
+            uploaded_at.desc(),
+            id.desc(),
+            postgresql_include=["value"],
+        ),
+        # Keyset pagination and time range filters of GET /results/
+        Index("ix_metric_results_uploaded_at_id", uploaded_at, id),
+    )
+
+
+class MetricVersion(Base):
+    __tablename__ = "metric_versions"
+
+    # A previous state of a metric, current from valid_from to valid_to (app.history). Append only,
+    # the current state is the metrics row itself (from its updated_at)
+    id = Column(Integer, primary_key=True)
+    metric_id = Column(Integer, nullable=False)  # No FK, the history outlives deleted metrics
+    name = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    level = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    unit = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+    warning_threshold = Column(Float, nullable=True)
+    limit_threshold = Column(Float, nullable=True)
+    retention_days = Column(Integer, nullable=True)
+    risk_type_id = Column(Integer, nullable=False)
+    business_unit_id = Column(Integer, nullable=False)
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    valid_from = Column(DateTime, nullable=False)
+    valid_to = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_metric_versions_metric_id_valid_from", metric_id, valid_from),
+        # As-of queries: the versions still current at a time are a range of valid_to
+        Index("ix_metric_versions_valid_to_valid_from", valid_to, valid_from),
+    )
+
+
+class MetricResultVersion(Base):
+    __tablename__ = "metric_result_versions"
+
+    # A previous state of a corrected or deleted result, current from valid_from to valid_to (app.history)
+    id = Column(Integer, primary_key=True)
+    result_id = Column(Integer, nullable=False)  # No FK, the history outlives deleted results
+    metric_id = Column(Integer, nullable=False)
+    value = Column(Float, nullable=False)
+    uploaded_by = Column(String, nullable=True)
+    uploaded_at = Column(DateTime, nullable=False)
+    valid_from = Column(DateTime, nullable=False)
+    valid_to = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Latest result of a metric as of a time, same order as ix_metric_results_metric_id_uploaded_at
+        Index("ix_metric_result_versions_metric_id_uploaded_at", metric_id, uploaded_at.desc(), result_id.desc()),
+        Index("ix_metric_result_versions_result_id_valid_from", result_id, valid_from),
+        Index("ix_metric_result_versions_valid_to_valid_from", valid_to, valid_from),
+    )
+
+
+class MetricLatest(Base):
+    __tablename__ = "metric_latest"
+
+    metric_id = Column(Integer, ForeignKey("metrics.id", ondelete="CASCADE"), primary_key=True)  # One row per metric
+    result_id = Column(Integer, nullable=False)  # Id of the latest MetricResult
+    value = Column(Float, nullable=False)  # Value of the latest result
+    uploaded_at = Column(DateTime, nullable=True)  # Timestamp of the latest result
+    # ok/warning/breach against the metric thresholds. The previous value is
+    # always loaded on change so app.breaches can detect transitions
+    breach_status = column_property(Column(String, nullable=False, default="ok"), active_history=True)
+
+    # Relationship back to Metric
+    metric = relationship("Metric", back_populates="latest")
     
+
+class BreachEvent(Base):
+    __tablename__ = "breach_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    metric_id = Column(Integer, ForeignKey("metrics.id", ondelete="CASCADE"), nullable=False)
+    result_id = Column(Integer, nullable=True)  # Result that caused the transition (no FK, results may be deleted)
+    previous_status = Column(String, nullable=True)  # None for the first result of a metric
+    status = Column(String, nullable=False)  # ok/warning/breach
+    value = Column(Float, nullable=True)  # Latest value at the time of the transition
+    created_at = Column(DateTime, nullable=False)
+    delivered_at = Column(DateTime, nullable=True)  # Set once every subscriber received it
+    attempts = Column(Integer, nullable=False, default=0)  # Failed delivery rounds
+
+    __table_args__ = (
+        Index("ix_breach_events_metric_id_created_at", metric_id, created_at.desc()),
+        # Undelivered events, scanned by the notification sweep
+        Index(
+            "ix_breach_events_undelivered",
+            id,
+            postgresql_where=delivered_at.is_(None),
+            sqlite_where=delivered_at.is_(None),
+        ),
+    )
+
+
+class MetricRollupHourly(Base):
+    __tablename__ = "metric_result_rollups_hourly"
+
+    metric_id = Column(Integer, ForeignKey("metrics.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Start of the hour
+    count = Column(Integer, nullable=False)  # Number of results in the hour
+    sum = Column(Float, nullable=False)  # Sum of the values (avg = sum / count)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    last_value = Column(Float, nullable=False)  # Value of the most recent result
+    last_uploaded_at = Column(DateTime, nullable=False)  # Timestamp of the most recent result
+
+
+class MetricRollupDaily(Base):
+    __tablename__ = "metric_result_rollups_daily"
+
+    metric_id = Column(Integer, ForeignKey("metrics.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Start of the day
+    count = Column(Integer, nullable=False)  # Number of results in the day
+    sum = Column(Float, nullable=False)  # Sum of the values (avg = sum / count)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    last_value = Column(Float, nullable=False)  # Value of the most recent result
+    last_uploaded_at = Column(DateTime, nullable=False)  # Timestamp of the most recent result
+
     
 class RiskType(Base):
     __tablename__ = "risk_types"
@@ -57,11 +201,11 @@ class RiskType(Base):
     description = Column(String, nullable=True)
 
     # # Self-referential foreign key to create hierarchy
-    parent_id = Column(Integer, ForeignKey("risk_types.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("risk_types.id", ondelete="CASCADE"), nullable=True, index=True)
 
     # # Relationship for hierarchical structure
     parent = relationship("RiskType", remote_side=[id], back_populates="sub_risks")
-    sub_risks = relationship("RiskType", back_populates="parent", cascade="all, delete")
+    sub_risks = relationship("RiskType", back_populates="parent", cascade="all, delete", passive_deletes=True)
 
     # Establish a one-to-many relationship with metrics
     metric = relationship("Metric", back_populates="risk_type")
@@ -76,11 +220,38 @@ class BusinessUnit(Base):
     description = Column(String, nullable=True)
 
     # # Self-referential foreign key to create hierarchy
-    parent_id = Column(Integer, ForeignKey("business_units.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("business_units.id", ondelete="CASCADE"), nullable=True, index=True)
 
     # # Relationship for hierarchical structure
     parent = relationship("BusinessUnit", remote_side=[id], back_populates="sub_business_units")
-    sub_business_units = relationship("BusinessUnit", back_populates="parent", cascade="all, delete")
+    sub_business_units = relationship("BusinessUnit", back_populates="parent", cascade="all, delete", passive_deletes=True)
 
     # Establish a one-to-many relationship with metrics
-    metric = relationship("Metric", back_populates="business_unit")
\ No newline at end of file
+    metric = relationship("Metric", back_populates="business_unit")
+
+
+class ChangeCounter(Base):
+    __tablename__ = "change_counters"
+
+    # Incremented in the same transaction as every write to the table, see app.etags
+    name = Column(String, primary_key=True)  # Table name
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    # Background work (large deletes, reports) run by app.jobs
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # Handler name, e.g. delete_metric
+    status = Column(String, nullable=False, default="queued")  # queued/running/done/failed
+    params = Column(JSON, nullable=True)
+    progress = Column(Float, nullable=False, default=0.0)  # 0 to 1
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # Updated with the progress, stale jobs are requeued
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_jobs_status_created_at", status, created_at),)
@@ -0,0 +1,192 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import update
+
+from app import config, models
+from app.database import SessionLocal
+
+# Delivery of breach events (see app.breaches) to subscribers: the configured
+# webhooks (EGRC_NOTIFY_WEBHOOK_URLS, each receives {"events": [...]} as a
+# POST) and in-process callbacks registered with notifier.subscribe().
+#
+# Committed events are put on a bounded in-memory queue and sent in batches
+# by a single worker thread, so a slow subscriber never adds latency to the
+# write path. When the queue is full new events are not queued, they stay
+# undelivered in breach_events and the periodic sweep sends them later. A
+# failing subscriber is retried with exponential backoff, and an event is
+# marked delivered once every subscriber accepted it. Delivery is at least
+# once: a subscriber may see an event twice after a partial failure.
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def event_payload(breach_event: models.BreachEvent):
+    return dict(
+        id=breach_event.id,
+        metric_id=breach_event.metric_id,
+        result_id=breach_event.result_id,
+        previous_status=breach_event.previous_status,
+        status=breach_event.status,
+        value=breach_event.value,
+        created_at=breach_event.created_at.isoformat(),
+    )
+
+
+class WebhookSubscriber:
+    def __init__(self, url, client):
+        self.url = url
+        self.client = client
+
+    def __call__(self, events):
+        response = self.client.post(self.url, json={"events": events})
+        response.raise_for_status()
+
+    def __repr__(self):
+        return f"WebhookSubscriber({self.url!r})"
+
+
+class Notifier:
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.queue = queue.Queue(maxsize=config.NOTIFY_QUEUE_SIZE)
+        self.subscribers = []
+        self.thread = None
+        self.client = None
+        self.stats = Counter()
+        self.last_sweep = time.monotonic()
+
+    def subscribe(self, callback):
+        """Register a callable receiving each batch of events (a list of dicts)."""
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def publish(self, events):
+        """Queue committed events for delivery, never blocks."""
+        for breach_event in events:
+            try:
+                self.queue.put_nowait(breach_event)
+                self.stats["queued"] += 1
+            except queue.Full:
+                # Left undelivered in the table, the sweep sends it later
+                self.stats["overflowed"] += 1
+
+    def start(self):
+        if self.thread is not None:
+            return
+        if config.NOTIFY_WEBHOOK_URLS:
+            self.client = httpx.Client(timeout=config.NOTIFY_TIMEOUT_SECONDS)
+            for url in config.NOTIFY_WEBHOOK_URLS:
+                self.subscribe(WebhookSubscriber(url, self.client))
+        self.thread = threading.Thread(target=self._run, name="breach-notifier", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        """Deliver what is already queued and stop the worker."""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        self.thread = None
+        if self.client is not None:
+            self.client.close()
+            self.subscribers = [s for s in self.subscribers if not isinstance(s, WebhookSubscriber)]
+            self.client = None
+
+    def snapshot(self):
+        return dict(self.stats, pending=self.queue.qsize(), subscribers=len(self.subscribers))
+
+    def _next_batch(self):
+        """Wait for an event, then for the batch to fill up (returns the batch and whether to stop)."""
+        try:
+            first = self.queue.get(timeout=config.NOTIFY_SWEEP_SECONDS)
+        except queue.Empty:
+            return [], False
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + config.NOTIFY_BATCH_WAIT_MS / 1000
+        while len(batch) < config.NOTIFY_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stopping = self._next_batch()
+            try:
+                if batch:
+                    self._deliver(batch)
+                if time.monotonic() - self.last_sweep >= config.NOTIFY_SWEEP_SECONDS:
+                    self.last_sweep = time.monotonic()
+                    self._sweep()
+            except Exception:
+                logger.exception("Breach notification worker failed")
+            if stopping:
+                return
+
+    def _send(self, subscriber, events):
+        for attempt in range(config.NOTIFY_RETRIES + 1):
+            try:
+                subscriber(events)
+                return True
+            except Exception as e:
+                logger.warning("Delivery to %r failed (attempt %d): %s", subscriber, attempt + 1, e)
+                if attempt < config.NOTIFY_RETRIES:
+                    time.sleep(config.NOTIFY_RETRY_BACKOFF_MS / 1000 * 2 ** attempt)
+        return False
+
+    def _deliver(self, events):
+        delivered = all([self._send(subscriber, events) for subscriber in list(self.subscribers)])
+        self.stats["batches"] += 1
+        self.stats["delivered" if delivered else "failed"] += len(events)
+        ids = [breach_event["id"] for breach_event in events]
+        values = {"delivered_at": datetime.now()} if delivered else {"attempts": models.BreachEvent.attempts + 1}
+        db = self.session_factory()
+        try:
+            db.execute(update(models.BreachEvent).where(models.BreachEvent.id.in_(ids)).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def _sweep(self):
+        """Redeliver events left undelivered (queue overflow, failed subscribers, restarts)."""
+        cutoff = datetime.now() - timedelta(seconds=config.NOTIFY_SWEEP_SECONDS)
+        db = self.session_factory()
+        try:
+            pending = (
+                db.query(models.BreachEvent)
+                .filter(
+                    models.BreachEvent.delivered_at.is_(None),
+                    models.BreachEvent.attempts < config.NOTIFY_MAX_ATTEMPTS,
+                    models.BreachEvent.created_at < cutoff,
+                )
+                .order_by(models.BreachEvent.id)
+                .limit(config.NOTIFY_BATCH_SIZE * 10)
+                .all()
+            )
+            events = [event_payload(breach_event) for breach_event in pending]
+        finally:
+            db.close()
+        self.stats["swept"] += len(events)
+        for start in range(0, len(events), config.NOTIFY_BATCH_SIZE):
+            self._deliver(events[start:start + config.NOTIFY_BATCH_SIZE])
+
+
+notifier = Notifier()
@@ -0,0 +1,36 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+# Keyset (cursor) pagination helpers. A cursor is the sort key of the last row
+# of a page, encoded as an opaque url-safe token; the next page starts strictly
+# after it, so deep pages cost the same as the first one.
+
+
+def encode_cursor(*values):
+    """Encode the sort key of a row as an opaque cursor token."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """Decode a cursor token into a tuple of values converted with the given types."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(payload) != len(types):
+            raise ValueError("wrong cursor length")
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for kind, value in zip(types, payload)
+        )
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def after(columns, values, descending=False):
+    """Filter for rows that come after the cursor values in (columns) order."""
+    key = tuple_(*columns)
+    return key < tuple_(*values) if descending else key > tuple_(*values)
@@ -0,0 +1,214 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from app import config, etags, events, models, risk_engine, snapshots
+
+# Monthly range partitions of metric_results on PostgreSQL (created by the
+# "partition metric results" migration): metric_results_pYYYYMM holds the
+# results uploaded in that month, metric_results_default anything outside of
+# the existing partitions. Queries bounded on uploaded_at (time ranges,
+# keyset pages, the latest result lookup) only touch the matching partitions.
+#
+# ensure_partitions() creates the partitions of the coming months; it runs at
+# startup and from scripts/manage_partitions.py (schedule it daily). Rows
+# already in the default partition for a new month (e.g. inserted while the
+# partitions were behind) are moved into it: the default partition is
+# detached, the month partition created, the rows moved and the default
+# partition attached again. Every worker runs it at startup, so the changes
+# of the partitions are serialized by a transaction-level advisory lock.
+# Retention is applied by the same script:
+#   - globally (EGRC_RESULTS_RETENTION_DAYS), by dropping or detaching whole
+#     partitions once all of their rows are older than the retention;
+#   - per metric (metrics.retention_days, can only be shorter than the
+#     global one), by deleting the metric's expired rows in chunks, which
+#     only scans the partitions before the cutoff.
+# Rollups keep the aggregates of removed results. Results without a date got
+# UNDATED as uploaded_at in the partitioning migration (the partition key
+# can't be NULL); they stay in the default partition and never expire.
+
+PARTITION_NAME = re.compile(r"^metric_results_p(\d{4})(\d{2})$")
+DELETE_CHUNK_SIZE = 10000
+LOCK_KEY = 0x6D725F70  # pg_advisory_xact_lock key of the partition changes
+UNDATED = datetime(1970, 1, 1)
+
+
+def is_partitioned(db: Session):
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'metric_results'::regclass")
+    ).first() is not None
+
+
+def _lock(db: Session):
+    """Wait for the other partition changes to commit, held until this transaction ends."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+
+def _next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partitions(db: Session):
+    """Monthly partitions as [(name, start, end)], oldest first."""
+    names = db.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'metric_results'::regclass"
+    ))
+    found = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1)
+            found.append((name, start, _next_month(start)))
+    return sorted(found, key=lambda partition: partition[1])
+
+
+def _create_partition(db: Session, name, month):
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    in_range = {"start": month, "end": _next_month(month)}
+    stranded = db.execute(text(
+        "SELECT 1 FROM metric_results_default WHERE uploaded_at >= :start AND uploaded_at < :end LIMIT 1"
+    ), in_range).first()
+    if stranded is None:
+        db.execute(text(f"CREATE TABLE {name} PARTITION OF metric_results {bounds}"))
+        return
+    # PostgreSQL refuses a partition whose rows are in the default one: take it
+    # out while the rows move (ATTACH checks it holds no row of the partitions).
+    # Partitions have the columns of metric_results in the same order.
+    db.execute(text("ALTER TABLE metric_results DETACH PARTITION metric_results_default"))
+    db.execute(text(f"CREATE TABLE {name} PARTITION OF metric_results {bounds}"))
+    db.execute(text(
+        "WITH moved AS ("
+        "DELETE FROM metric_results_default WHERE uploaded_at >= :start AND uploaded_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), in_range)
+    db.execute(text("ALTER TABLE metric_results ATTACH PARTITION metric_results_default DEFAULT"))
+
+
+def ensure_partitions(db: Session, months_ahead=None, now=None):
+    """Create the missing partitions from the current month to `months_ahead` months later."""
+    if not is_partitioned(db):
+        return []
+    months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    _lock(db)
+    existing = {name for name, _, _ in partitions(db)}
+    created = []
+    month = _month_start(now or datetime.now())
+    for _ in range(months_ahead + 1):
+        name = f"metric_results_p{month:%Y%m}"
+        if name not in existing:
+            _create_partition(db, name, month)
+            created.append(name)
+        month = _next_month(month)
+    return created
+
+
+def _forget_results_before(db: Session, cutoff, metric_ids=None):
+    """Move the snapshots pointing at removed results back to the newest remaining result."""
+    query = select(models.MetricLatest.metric_id).where(
+        models.MetricLatest.uploaded_at < cutoff, models.MetricLatest.uploaded_at != UNDATED
+    )
+    if metric_ids is not None:
+        query = query.where(models.MetricLatest.metric_id.in_(metric_ids))
+    stale = list(db.scalars(query))
+    if not stale:
+        return
+    snapshots.refresh_many(db, stale)
+    db.flush()
+    # Metrics without any result left
+    db.execute(
+        delete(models.MetricLatest)
+        .where(
+            models.MetricLatest.metric_id.in_(stale),
+            models.MetricLatest.uploaded_at < cutoff,
+            models.MetricLatest.uploaded_at != UNDATED,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    etags.touch(db, "metric_latest")
+    risk_engine.invalidate_on_commit(db)
+    events.emit(db, *(dict(type="metric", metric_id=metric_id, action="updated") for metric_id in stale))
+
+
+def apply_global_retention(db: Session, retention_days=None, mode=None, now=None):
+    """Drop or detach the partitions entirely older than the retention, return their names."""
+    retention_days = config.RESULTS_RETENTION_DAYS if retention_days is None else retention_days
+    mode = mode or config.RESULTS_RETENTION_MODE
+    if not retention_days or not is_partitioned(db):
+        return []
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    _lock(db)
+    expired = [(name, end) for name, _, end in partitions(db) if end <= cutoff]
+    for name, _ in expired:
+        if mode == "archive":
+            db.execute(text(f"ALTER TABLE metric_results DETACH PARTITION {name}"))
+            db.execute(text(f"ALTER TABLE {name} RENAME TO {name.replace('metric_results_', 'metric_results_archive_', 1)}"))
+        else:
+            db.execute(text(f"DROP TABLE {name}"))
+    # Rows outside of the monthly partitions (normally none) are deleted row by row
+    from_default = db.execute(
+        text("DELETE FROM metric_results_default WHERE uploaded_at < :cutoff AND uploaded_at <> :undated"),
+        {"cutoff": cutoff, "undated": UNDATED},
+    ).rowcount
+    if expired or from_default:
+        _forget_results_before(db, max([end for _, end in expired] + [cutoff if from_default else datetime.min]))
+    return [name for name, _ in expired]
+
+
+def apply_metric_retention(db: Session, now=None):
+    """Delete the expired results of the metrics with their own retention, return {metric_id: deleted rows}.
+
+    Commits after every chunk so a large backlog doesn't hold one long transaction.
+    """
+    now = now or datetime.now()
+    deleted = {}
+    for metric_id, retention_days in db.execute(
+        select(models.Metric.id, models.Metric.retention_days).where(models.Metric.retention_days.isnot(None))
+    ).all():
+        cutoff = now - timedelta(days=retention_days)
+        total = 0
+        while True:
+            chunk = (
+                select(models.MetricResult.id)
+                .where(
+                    models.MetricResult.metric_id == metric_id,
+                    models.MetricResult.uploaded_at < cutoff,
+                    models.MetricResult.uploaded_at != UNDATED,
+                )
+                .limit(DELETE_CHUNK_SIZE)
+                .scalar_subquery()
+            )
+            count = db.execute(
+                delete(models.MetricResult).where(
+                    models.MetricResult.id.in_(chunk),
+                    # Keeps the delete on the expired partitions
+                    models.MetricResult.uploaded_at < cutoff,
+                )
+            ).rowcount
+            db.commit()
+            total += count
+            if count < DELETE_CHUNK_SIZE:
+                break
+        if total:
+            _forget_results_before(db, cutoff, [metric_id])
+            db.commit()
+            deleted[metric_id] = total
+    return deleted
+
+
+def run_maintenance(db: Session):
+    """Create the coming partitions and apply both retention policies."""
+    report = {"created": ensure_partitions(db)}
+    db.commit()
+    report["expired"] = apply_global_retention(db)
+    db.commit()
+    report["deleted_results"] = apply_metric_retention(db)
+    return report
@@ -0,0 +1,60 @@
+from sqlalchemy import select
+
+from app import models
+
+# Read statements shared by the sync (app.api) and async (app.api_async)
+# handlers. They are plain select() statements so either kind of session can
+# execute them.
+
+# Listing query: one row per metric with its risk type / business unit names and
+# latest value (from the metric_latest snapshot), so serializing a metric never
+# touches the lazy relationships
+def metric_rows():
+    return (
+        select(
+            models.Metric.id,
+            models.Metric.name,
+            models.Metric.type,
+            models.Metric.level,
+            models.Metric.description,
+            models.Metric.unit,
+            models.Metric.status,
+            models.Metric.warning_threshold,
+            models.Metric.limit_threshold,
+            models.Metric.retention_days,
+            models.Metric.risk_type_id,
+            models.RiskType.name.label("risk_type"),
+            models.Metric.business_unit_id,
+            models.BusinessUnit.name.label("business_unit"),
+            models.MetricLatest.value.label("latest_value"),
+            models.MetricLatest.breach_status,
+            models.Metric.created_by,
+            models.Metric.created_at,
+            models.Metric.updated_at,
+        )
+        .outerjoin(models.RiskType, models.Metric.risk_type_id == models.RiskType.id)
+        .outerjoin(models.BusinessUnit, models.Metric.business_unit_id == models.BusinessUnit.id)
+        .outerjoin(models.MetricLatest, models.Metric.id == models.MetricLatest.metric_id)
+    )
+
+# All results of a metric, most recent first
+def metric_results(metric_id):
+    return (
+        select(models.MetricResult)
+        .where(models.MetricResult.metric_id == metric_id)
+        .order_by(models.MetricResult.uploaded_at.desc())
+    )
+
+# Latest result of a metric, through the metric_latest snapshot. On PostgreSQL
+# the join also matches uploaded_at so only one partition of metric_results is
+# read (SQLite stores server-side timestamps in another text format, where the
+# equality wouldn't hold)
+def latest_metric_result(metric_id, dialect_name="postgresql"):
+    condition = models.MetricLatest.result_id == models.MetricResult.id
+    if dialect_name == "postgresql":
+        condition &= models.MetricLatest.uploaded_at == models.MetricResult.uploaded_at
+    return (
+        select(models.MetricResult)
+        .join(models.MetricLatest, condition)
+        .where(models.MetricLatest.metric_id == metric_id)
+    )
@@ -0,0 +1,215 @@
+import csv
+import html
+import io
+from datetime import date
+
+from app.timeseries import lttb
+
+try:
+    import openpyxl
+    from openpyxl.chart import LineChart, Reference
+except ImportError:  # In requirements.txt, Excel board packs answer 501 without it
+    openpyxl = None
+
+# Rendering of board pack sections (see app/reports.py). These functions run
+# in the report worker processes: they take a section as plain data (lists,
+# dicts, strings and numbers, as built by app.reports) and return the bytes
+# of its file, without touching the database.
+#
+# A section is {"title", "part", "parts", "period": [start, end], "metrics"}
+# and each metric carries its definition, thresholds, latest value, breach
+# status, business unit and "history": [[day, average], ...] over the period.
+# Charts are reduced to CHART_POINTS points with LTTB.
+#
+# Bump RENDERER_VERSION when the output of a renderer changes, the sections
+# cached by the previous version are then rendered again.
+
+RENDERER_VERSION = 1
+CHART_POINTS = 120
+CHART_WIDTH, CHART_HEIGHT = 240, 48  # Pixels, HTML sparklines
+XLSX_MAX_CHARTS = 200  # Line charts per Excel section, the other metrics only get their data
+
+EXTENSIONS = {"html": "html", "csv": "csv", "xlsx": "xlsx"}
+
+COLUMNS = (
+    "business_unit", "metric_id", "metric", "type", "level", "unit", "status",
+    "warning_threshold", "limit_threshold", "latest_value", "breach_status",
+)
+
+STATUS_COLORS = {"breach": "#c62828", "warning": "#ef6c00", "ok": "#2e7d32"}
+
+STYLE = """
+body { font-family: Arial, sans-serif; margin: 24px; color: #222; }
+h1 { font-size: 20px; } h2 { font-size: 16px; margin-top: 24px; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border-bottom: 1px solid #ddd; padding: 4px 8px; text-align: left; font-size: 13px; }
+td.number { text-align: right; }
+.status { font-weight: bold; }
+"""
+
+
+def _history(metric):
+    """The metric's chart points [(day ordinal, value), ...], at most CHART_POINTS."""
+    points = [(date.fromisoformat(day).toordinal(), value) for day, value in metric["history"]]
+    return lttb(points, CHART_POINTS)
+
+
+def _summary(metric):
+    return [
+        metric["business_unit"], metric["id"], metric["name"], metric["type"], metric["level"], metric["unit"],
+        metric["status"], metric["warning_threshold"], metric["limit_threshold"], metric["latest_value"],
+        metric["breach_status"] or "no_data",
+    ]
+
+
+def _by_business_unit(metrics):
+    """[(business unit, [metrics])], metrics come sorted by business unit."""
+    groups = []
+    for metric in metrics:
+        if not groups or groups[-1][0] != metric["business_unit"]:
+            groups.append((metric["business_unit"], []))
+        groups[-1][1].append(metric)
+    return groups
+
+
+def section_title(section):
+    if section["parts"] > 1:
+        return f"{section['title']} ({section['part']}/{section['parts']})"
+    return section["title"]
+
+
+def render_csv(section):
+    """One row per metric and chart point (one row without a date for a metric without history)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["risk_type", *COLUMNS, "date", "value"])
+    for metric in section["metrics"]:
+        summary = [section["title"], *_summary(metric)]
+        points = _history(metric)
+        if not points:
+            writer.writerow(summary + [None, None])
+        for day, value in points:
+            writer.writerow(summary + [date.fromordinal(day).isoformat(), value])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _format_number(value):
+    return "" if value is None else f"{value:,.4g}"
+
+
+def sparkline(points, period, warning_threshold=None, limit_threshold=None):
+    """Inline SVG line chart of [(day ordinal, value)] over the period, with the thresholds dashed."""
+    if not points:
+        return ""
+    start, end = (date.fromisoformat(day).toordinal() for day in period)
+    values = [value for _, value in points]
+    values += [threshold for threshold in (warning_threshold, limit_threshold) if threshold is not None]
+    low, high = min(values), max(values)
+    if high == low:
+        low, high = low - 1, high + 1
+
+    def x(day):
+        return round((day - start) / max(end - start, 1) * CHART_WIDTH, 1)
+
+    def y(value):
+        return round(CHART_HEIGHT - (value - low) / (high - low) * CHART_HEIGHT, 1)
+
+    parts = [f'<svg width="{CHART_WIDTH}" height="{CHART_HEIGHT}" viewBox="0 0 {CHART_WIDTH} {CHART_HEIGHT}">']
+    for threshold, color in ((warning_threshold, STATUS_COLORS["warning"]), (limit_threshold, STATUS_COLORS["breach"])):
+        if threshold is not None:
+            parts.append(
+                f'<line x1="0" x2="{CHART_WIDTH}" y1="{y(threshold)}" y2="{y(threshold)}" '
+                f'stroke="{color}" stroke-dasharray="4 3" stroke-width="1"/>'
+            )
+    coordinates = " ".join(f"{x(day)},{y(value)}" for day, value in points)
+    parts.append(f'<polyline points="{coordinates}" fill="none" stroke="#1565c0" stroke-width="1.5"/>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_html(section):
+    """A standalone page: a table per business unit, each metric with its sparkline."""
+    title = html.escape(section_title(section))
+    period = " to ".join(section["period"])
+    out = [
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title>",
+        f"<style>{STYLE}</style></head><body>",
+        f"<h1>{title}</h1><p>History from {period}</p>",
+    ]
+    for business_unit, metrics in _by_business_unit(section["metrics"]):
+        out.append(f"<h2>{html.escape(business_unit or 'No business unit')}</h2><table><tr>")
+        out.append("".join(f"<th>{name}</th>" for name in ("Metric", "Unit", "Warning", "Limit", "Latest", "Status", "History")))
+        out.append("</tr>")
+        for metric in metrics:
+            status = metric["breach_status"] or "no_data"
+            out.append(
+                f"<tr><td>{html.escape(metric['name'])}</td>"
+                f"<td>{html.escape(metric['unit'] or '')}</td>"
+                f"<td class=\"number\">{_format_number(metric['warning_threshold'])}</td>"
+                f"<td class=\"number\">{_format_number(metric['limit_threshold'])}</td>"
+                f"<td class=\"number\">{_format_number(metric['latest_value'])}</td>"
+                f"<td class=\"status\" style=\"color: {STATUS_COLORS.get(status, '#777')}\">{status}</td>"
+                f"<td>{sparkline(_history(metric), section['period'], metric['warning_threshold'], metric['limit_threshold'])}</td></tr>"
+            )
+        out.append("</table>")
+    out.append("</body></html>")
+    return "".join(out).encode("utf-8")
+
+
+def render_xlsx(section):
+    """A workbook: the metrics, their chart points, and a line chart per metric (up to XLSX_MAX_CHARTS)."""
+    workbook = openpyxl.Workbook()
+    summary = workbook.active
+    summary.title = "Metrics"
+    summary.append(list(COLUMNS))
+    points_sheet = workbook.create_sheet("History")
+    points_sheet.append(["metric_id", "metric", "date", "value"])
+    charts = workbook.create_sheet("Charts")
+    row = 2
+    for index, metric in enumerate(section["metrics"]):
+        summary.append(_summary(metric))
+        points = _history(metric)
+        for day, value in points:
+            points_sheet.append([metric["id"], metric["name"], date.fromordinal(day), value])
+        if points and index < XLSX_MAX_CHARTS:
+            chart = LineChart()
+            chart.title = metric["name"]
+            chart.legend = None
+            chart.height, chart.width = 6, 16
+            chart.add_data(Reference(points_sheet, min_col=4, min_row=row, max_row=row + len(points) - 1))
+            chart.set_categories(Reference(points_sheet, min_col=3, min_row=row, max_row=row + len(points) - 1))
+            charts.add_chart(chart, f"A{1 + index * 13}")
+        row += len(points)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {"html": render_html, "csv": render_csv, "xlsx": render_xlsx}
+
+
+def render(section, fmt):
+    """The file of a section in a format (html, csv or xlsx), as bytes."""
+    return RENDERERS[fmt](section)
+
+
+def render_index(title, entries, fmt):
+    """The pack's table of contents: entries are {"title", "file", "metrics", "breaches", "warnings"}."""
+    if fmt == "html":
+        rows = "".join(
+            f"<tr><td><a href=\"{html.escape(entry['file'])}\">{html.escape(entry['title'])}</a></td>"
+            f"<td class=\"number\">{entry['metrics']}</td><td class=\"number\">{entry['breaches']}</td>"
+            f"<td class=\"number\">{entry['warnings']}</td></tr>"
+            for entry in entries
+        )
+        return (
+            f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+            f"<style>{STYLE}</style></head><body><h1>{html.escape(title)}</h1><table>"
+            f"<tr><th>Section</th><th>Metrics</th><th>Breaches</th><th>Warnings</th></tr>{rows}</table></body></html>"
+        ).encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["section", "file", "metrics", "breaches", "warnings"])
+    for entry in entries:
+        writer.writerow([entry["title"], entry["file"], entry["metrics"], entry["breaches"], entry["warnings"]])
+    return buffer.getvalue().encode("utf-8")
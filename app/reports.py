@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import cache, config, hierarchy, history, jobs, models, queries, report_rendering, timeseries
+from app.database import ReadSessionLocal
+
+# Board packs: every metric with its history chart, thresholds and breach
+# status, grouped by risk type (a section per node, its metrics ordered by
+# business unit), in HTML, CSV or Excel. A pack is built by a background job
+# (POST /reports, progress at GET /jobs/{id}) into a zip of one file per
+# section and an index, downloaded from GET /reports/{job_id}/download.
+#
+# The job thread reads in bulk through server-side cursors (yield_per): the
+# metrics once, then the daily history of each section's metrics, from the
+# daily rollups, or from the recorded results for an as-of pack. Sections
+# of more than REPORT_SECTION_SIZE metrics are split in parts. Rendering is
+# CPU bound Python (LTTB, SVG, openpyxl), so sections are rendered in
+# parallel by a pool of REPORT_PROCESSES processes (app.report_rendering)
+# while the next sections are read. Processes are spawned, not forked: the
+# API process has threads and open connections.
+#
+# Rendered sections are cached by content: the key is a hash of the section
+# data, the format and the renderer version, so a section whose metrics,
+# thresholds and history didn't change since the last pack is copied from
+# REPORTS_DIR/sections instead of rendered again, e.g. the quarter-end pack
+# rebuilt with a correction in one risk type. Cached sections unused for
+# REPORT_RETENTION_DAYS, and older packs, are deleted.
+
+logger = logging.getLogger(__name__)
+
+KIND = "board_pack"
+YIELD_PER = 2000
+HISTORY_CHUNK = 1000  # Metric ids per history query
+PROGRESS_SECONDS = 1.0  # Minimum interval between progress updates
+
+
+def _paths(nodes):
+    """{id: "Root / Parent / Node"} of the nodes of a hierarchy ({id: row dict})."""
+    paths = {}
+
+    def path(node_id, depth=0):
+        if node_id not in paths:
+            node = nodes[node_id]
+            parent_id = node["parent_id"]
+            if parent_id in nodes and depth < hierarchy.MAX_DEPTH:  # Capped like the CTEs, a cycle can't recurse forever
+                paths[node_id] = path(parent_id, depth + 1) + " / " + node["name"]
+            else:
+                paths[node_id] = node["name"]
+        return paths[node_id]
+
+    for node_id in nodes:
+        path(node_id)
+    return paths
+
+
+def _metrics(db: Session, params):
+    """The metrics of the pack as dicts, current or as of params["as_of"], read with a server-side cursor."""
+    as_of = params["as_of"]
+    statement = history.metric_rows(as_of, db.bind.dialect.name) if as_of else queries.metric_rows()
+    columns = statement.selected_columns
+    for field, model in (("risk_type_id", models.RiskType), ("business_unit_id", models.BusinessUnit)):
+        if params.get(field) is not None:
+            statement = statement.where(columns[field].in_(select(hierarchy.subtree(model, params[field]).c.id)))
+    result = db.execute(statement.execution_options(yield_per=YIELD_PER))
+    for rows in result.partitions():
+        for row in rows:
+            yield row._asdict()
+
+
+def _history(db: Session, metric_ids, start, as_of):
+    """{metric_id: [[day, average], ...]} from start on, ordered by day."""
+    if as_of is None:
+        daily = models.MetricRollupDaily
+        metric_id, bucket = daily.metric_id, daily.bucket
+        statement = select(metric_id, bucket, (daily.sum / daily.count).label("value")).where(bucket >= start)
+    else:
+        # Daily averages of the results recorded at as_of (the rollups hold the current results)
+        results = history.result_states(as_of)
+        metric_id = results.c.metric_id
+        bucket = timeseries.bucket_expr(db.bind.dialect.name, "day", results.c.uploaded_at).label("bucket")
+        statement = (
+            select(metric_id, bucket, func.avg(results.c.value).label("value"))
+            .where(results.c.uploaded_at >= start)
+            .group_by(metric_id, bucket)
+        )
+    series = {}
+    for offset in range(0, len(metric_ids), HISTORY_CHUNK):
+        chunk = statement.where(metric_id.in_(metric_ids[offset:offset + HISTORY_CHUNK])).order_by(metric_id, bucket)
+        for rows in db.execute(chunk.execution_options(yield_per=YIELD_PER)).partitions():
+            for row in rows:
+                series.setdefault(row.metric_id, []).append([row.bucket.date().isoformat(), row.value])
+    return series
+
+
+def _sections(db: Session, params):
+    """[(title, [metric dicts])] in risk type order, the metrics ordered by business unit, split in parts."""
+    risk_types = _paths(cache.risk_types(db))
+    business_units = _paths(cache.business_units(db))
+    groups = {}
+    for row in _metrics(db, params):
+        groups.setdefault(row["risk_type_id"], []).append(dict(
+            id=row["id"],
+            name=row["name"],
+            type=row["type"],
+            level=row["level"],
+            unit=row["unit"],
+            status=row["status"],
+            warning_threshold=row["warning_threshold"],
+            limit_threshold=row["limit_threshold"],
+            latest_value=row["latest_value"],
+            breach_status=row["breach_status"],
+            business_unit=business_units.get(row["business_unit_id"]),
+        ))
+    sections = []
+    for risk_type_id in sorted(groups, key=lambda node_id: risk_types.get(node_id, "").split(" / ")):
+        metrics = sorted(groups[risk_type_id], key=lambda metric: (metric["business_unit"] or "", metric["name"], metric["id"]))
+        size = config.REPORT_SECTION_SIZE
+        parts = [metrics[offset:offset + size] for offset in range(0, len(metrics), size)]
+        for part, part_metrics in enumerate(parts, 1):
+            sections.append(dict(title=risk_types.get(risk_type_id, "No risk type"), part=part, parts=len(parts), metrics=part_metrics))
+    return sections
+
+
+def section_key(section, fmt):
+    """Content address of a rendered section: hash of its data, the format and the renderer version."""
+    data = json.dumps([report_rendering.RENDERER_VERSION, fmt, section], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key, fmt):
+    return os.path.join(config.REPORTS_DIR, "sections", key[:2], f"{key}.{report_rendering.EXTENSIONS[fmt]}")
+
+
+def pack_path(job_id):
+    return os.path.join(config.REPORTS_DIR, "packs", f"board-pack-{job_id}.zip")
+
+
+def _write_atomically(path, content):
+    # Several workers may render the same section: write aside and rename, readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+def _file_name(position, section, fmt):
+    slug = re.sub(r"[^a-z0-9]+", "-", section["title"].lower()).strip("-") or "section"
+    suffix = f"-{section['part']}" if section["parts"] > 1 else ""
+    return f"{position:03d}-{slug[:60]}{suffix}.{report_rendering.EXTENSIONS[fmt]}"
+
+
+def _prune():
+    """Delete the cached sections unused and the packs older than REPORT_RETENTION_DAYS."""
+    if not config.REPORT_RETENTION_DAYS:
+        return
+    expired = time.time() - config.REPORT_RETENTION_DAYS * 86400
+    for directory, _, files in os.walk(config.REPORTS_DIR):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < expired:
+                    os.remove(path)
+            except OSError:  # Removed by another worker
+                pass
+
+
+def start_report(db: Session, params):
+    """Queue a board pack job (started on commit), params as schemas.ReportCreate in JSON mode."""
+    return jobs.create(db, KIND, params)
+
+
+@jobs.handler(KIND)
+def _build_board_pack(db: Session, job, progress):
+    params = dict(job.params)
+    fmt = params["format"]
+    as_of = datetime.fromisoformat(params["as_of"]) if params.get("as_of") else None
+    params["as_of"] = as_of
+    end = as_of or datetime.now()
+    start = timeseries.truncate(end - timedelta(days=params["days"]), "day")
+    period = [start.date().isoformat(), end.date().isoformat()]
+
+    read_db = ReadSessionLocal()
+    pool = None
+    try:
+        sections = _sections(read_db, params)
+        total = len(sections) or 1
+        entries, pending = [], {}
+        counts = {"rendered": 0, "reused": 0}
+        last_progress = time.monotonic()
+
+        def collect(futures):
+            for future in futures:
+                _write_atomically(pending.pop(future), future.result())
+                counts["rendered"] += 1
+
+        def report_progress():
+            nonlocal last_progress
+            if time.monotonic() - last_progress >= PROGRESS_SECONDS:
+                progress(0.95 * (counts["rendered"] + counts["reused"]) / total)  # The rest is the zip
+                last_progress = time.monotonic()
+
+        for position, section in enumerate(sections, 1):
+            ids = [metric["id"] for metric in section["metrics"]]
+            series = _history(read_db, ids, start, as_of)
+            for metric in section["metrics"]:
+                metric["history"] = series.get(metric["id"], [])
+            section["period"] = period
+            path = _cache_path(section_key(section, fmt), fmt)
+            if os.path.exists(path):
+                os.utime(path)  # Still in use, kept by _prune()
+                counts["reused"] += 1
+            else:
+                if pool is None:
+                    pool = ProcessPoolExecutor(config.REPORT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+                pending[pool.submit(report_rendering.render, section, fmt)] = path
+                # Bounded read-ahead: sections wait in memory only while the processes are busy
+                while len(pending) >= 2 * config.REPORT_PROCESSES:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            statuses = [metric["breach_status"] for metric in section["metrics"]]
+            entries.append(dict(
+                title=report_rendering.section_title(section),
+                file=_file_name(position, section, fmt),
+                path=path,
+                metrics=len(statuses),
+                breaches=statuses.count("breach"),
+                warnings=statuses.count("warning"),
+            ))
+            sections[position - 1] = None  # Free its history once pickled for its process (or cached)
+            report_progress()
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            report_progress()
+    finally:
+        read_db.close()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    # The pack: the sections (cached files) and their index, renamed into place when complete
+    title = "Board pack" + (f" as of {as_of.isoformat(sep=' ')}" if as_of else f" {end:%Y-%m-%d}")
+    index_name = "index.html" if fmt == "html" else "index.csv"
+    output = pack_path(job.id)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(output), suffix=".tmp")
+    os.close(descriptor)
+    with zipfile.ZipFile(temporary, "w", zipfile.ZIP_DEFLATED) as pack:
+        pack.writestr(index_name, report_rendering.render_index(title, entries, fmt))
+        for entry in entries:
+            # Excel files are zips already
+            pack.write(entry["path"], entry["file"], zipfile.ZIP_STORED if fmt == "xlsx" else zipfile.ZIP_DEFLATED)
+    os.replace(temporary, output)
+    _prune()
+    return {
+        "file": os.path.basename(output),
+        "format": fmt,
+        "sections": len(entries),
+        "metrics": sum(entry["metrics"] for entry in entries),
+        "rendered": counts["rendered"],
+        "reused": counts["reused"],
+        "bytes": os.path.getsize(output),
+    }
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import cache, config, models
+from app.snapshots import breach_status_expr
+
+# Breach status of every metric rolled up through the risk type and business
+# unit trees, served as a (risk type x business unit) heatmap.
+#
+# The engine keeps, per worker, the status of each metric and the number of
+# metrics per (risk type, business unit, status) cell. It is built with one
+# set-based query that evaluates every metric's latest value against its
+# thresholds, then kept current from the ORM changes committed in this
+# process (new results, threshold or ownership changes, deletes), so a
+# request only has to roll the cell counts up the trees. Writes handled by
+# other workers are picked up by a periodic rebuild (RISK_ENGINE_MAX_AGE_SECONDS).
+
+STATUSES = ("no_data", "ok", "warning", "breach")
+SEVERITY = {status: rank for rank, status in enumerate(STATUSES)}
+
+
+class RiskEngine:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = None  # metric_id -> (risk_type_id, business_unit_id, status), None until built
+        self.cells = Counter()  # (risk_type_id, business_unit_id, status) -> number of metrics
+        self.built_at = 0.0
+        self.heatmap = None  # Rolled-up cells, cached until the next change
+
+    def rebuild(self, db: Session):
+        """Evaluate every metric against its thresholds in one query."""
+        status = breach_status_expr(models.MetricLatest.value, models.Metric.warning_threshold, models.Metric.limit_threshold)
+        rows = db.execute(
+            select(
+                models.Metric.id,
+                models.Metric.risk_type_id,
+                models.Metric.business_unit_id,
+                models.MetricLatest.metric_id,
+                status,
+            ).outerjoin(models.MetricLatest, models.MetricLatest.metric_id == models.Metric.id)
+        )
+        metrics = {
+            metric_id: (risk_type_id, business_unit_id, status if latest_id is not None else "no_data")
+            for metric_id, risk_type_id, business_unit_id, latest_id, status in rows
+        }
+        with self.lock:
+            self.metrics = metrics
+            self.cells = Counter(metrics.values())
+            self.built_at = time.monotonic()
+            self.heatmap = None
+
+    def invalidate(self):
+        with self.lock:
+            self.metrics = None
+            self.heatmap = None
+
+    def apply(self, changes):
+        """Apply committed per-metric changes: {metric_id: dict of new field values, or None if deleted}."""
+        with self.lock:
+            if self.metrics is None:
+                return
+            for metric_id, fields in changes.items():
+                current = self.metrics.pop(metric_id, None)
+                if current is not None:
+                    self.cells[current] -= 1
+                    if not self.cells[current]:
+                        del self.cells[current]
+                if fields is None:
+                    continue
+                if current is None and not {"risk_type_id", "business_unit_id", "status"} <= fields.keys():
+                    # A metric this worker hasn't seen, rebuild on the next read
+                    self.metrics = None
+                    self.heatmap = None
+                    return
+                risk_type_id, business_unit_id, status = current or (None, None, None)
+                state = (
+                    fields.get("risk_type_id", risk_type_id),
+                    fields.get("business_unit_id", business_unit_id),
+                    fields.get("status", status),
+                )
+                self.metrics[metric_id] = state
+                self.cells[state] += 1
+            self.heatmap = None
+
+    def get_heatmap(self, db: Session):
+        with self.lock:
+            fresh = self.metrics is not None and time.monotonic() - self.built_at < config.RISK_ENGINE_MAX_AGE_SECONDS
+            if fresh and self.heatmap is not None:
+                return self.heatmap
+        if not fresh:
+            self.rebuild(db)
+        risk_types = cache.risk_types(db)
+        business_units = cache.business_units(db)
+        with self.lock:
+            cells = dict(self.cells)
+        heatmap = roll_up(cells, risk_types, business_units)
+        with self.lock:
+            self.heatmap = heatmap
+        return heatmap
+
+
+def _lineage(nodes, node_id):
+    """The node and its ancestors (ids), guarding against cycles."""
+    lineage = []
+    while node_id is not None and node_id not in lineage:
+        lineage.append(node_id)
+        node = nodes.get(node_id)
+        node_id = node["parent_id"] if node else None
+    return lineage
+
+
+def roll_up(cells, risk_types, business_units):
+    """Aggregate (risk type, business unit, status) counts up both trees."""
+    totals = {}
+    for (risk_type_id, business_unit_id, status), count in cells.items():
+        for risk_type in _lineage(risk_types, risk_type_id):
+            for business_unit in _lineage(business_units, business_unit_id):
+                cell = totals.setdefault((risk_type, business_unit), Counter())
+                cell[status] += count
+    heatmap = []
+    for (risk_type_id, business_unit_id), counts in sorted(totals.items()):
+        worst = max((status for status in counts if counts[status]), key=SEVERITY.get)
+        heatmap.append(dict(
+            risk_type_id=risk_type_id,
+            business_unit_id=business_unit_id,
+            total=sum(counts.values()),
+            worst_status=worst,
+            **{status: counts.get(status, 0) for status in STATUSES},
+        ))
+    return heatmap
+
+
+engine = RiskEngine()
+
+
+def invalidate_on_commit(session):
+    """Rebuild the engine after the session commits, for writes the ORM events don't see."""
+    session.info["risk_engine_invalidate"] = True
+
+
+# Track the metric changes of each session, applied to the engine once committed
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault("risk_engine_changes", {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, models.Metric):
+            fields = changes.setdefault(obj.id, {}) or {}
+            fields.update(risk_type_id=obj.risk_type_id, business_unit_id=obj.business_unit_id)
+            if obj in session.new:
+                fields.setdefault("status", "no_data")
+            changes[obj.id] = fields
+        elif isinstance(obj, models.MetricLatest):
+            fields = changes.setdefault(obj.metric_id, {}) or {}
+            fields["status"] = obj.breach_status
+            changes[obj.metric_id] = fields
+    for obj in session.deleted:
+        if isinstance(obj, models.Metric):
+            changes[obj.id] = None
+        elif isinstance(obj, models.MetricLatest) and changes.get(obj.metric_id) is not None:
+            changes[obj.metric_id]["status"] = "no_data"
+        elif isinstance(obj, models.MetricLatest) and obj.metric_id not in changes:
+            changes[obj.metric_id] = {"status": "no_data"}
+    hierarchy = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, (models.RiskType, models.BusinessUnit)) for obj in hierarchy):
+        invalidate_on_commit(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    if session.info.pop("risk_engine_invalidate", False):
+        session.info.pop("risk_engine_changes", None)
+        engine.invalidate()
+        return
+    changes = session.info.pop("risk_engine_changes", None)
+    if changes:
+        engine.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("risk_engine_changes", None)
+    session.info.pop("risk_engine_invalidate", None)
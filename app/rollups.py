@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from sqlalchemy import case, delete, func, insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.timeseries import ROLLUP_TABLES, raw_stats, truncate
+
+# Maintains the hourly and daily rollups of metric_results. New results are
+# merged into their buckets with one atomic upsert per table; updates and
+# deletes can't be undone incrementally (min/max), so the buckets they touch
+# are recomputed from the raw rows of that bucket only.
+
+BUCKET_WIDTHS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def _dialect_insert(db: Session):
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert, func.least, func.greatest
+    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert, func.min, func.max  # SQLite's multi-argument min/max
+
+
+def _partials(rows, bucket):
+    """Fold (metric_id, value, uploaded_at) rows into per-bucket partial stats."""
+    partials = {}
+    for row in rows:
+        key = (row["metric_id"], truncate(row["uploaded_at"], bucket))
+        value, uploaded_at = row["value"], row["uploaded_at"]
+        partial = partials.get(key)
+        if partial is None:
+            partials[key] = dict(
+                metric_id=key[0], bucket=key[1], count=1, sum=value, min=value, max=value,
+                last_value=value, last_uploaded_at=uploaded_at,
+            )
+            continue
+        partial["count"] += 1
+        partial["sum"] += value
+        partial["min"] = min(partial["min"], value)
+        partial["max"] = max(partial["max"], value)
+        if uploaded_at >= partial["last_uploaded_at"]:
+            partial["last_value"] = value
+            partial["last_uploaded_at"] = uploaded_at
+    return list(partials.values())
+
+
+def add_rows(db: Session, rows):
+    """Merge newly inserted results (dicts with metric_id, value and uploaded_at) into the rollups."""
+    if not rows:
+        return
+    dialect_insert, least, greatest = _dialect_insert(db)
+    for bucket, table in ROLLUP_TABLES.items():
+        statement = dialect_insert(table).values(_partials(rows, bucket))
+        new = statement.excluded
+        newer = new.last_uploaded_at >= table.last_uploaded_at
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.metric_id, table.bucket],
+            set_=dict(
+                count=table.count + new.count,
+                sum=table.sum + new.sum,
+                min=least(table.min, new.min),
+                max=greatest(table.max, new.max),
+                last_value=case((newer, new.last_value), else_=table.last_value),
+                last_uploaded_at=greatest(table.last_uploaded_at, new.last_uploaded_at),
+            ),
+        ))
+
+
+def add_result(db: Session, result: models.MetricResult):
+    """Merge a newly created (flushed) result into the rollups."""
+    add_rows(db, [dict(metric_id=result.metric_id, value=result.value, uploaded_at=result.uploaded_at)])
+
+
+def recompute(db: Session, metric_id, timestamps):
+    """Recompute from metric_results the buckets of a metric containing the given timestamps."""
+    dialect_name = db.bind.dialect.name
+    for bucket, table in ROLLUP_TABLES.items():
+        for start in {truncate(timestamp, bucket) for timestamp in timestamps if timestamp is not None}:
+            end = start + BUCKET_WIDTHS[bucket]
+            db.execute(delete(table).where(table.metric_id == metric_id, table.bucket == start))
+            _insert_raw(db, table, raw_stats(dialect_name, bucket, [metric_id], start, end))
+
+
+def _insert_raw(db: Session, table, stats):
+    columns = ["metric_id", "bucket", "count", "sum", "min", "max", "last_value", "last_uploaded_at"]
+    db.execute(insert(table).from_select(columns, stats))
+
+
+def rebuild(db: Session, metric_ids=None):
+    """Rebuild the rollups of the given metrics (all metrics by default) from metric_results."""
+    dialect_name = db.bind.dialect.name
+    for bucket, table in ROLLUP_TABLES.items():
+        statement = delete(table)
+        if metric_ids is not None:
+            statement = statement.where(table.metric_id.in_(metric_ids))
+        db.execute(statement)
+        _insert_raw(db, table, raw_stats(dialect_name, bucket, metric_ids))
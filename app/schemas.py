@@ -1,6 +1,6 @@
-from pydantic import BaseModel  # Pydantic is used for data validation and serialization
+from pydantic import BaseModel, Field  # Pydantic is used for data validation and serialization
 from datetime import datetime  # Handles timestamps
-from typing import Optional  # Allows fields to be optional
+from typing import Literal, Optional  # Allows fields to be optional
 
 # Schema for creating a new metric
 class MetricCreate(BaseModel):
@@ -12,6 +12,7 @@ class MetricCreate(BaseModel):
     status: Optional[str] = "active"  # Optional: Default status is "active"
     warning_threshold: Optional[float] = None  # Optional: Warning level threshold
     limit_threshold: Optional[float] = None  # Optional: Limit level threshold (critical)
+    retention_days: Optional[int] = None  # Optional: Days of results to keep (default: keep all)
     risk_type_id: Optional[int] = None  # Optional: Risk type category
     business_unit_id: Optional[int] = None  # Optional: Business unit associated with the metric
     created_by: Optional[str] = None  # Optional: User who created the metric
@@ -30,6 +31,7 @@ class MetricUpdate(BaseModel):
     status: Optional[str] = None  
     warning_threshold: Optional[float] = None  
     limit_threshold: Optional[float] = None  
+    retention_days: Optional[int] = None
     risk_type_id: Optional[int] = None  
     business_unit_id: Optional[int] = None  
 
@@ -44,6 +46,7 @@ class MetricResponse(BaseModel):
     status: Optional[str] = "active"  # Optional: Status with default value "active"
     warning_threshold: Optional[float]  # Optional: Warning threshold
     limit_threshold: Optional[float]  # Optional: Limit threshold
+    retention_days: Optional[int] = None  # Optional: Days of results kept
     risk_type_id: Optional[int]  # Optional: Risk category
     risk_type: Optional[str] = None  
     business_unit_id: Optional[int]  # Optional: Risk category
@@ -54,10 +57,45 @@ class MetricResponse(BaseModel):
     updated_at: datetime #Optional[datetime] = None  # Optional: Last updated timestamp
     
     latest_value: Optional[float] = None
+    breach_status: Optional[str] = None  # Optional: ok/warning/breach of the latest value
     
     class Config:
         from_attributes = True  # Enables ORM conversion (e.g., from SQLAlchemy models)
 
+# Schema for the number of matching metrics with one value of a field
+class FacetCount(BaseModel):
+    value: Optional[str] = None  # Value as a string (ids included), None for no value
+    count: int
+
+# Schema for returning a page of metric search results (GET /metrics/search)
+class MetricSearchResponse(BaseModel):
+    items: list[MetricResponse]
+    next_cursor: Optional[str] = None  # Cursor of the next page, None on the last one
+    total: Optional[int] = None  # Matching metrics (only with facets=true)
+    facets: Optional[dict[str, list[FacetCount]]] = None  # Per field, the most frequent values first (only with facets=true)
+
+# Schema for returning a recorded state of a metric (GET /metrics/{id}/versions)
+class MetricVersionResponse(BaseModel):
+    metric_id: int
+    name: str
+    type: str
+    level: int
+    description: Optional[str] = None
+    unit: Optional[str] = None
+    status: Optional[str] = None
+    warning_threshold: Optional[float] = None
+    limit_threshold: Optional[float] = None
+    retention_days: Optional[int] = None
+    risk_type_id: int
+    business_unit_id: int
+    created_by: Optional[str] = None
+    created_at: Optional[datetime] = None
+    valid_from: datetime  # Recorded from
+    valid_to: Optional[datetime] = None  # Until (None for the current state)
+
+    class Config:
+        from_attributes = True
+
 ###############################################################################################
 ###############################################################################################
 
@@ -84,6 +122,108 @@ class MetricResultResponse(BaseModel):
 
     class Config:
         from_attributes = True  # Ensures ORM compatibility
+
+
+# Schema for returning a recorded state of a metric result (GET /results/{id}/versions)
+class MetricResultVersionResponse(BaseModel):
+    result_id: int
+    metric_id: int
+    value: float
+    uploaded_by: Optional[str] = None
+    uploaded_at: datetime
+    valid_from: datetime  # Recorded from
+    valid_to: Optional[datetime] = None  # Until (None for the current state, the result still exists)
+
+    class Config:
+        from_attributes = True
+
+
+# Schema for one time bucket of aggregated metric results
+class MetricResultBucket(BaseModel):
+    bucket: datetime  # Start of the bucket
+    count: int
+    min: float
+    max: float
+    avg: float
+    last: float  # Most recent value in the bucket
+
+
+# Schema for returning an aggregated (and possibly downsampled) series
+class MetricResultSeries(BaseModel):
+    metric_id: int
+    bucket: str  # minute/hour/day/month
+    downsampled: bool  # True if buckets were dropped to fit the point budget
+    points: list[MetricResultBucket]
+
+
+# Schema for one row of a bulk result upload (JSON array, NDJSON or CSV)
+class MetricResultBulkRow(BaseModel):
+    metric_id: int
+    value: float
+    uploaded_by: Optional[str] = None  # Optional: User who created the metric
+    uploaded_at: Optional[datetime] = None  # Optional: Defaults to the time of the upload
+
+
+# Schema for a rejected row of a bulk upload
+class BulkRowError(BaseModel):
+    row: int  # Position of the row in the upload (0-based, header excluded)
+    error: str
+
+
+# Schema for returning the outcome of a bulk upload
+class BulkIngestResponse(BaseModel):
+    received: int  # Rows read from the upload
+    inserted: int  # Rows written to metric_results
+    failed: int  # Rows rejected
+    errors: list[BulkRowError]  # Rejected rows (capped, see errors_truncated)
+    errors_truncated: bool = False
+    elapsed_seconds: float
+    rows_per_second: float
+
+
+# Schemas of the rows of a catalog import (POST /import/{kind}), references by name
+class ReferenceImportRow(BaseModel):
+    name: str
+    level: int
+    status: Optional[str] = "active"
+    description: Optional[str] = None
+    parent: Optional[str] = None  # Name of the parent node, in the file or already stored
+
+
+class MetricImportRow(BaseModel):
+    name: str
+    type: str
+    level: int
+    description: Optional[str] = None
+    unit: Optional[str] = None
+    status: Optional[str] = "active"
+    warning_threshold: Optional[float] = None
+    limit_threshold: Optional[float] = None
+    retention_days: Optional[int] = None
+    risk_type: str  # Risk type name
+    business_unit: str  # Business unit name
+    created_by: Optional[str] = None
+
+
+class ImportUpdate(BaseModel):
+    name: str
+    changes: dict[str, list]  # Field -> [old value, new value]
+
+
+# Schema for returning the diff report of a catalog import
+class ImportResponse(BaseModel):
+    kind: str
+    dry_run: bool  # Nothing was written
+    received: int  # Rows read from the file
+    created: int
+    updated: int
+    unchanged: int
+    failed: int  # Rows rejected, nothing else is affected
+    created_names: list[str]  # Capped, see truncated
+    updates: list[ImportUpdate]  # Capped, see truncated
+    errors: list[BulkRowError]  # Capped, see truncated
+    truncated: bool = False
+    elapsed_seconds: float
         
 ###############################################################################################
 ###############################################################################################
@@ -107,7 +247,7 @@ class RiskTypeUpdate(BaseModel):
     name: Optional[str] = None
     status: Optional[str] = None
     description: Optional[str] = None
-    parent_id : Optional[int]
+    parent_id : Optional[int] = None
 
     
 # Schema for returning metric data in API responses
@@ -133,6 +273,7 @@ class BusinessUnitCreate(BaseModel):
     name: str
     status: Optional[str] = "active"
     description: Optional[str] = None
+    parent_id : Optional[int] = None
     
     # class Config:
     #     from_attributes = True  # Enables compatibility with ORM models (e.g., SQLAlchemy)
@@ -144,6 +285,7 @@ class BusinessUnitUpdate(BaseModel):
     name: Optional[str] = None
     status: Optional[str] = None
     description: Optional[str] = None
+    parent_id : Optional[int] = None
     
 # Schema for returning metric data in API responses
 class BusinessUnitResponse(BaseModel):
@@ -152,6 +294,76 @@ class BusinessUnitResponse(BaseModel):
     name: str  # Metric name
     status: Optional[str] = "Active"  # Optional: Status with default value "active"
     description: Optional[str] = None # Optional: Description of the metric
+    parent_id : Optional[int] = None
+
+    class Config:
+        from_attributes = True  # Enables ORM conversion (e.g., from SQLAlchemy models)
+
+# One cell of the risk heatmap: metrics of a risk type (and its descendants)
+# owned by a business unit (and its descendants), counted by breach status
+class RiskHeatmapCell(BaseModel):
+    risk_type_id: int
+    business_unit_id: int
+    total: int
+    worst_status: str  # no_data < ok < warning < breach
+    no_data: int
+    ok: int
+    warning: int
+    breach: int
+
+
+# A change of a metric's breach status
+class BreachEventResponse(BaseModel):
+    id: int
+    metric_id: int
+    result_id: Optional[int] = None
+    previous_status: Optional[str] = None
+    status: str
+    value: Optional[float] = None
+    created_at: datetime
+    delivered_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str  # queued, running, done or failed
+    params: Optional[dict] = None
+    progress: float
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True  # Enables ORM conversion (e.g., from SQLAlchemy models)
\ No newline at end of file
+        from_attributes = True
+
+
+# Schema for the trend and anomaly scores of a metric (app.analytics)
+class MetricTrend(BaseModel):
+    metric_id: int
+    name: str
+    points: int  # Days with results in the analysed period
+    latest_value: float  # Average of the last day with results
+    latest_at: datetime  # That day
+    rolling_mean: Optional[float] = None  # Over the trailing window, up to the last day
+    rolling_std: Optional[float] = None
+    zscore: Optional[float] = None  # Last day against the window before it
+    anomaly: bool  # |zscore| above the threshold
+    anomalies: int  # Anomalous days in the last window
+    slope_per_day: Optional[float] = None  # Least squares trend over the last window
+    days_to_breach: Optional[float] = None  # Until the trend reaches limit_threshold (0: already breached)
+    at_risk: bool  # days_to_breach within the horizon
+
+
+# Schema for queueing a board pack (app/reports.py)
+class ReportCreate(BaseModel):
+    format: Literal["html", "csv", "xlsx"] = "html"
+    as_of: Optional[datetime] = None  # Metrics and results as recorded at that time, now by default
+    days: int = Field(365, ge=1, le=3660)  # History charted up to the report date
+    risk_type_id: Optional[int] = None  # Only the metrics of this risk type's subtree
+    business_unit_id: Optional[int] = None  # Only the metrics of this business unit's subtree
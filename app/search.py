@@ -0,0 +1,208 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import Float, String, and_, case, cast, func, literal, literal_column, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from app import hierarchy, models, pagination, queries, serialization
+
+# Metric search (GET /metrics/search): a text query over the name and the
+# description, indexed filters, facet counts and keyset pagination, so a
+# typeahead or a filtered listing never transfers the catalog.
+#
+# On PostgreSQL the text query uses the indexes of the "metric search"
+# migration:
+#
+#   - full text: the words of the query, the last one as a prefix, against
+#     a 'simple' tsvector of name and description (GIN expression index)
+#   - substrings and typos: ILIKE and similarity on name and description
+#     (pg_trgm GIN indexes)
+#   - queries shorter than MIN_TRIGRAM_LENGTH, where trigrams don't help:
+#     a name prefix (lower(name) text_pattern_ops index)
+#
+# Relevance is a name prefix match first, then trigram similarity of the
+# name plus the full text rank. Other databases fall back to LIKE on the
+# lowercased columns (every word in the name or the description), ranked by
+# name prefix, then name match.
+#
+# Filters are exact values (several values of a field are ORed) and facets
+# count the matching metrics per value of each field, each facet ignoring
+# its own filter so the other values of a selected field stay visible.
+
+MIN_TRIGRAM_LENGTH = 3
+TEXT_SEARCH_CONFIG = "simple"  # No stemming: metric names are codes and acronyms as much as words
+FACET_SIZE = 20  # Values per facet, the most frequent first
+
+# Filter / facet fields and their columns
+FIELDS = {
+    "type": models.Metric.type,
+    "level": models.Metric.level,
+    "status": models.Metric.status,
+    "unit": models.Metric.unit,
+    "created_by": models.Metric.created_by,
+    "risk_type_id": models.Metric.risk_type_id,
+    "business_unit_id": models.Metric.business_unit_id,
+    "breach_status": models.MetricLatest.breach_status,
+}
+
+# Sort keys: columns (id is always the tie breaker) and the cursor value types
+SORTS = {
+    "name": (models.Metric.name, str),
+    "created_at": (models.Metric.created_at, datetime),
+    "updated_at": (models.Metric.updated_at, datetime),
+    "id": (None, None),
+}
+
+
+def _words(q):
+    return re.findall(r"\w+", q.lower())
+
+
+def _like(value):
+    """A LIKE pattern matching value as a substring, wildcards escaped."""
+    return "%" + re.sub(r"([\\%_])", r"\\\1", value) + "%"
+
+
+# The expression of the full text index ("metric search" migration), a query must repeat it for the index to be used
+DOCUMENT = f"to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(metrics.name, '') || ' ' || coalesce(metrics.description, ''))"
+
+
+def text_match(q, dialect_name):
+    """(condition, relevance expression) of a text query, None if it has no words."""
+    words = _words(q)
+    if not words:
+        return None
+    q = q.strip()
+    name = func.lower(models.Metric.name)
+    prefix = name.like(_like(q.lower())[1:], escape="\\")
+    if dialect_name == "postgresql":
+        if len(q) < MIN_TRIGRAM_LENGTH:
+            return prefix, cast(1.0 / (func.length(models.Metric.name) + 1), Float)  # Shortest names first
+        # Every word, the last one possibly incomplete (typeahead)
+        query = func.to_tsquery(TEXT_SEARCH_CONFIG, " & ".join(words[:-1] + [words[-1] + ":*"]))
+        document = literal_column(DOCUMENT)
+        condition = or_(
+            document.op("@@")(query),
+            models.Metric.name.ilike(_like(q), escape="\\"),
+            models.Metric.description.ilike(_like(q), escape="\\"),
+            models.Metric.name.op("%")(q),
+        )
+        relevance = cast(
+            case((prefix, 1.0), else_=0.0) + func.similarity(models.Metric.name, q) + func.ts_rank(document, query),
+            Float,
+        )
+        return condition, relevance
+
+    description = func.lower(func.coalesce(models.Metric.description, ""))
+    condition = [or_(name.like(_like(word), escape="\\"), description.like(_like(word), escape="\\")) for word in words]
+    relevance = cast(case((prefix, 2.0), (name.like(_like(q.lower()), escape="\\"), 1.0), else_=0.0), Float)
+    return and_(*condition), relevance
+
+
+def _filter_conditions(filters, columns=FIELDS):
+    """{field: condition} of the filters: {field: [values]}, a risk type / business unit id matching its subtree."""
+    conditions = {}
+    for field, values in filters.items():
+        if values is None or values == []:
+            continue
+        if field in ("risk_type_id", "business_unit_id"):
+            model = models.RiskType if field == "risk_type_id" else models.BusinessUnit
+            conditions[field] = columns[field].in_(select(hierarchy.subtree(model, values).c.id))
+        elif field == "level":
+            conditions[field] = columns[field].in_([str(value) for value in values])
+        elif field == "breach_status" and "no_data" in values:
+            conditions[field] = or_(columns[field].in_(values), columns[field].is_(None))
+        else:
+            conditions[field] = columns[field].in_(values)
+    return conditions
+
+
+def search(db: Session, q=None, filters=None, sort=None, order="asc", cursor=None, limit=20):
+    """A page of metrics (serialization.metric_row dicts) and the cursor of the next page (None on the last one).
+
+    sort is "relevance" (the default with a text query, best first), name,
+    created_at, updated_at or id. Raises ValueError on a bad cursor or a
+    relevance sort without a text query.
+    """
+    statement = queries.metric_rows()
+    match = text_match(q, db.bind.dialect.name) if q else None
+    if match is not None:
+        statement = statement.where(match[0])
+    for condition in _filter_conditions(filters or {}).values():
+        statement = statement.where(condition)
+
+    sort = sort or ("relevance" if match is not None else "id")
+    if sort == "relevance":
+        if match is None:
+            raise ValueError("Sorting by relevance needs a text query (q)")
+        key, kind, descending = match[1], float, True  # Best first
+    else:
+        key, kind = SORTS[sort]
+        descending = order == "desc"
+        if kind is datetime and db.bind.dialect.name != "postgresql":
+            # SQLite keeps server-side timestamps in another text format than bound datetimes, compare one format
+            key, kind = func.strftime("%Y-%m-%d %H:%M:%f", key), str
+    columns = (key, models.Metric.id) if key is not None else (models.Metric.id,)
+    types = (kind, int) if key is not None else (int,)
+    if key is not None:
+        statement = statement.add_columns(key.label("sort_key"))
+
+    if cursor is not None:
+        statement = statement.where(pagination.after(columns, pagination.decode_cursor(cursor, *types), descending))
+    statement = statement.order_by(*(column.desc() if descending else column for column in columns)).limit(limit + 1)
+
+    rows = db.execute(statement).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = pagination.encode_cursor(*((last.sort_key, last.id) if key is not None else (last.id,)))
+    items = [serialization.metric_row(row) for row in rows]
+    for item in items:
+        item.pop("sort_key", None)
+    return items, next_cursor
+
+
+def facets(db: Session, q=None, filters=None):
+    """(total, {field: [{"value", "count"}]}) of the metrics matching the query and the filters.
+
+    Values are returned as strings (ids included), None for no value, and
+    breach_status counts the metrics without results under "no_data".
+    """
+    match = text_match(q, db.bind.dialect.name) if q else None
+    source = select(*(column.label(field) for field, column in FIELDS.items())).select_from(models.Metric).outerjoin(
+        models.MetricLatest, models.Metric.id == models.MetricLatest.metric_id
+    )
+    if match is not None:
+        source = source.where(match[0])
+    # The text query is evaluated once, every facet counts over its matches
+    source = source.cte("search_matches").prefix_with("MATERIALIZED", dialect="postgresql")
+    conditions = _filter_conditions(filters or {}, source.c)
+
+    def matching(*columns, excluded=None):
+        statement = select(*columns).select_from(source)
+        for field, condition in conditions.items():
+            if field != excluded:
+                statement = statement.where(condition)
+        return statement
+
+    # One round trip: a branch per facet, each without its own filter, and the total
+    branches = [
+        matching(literal(field).label("facet"), cast(source.c[field], String).label("value"), func.count().label("count"), excluded=field)
+        .group_by(source.c[field])
+        for field in FIELDS
+    ]
+    branches.append(matching(literal("").label("facet"), cast(literal_column("NULL"), String), func.count()))
+    result = {field: [] for field in FIELDS}
+    total = 0
+    for facet, value, count in db.execute(union_all(*branches)):
+        if facet == "breach_status" and value is None:
+            result[facet].append({"value": "no_data", "count": count})
+        elif facet:
+            result[facet].append({"value": value, "count": count})
+        else:
+            total = count
+    for field, counts in result.items():
+        counts.sort(key=lambda entry: (-entry["count"], entry["value"] is None, entry["value"] or ""))
+        del counts[FACET_SIZE:]
+    return total, result
@@ -0,0 +1,60 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app import instrumentation
+
+try:
+    import orjson
+except ImportError:  # Optional, falls back to pydantic's serializer
+    orjson = None
+
+# Fast JSON responses for the large listings. Handlers build plain dicts
+# straight from the SQL rows (already shaped like the response schema) and
+# return them through json_response(), which skips FastAPI's per-row
+# validation against response_model and the stdlib encoder. The routes keep
+# their response_model, so the OpenAPI schema is unchanged.
+#
+# Rows must carry exactly the fields of the schema, with JSON-ready values;
+# the *_row() helpers below (and app.cache for the hierarchies) produce them.
+
+
+def metric_row(row):
+    """MetricResponse fields from a queries.metric_rows() row."""
+    metric = row._asdict()
+    metric["level"] = int(metric["level"])  # Stored as a string, typed as int in the API
+    if metric["latest_value"] is None:
+        metric["latest_value"] = 0.0
+    return metric
+
+
+def metric_result_row(row):
+    """MetricResultResponse fields from an (id, metric_id, value, uploaded_by, uploaded_at) row."""
+    return {
+        "id": row.id,
+        "metric_id": row.metric_id,
+        "value": row.value if row.value is not None else 0.0,
+        "uploaded_by": row.uploaded_by,
+        "uploaded_at": row.uploaded_at,
+    }
+
+
+_adapters = {}
+
+
+def dumps(content, schema=None):
+    """Serialize to JSON bytes with orjson, or with one TypeAdapter over the whole content."""
+    with instrumentation.timed_serialization():
+        if orjson is not None:
+            return orjson.dumps(content)
+        adapter = _adapters.get(schema)
+        if adapter is None:
+            adapter = _adapters[schema] = TypeAdapter(schema)
+        return adapter.dump_json(adapter.validate_python(content))
+
+
+def json_response(content, schema, response: Response = None):
+    """A JSON Response of already shaped content, with the headers set on the handler's response."""
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=dumps(content, schema), media_type="application/json", headers=headers)
@@ -0,0 +1,188 @@
+from sqlalchemy import and_, case, func, not_, or_, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from app import models
+
+# Keeps the metric_latest table in step with metric_results. Every function here
+# only adds/changes rows in the given session, the caller commits, so the
+# snapshot is written in the same transaction as the result itself.
+#
+# A snapshot write is a read-modify-write of the metric's metric_latest row:
+# two results of a metric written at once would both insert its first
+# snapshot (one fails on the primary key), or both update it from the same
+# state (the older value may win). Writers first lock the metric's row with
+# SELECT ... FOR NO KEY UPDATE and reload the snapshot, so they apply one
+# after the other, each on the snapshot committed by the previous one. The
+# lock doesn't block result inserts (their foreign key check only takes KEY
+# SHARE) nor readers, and is held until the commit.
+
+def breach_status(value, warning_threshold, limit_threshold):
+    """Return ok/warning/breach for a value against a metric's thresholds.
+
+    Metrics are "higher is worse" unless the limit is set below the warning
+    threshold, in which case they are treated as "lower is worse".
+    """
+    if value is None:
+        return "ok"
+    lower_is_worse = (
+        warning_threshold is not None
+        and limit_threshold is not None
+        and limit_threshold < warning_threshold
+    )
+
+    def crossed(threshold):
+        if threshold is None:
+            return False
+        return value <= threshold if lower_is_worse else value >= threshold
+
+    if crossed(limit_threshold):
+        return "breach"
+    if crossed(warning_threshold):
+        return "warning"
+    return "ok"
+
+def breach_status_expr(value, warning_threshold, limit_threshold):
+    """SQL version of breach_status() over columns, for set-based evaluation."""
+    lower_is_worse = and_(
+        warning_threshold.isnot(None),
+        limit_threshold.isnot(None),
+        limit_threshold < warning_threshold,
+    )
+
+    def crossed(threshold):
+        return and_(
+            threshold.isnot(None),
+            or_(and_(lower_is_worse, value <= threshold), and_(not_(lower_is_worse), value >= threshold)),
+        )
+
+    return case((crossed(limit_threshold), "breach"), (crossed(warning_threshold), "warning"), else_="ok")
+
+def _lock(db: Session, metric_ids):
+    """Lock the metrics' rows until commit and return their current snapshots {metric_id: MetricLatest}."""
+    metric_ids = sorted(metric_ids)  # Same order in every transaction, no deadlocks
+    db.execute(
+        select(models.Metric.id).where(models.Metric.id.in_(metric_ids)).order_by(models.Metric.id).with_for_update(key_share=True)
+    )
+    snapshots = db.scalars(
+        select(models.MetricLatest)
+        .where(models.MetricLatest.metric_id.in_(metric_ids))
+        .execution_options(populate_existing=True)  # The state committed before the lock was granted
+    )
+    return {latest.metric_id: latest for latest in snapshots}
+
+def lock(db: Session, metric: models.Metric):
+    """Lock a metric's row until commit and reload its snapshot (metric.latest)."""
+    latest = _lock(db, [metric.id]).get(metric.id)
+    set_committed_value(metric, "latest", latest)
+    return latest
+
+def _set_snapshot(db: Session, metric: models.Metric, result: models.MetricResult):
+    latest = metric.latest
+    if latest is None:
+        latest = models.MetricLatest(metric_id=metric.id)
+        db.add(latest)
+        metric.latest = latest
+    latest.result_id = result.id
+    latest.value = result.value
+    latest.uploaded_at = result.uploaded_at
+    latest.breach_status = breach_status(result.value, metric.warning_threshold, metric.limit_threshold)
+    return latest
+
+def _is_newer(result: models.MetricResult, latest: models.MetricLatest):
+    if latest.uploaded_at is None or result.uploaded_at is None:
+        return result.uploaded_at is not None or result.id >= latest.result_id
+    return (result.uploaded_at, result.id) >= (latest.uploaded_at, latest.result_id)
+
+def refresh(db: Session, metric: models.Metric):
+    """Recompute the snapshot of a metric from its result history (one indexed lookup)."""
+    result = (
+        db.query(models.MetricResult)
+        .filter(models.MetricResult.metric_id == metric.id)
+        .order_by(models.MetricResult.uploaded_at.desc(), models.MetricResult.id.desc())
+        .first()
+    )
+    if result is None:
+        if metric.latest is not None:
+            db.delete(metric.latest)
+            metric.latest = None
+        return None
+    return _set_snapshot(db, metric, result)
+
+def record_result(db: Session, metric: models.Metric, result: models.MetricResult):
+    """Update the snapshot after a result was created or updated (result must be flushed)."""
+    latest = lock(db, metric)
+    if latest is None or _is_newer(result, latest):
+        return _set_snapshot(db, metric, result)
+    if latest.result_id == result.id:
+        # The latest result was moved back in time, another one may now be newer
+        return refresh(db, metric)
+    return latest
+
+def remove_result(db: Session, metric: models.Metric, result: models.MetricResult):
+    """Update the snapshot after a result was deleted, falling back to the previous result."""
+    latest = lock(db, metric)
+    if latest is not None and latest.result_id == result.id:
+        return refresh(db, metric)
+    return latest
+
+def refresh_breach_status(metric: models.Metric):
+    """Re-evaluate the snapshot after the metric thresholds changed."""
+    latest = lock(object_session(metric), metric)
+    if latest is not None:
+        latest.breach_status = breach_status(latest.value, metric.warning_threshold, metric.limit_threshold)
+    return latest
+
+def _latest_rows(db: Session, metric_ids=None):
+    """Latest result of every metric (or of the given metrics) with its thresholds, in one query."""
+    ranked = db.query(
+        models.MetricResult.id,
+        models.MetricResult.metric_id,
+        models.MetricResult.value,
+        models.MetricResult.uploaded_at,
+        func.row_number().over(
+            partition_by=models.MetricResult.metric_id,
+            order_by=(models.MetricResult.uploaded_at.desc(), models.MetricResult.id.desc()),
+        ).label("rank"),
+    )
+    if metric_ids is not None:
+        ranked = ranked.filter(models.MetricResult.metric_id.in_(metric_ids))
+    ranked = ranked.subquery()
+    return (
+        db.query(ranked, models.Metric.warning_threshold, models.Metric.limit_threshold)
+        .join(models.Metric, models.Metric.id == ranked.c.metric_id)
+        .filter(ranked.c.rank == 1)
+    )
+
+def _snapshot_values(row):
+    return dict(
+        result_id=row.id,
+        value=row.value,
+        uploaded_at=row.uploaded_at,
+        breach_status=breach_status(row.value, row.warning_threshold, row.limit_threshold),
+    )
+
+def refresh_many(db: Session, metric_ids):
+    """Recompute the snapshots of many metrics at once, e.g. after a bulk insert."""
+    metric_ids = list(metric_ids)
+    if not metric_ids:
+        return 0
+    existing = _lock(db, metric_ids)
+    count = 0
+    for row in _latest_rows(db, metric_ids):
+        latest = existing.get(row.metric_id)
+        if latest is None:
+            db.add(models.MetricLatest(metric_id=row.metric_id, **_snapshot_values(row)))
+        else:
+            for key, value in _snapshot_values(row).items():
+                setattr(latest, key, value)
+        count += 1
+    return count
+
+def rebuild(db: Session):
+    """Rebuild every snapshot from metric_results with one ranked query (used for backfills)."""
+    db.query(models.MetricLatest).delete(synchronize_session=False)
+    count = 0
+    for row in _latest_rows(db).yield_per(1000):
+        db.add(models.MetricLatest(metric_id=row.metric_id, **_snapshot_values(row)))
+        count += 1
+    return count
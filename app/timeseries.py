@@ -0,0 +1,243 @@
+from datetime import timedelta
+
+from sqlalchemy import DateTime, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Time-series aggregation of metric results. Buckets are computed in the
+# database (date_trunc on PostgreSQL) so only one row per bucket comes back,
+# and long series are reduced to a point budget with LTTB.
+
+BUCKETS = ("minute", "hour", "day", "month")
+DEFAULT_POINTS = 500  # Point budget when no bucket is requested
+OVERSAMPLING = 10  # Buckets fetched per point of the budget before LTTB reduces them
+
+# Approximate bucket widths, used to pick a bucket for a point budget
+BUCKET_WIDTHS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "month": timedelta(days=30),
+}
+
+# strftime patterns truncating a timestamp to a bucket on SQLite, in the
+# storage format SQLAlchemy uses for DateTime columns there
+SQLITE_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00.000000",
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+    "month": "%Y-%m-01 00:00:00.000000",
+}
+
+
+def bucket_expr(dialect_name, bucket, column):
+    """SQL expression truncating a timestamp column to the start of its bucket."""
+    if dialect_name == "postgresql":
+        return func.date_trunc(bucket, column)
+    return type_coerce(func.strftime(SQLITE_FORMATS[bucket], column), DateTime)
+
+
+def _filtered(statement, metric_id, start, end):
+    statement = statement.where(models.MetricResult.metric_id == metric_id)
+    if start is not None:
+        statement = statement.where(models.MetricResult.uploaded_at >= start)
+    if end is not None:
+        statement = statement.where(models.MetricResult.uploaded_at < end)
+    return statement
+
+
+def choose_bucket(db: Session, metric_id, start, end, points):
+    """Smallest bucket that covers the time range in at most OVERSAMPLING * points buckets."""
+    if start is None or end is None:
+        first, last = db.execute(
+            _filtered(
+                select(func.min(models.MetricResult.uploaded_at), func.max(models.MetricResult.uploaded_at)),
+                metric_id, start, end,
+            )
+        ).one()
+        start = start or first
+        end = end or last
+    if start is None or end is None:
+        return BUCKETS[0]
+    span = end - start
+    for bucket in BUCKETS:
+        if span / BUCKET_WIDTHS[bucket] <= points * OVERSAMPLING:
+            return bucket
+    return BUCKETS[-1]
+
+
+def truncate(timestamp, bucket):
+    """Start of the bucket containing a timestamp (same rules as bucket_expr)."""
+    if bucket == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if bucket == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def raw_stats(dialect_name, bucket, metric_ids=None, start=None, end=None):
+    """Select count/sum/min/max/last per (metric_id, bucket) straight from metric_results."""
+    result = models.MetricResult
+    bucket_start = bucket_expr(dialect_name, bucket, result.uploaded_at).label("bucket")
+
+    def filtered(statement):
+        if metric_ids is not None:
+            statement = statement.where(result.metric_id.in_(metric_ids))
+        if start is not None:
+            statement = statement.where(result.uploaded_at >= start)
+        if end is not None:
+            statement = statement.where(result.uploaded_at < end)
+        return statement
+
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+
+        last = array_agg(aggregate_order_by(result.value, result.uploaded_at.desc(), result.id.desc()))[1]
+        return filtered(
+            select(
+                result.metric_id,
+                bucket_start,
+                func.count(result.value).label("count"),
+                func.sum(result.value).label("sum"),
+                func.min(result.value).label("min"),
+                func.max(result.value).label("max"),
+                last.label("last_value"),
+                func.max(result.uploaded_at).label("last_uploaded_at"),
+            )
+        ).group_by(result.metric_id, bucket_start)
+
+    # No ordered aggregates: take the last value of each bucket with a window function
+    ranked = filtered(
+        select(
+            result.metric_id,
+            bucket_start,
+            result.value,
+            result.uploaded_at,
+            func.first_value(result.value).over(
+                partition_by=(result.metric_id, bucket_start),
+                order_by=(result.uploaded_at.desc(), result.id.desc()),
+            ).label("last_value"),
+        )
+    ).subquery()
+    return select(
+        ranked.c.metric_id,
+        ranked.c.bucket,
+        func.count(ranked.c.value).label("count"),
+        func.sum(ranked.c.value).label("sum"),
+        func.min(ranked.c.value).label("min"),
+        func.max(ranked.c.value).label("max"),
+        func.max(ranked.c.last_value).label("last_value"),
+        func.max(ranked.c.uploaded_at).label("last_uploaded_at"),
+    ).group_by(ranked.c.metric_id, ranked.c.bucket)
+
+
+# Rollup table answering each bucket size, maintained by app.rollups
+ROLLUP_TABLES = {
+    "hour": models.MetricRollupHourly,
+    "day": models.MetricRollupDaily,
+}
+
+
+def _aligned(timestamp, bucket):
+    return timestamp is None or truncate(timestamp, bucket) == timestamp
+
+
+def _rollup_source(bucket, start, end):
+    """Coarsest rollup table that answers the query exactly, or None for raw results."""
+    for size in ("day", "hour"):
+        if BUCKETS.index(size) <= BUCKETS.index(bucket) and _aligned(start, size) and _aligned(end, size):
+            return size
+    return None
+
+
+def _point(row):
+    return dict(
+        bucket=row.bucket,
+        count=row.count,
+        min=row.min,
+        max=row.max,
+        avg=row.sum / row.count,
+        last=row.last_value,
+    )
+
+
+def _fold(rows, bucket):
+    """Merge finer rollup rows (ordered by time) into coarser buckets."""
+    points = []
+    for row in rows:
+        start = truncate(row.bucket, bucket)
+        if points and points[-1]["bucket"] == start:
+            point = points[-1]
+            point["count"] += row.count
+            point["sum"] += row.sum
+            point["min"] = min(point["min"], row.min)
+            point["max"] = max(point["max"], row.max)
+            point["last"] = row.last_value
+        else:
+            points.append(dict(bucket=start, count=row.count, sum=row.sum, min=row.min, max=row.max, last=row.last_value))
+    for point in points:
+        point["avg"] = point.pop("sum") / point["count"]
+    return points
+
+
+def aggregate(db: Session, metric_id, bucket, start=None, end=None):
+    """Return count/min/max/avg/last per bucket for a metric, oldest bucket first.
+
+    Served from the coarsest rollup table that covers the bucket when the time
+    range is aligned on its boundaries, from metric_results otherwise.
+    """
+    source = _rollup_source(bucket, start, end)
+    if source is None:
+        statement = raw_stats(db.bind.dialect.name, bucket, [metric_id], start, end)
+        return [_point(row) for row in db.execute(statement.order_by(statement.selected_columns.bucket))]
+
+    table = ROLLUP_TABLES[source]
+    statement = select(table).where(table.metric_id == metric_id).order_by(table.bucket)
+    if start is not None:
+        statement = statement.where(table.bucket >= start)
+    if end is not None:
+        statement = statement.where(table.bucket < end)
+    rows = db.scalars(statement)
+    if source == bucket:
+        return [_point(row) for row in rows]
+    return _fold(rows, bucket)
+
+
+def lttb(points, threshold, x=lambda point: point[0], y=lambda point: point[1]):
+    """Largest-Triangle-Three-Buckets downsampling of an x-sorted sequence.
+
+    Keeps the first and last points and, for each of the threshold - 2 buckets
+    in between, the point forming the largest triangle with the previously
+    kept point and the average of the next bucket.
+    """
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (count - 2) / (threshold - 2)
+    kept = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, count)
+        next_points = points[next_start:next_end]
+        avg_x = sum(x(point) for point in next_points) / len(next_points)
+        avg_y = sum(y(point) for point in next_points) / len(next_points)
+
+        # Point of the current bucket with the largest triangle
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = x(points[kept]), y(points[kept])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y(points[j]) - ay) - (ax - x(points[j])) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        kept = best
+    sampled.append(points[-1])
+    return sampled
@@ -1,9 +1,12 @@
 // Define the API URL where metrics are stored
 const API_URL = "http://127.0.0.1:8000/metrics/";
+// Live changes pushed by the API (Server-Sent Events)
+const EVENTS_URL = "http://127.0.0.1:8000/events";
 
 // Wait for the document (HTML page) to be fully loaded before executing scripts
 document.addEventListener("DOMContentLoaded", () => {
     fetchMetrics(); // Load and display metrics when the page loads
+    listenForChanges(); // Keep the table up to date without reloading it
 
     // Add event listener to handle form submission
     document.getElementById("metric-form").addEventListener("submit", async (e) => {
@@ -41,24 +44,94 @@ async function fetchMetrics() {
 
     // Loop through each metric and add it to the table
     metrics.forEach(metric => {
-        const row = document.createElement("tr"); // Create a new table row
-
-        row.innerHTML = `
-            <td>${metric.id}</td> <!-- Display metric ID -->
-            <td>${metric.name}</td> <!-- Display metric name -->
-            <!-- <td>${metric.value}</td> Display metric value -->
-            <td>${metric.unit || "N/A"}</td> <!-- Display unit, or "N/A" if not provided -->
-            <td>${metric.status}</td> <!-- Display metric status -->
-            <td>${new Date(metric.created_at).toLocaleString()}</td> <!-- Format creation date -->
-            <td>
-                <button onclick="deleteMetric(${metric.id})">❌ Delete</button> <!-- Delete button -->
-            </td>
-        `;
-
-        metricsTableBody.appendChild(row); // Append the row to the table
+        metricsTableBody.appendChild(renderMetricRow(metric)); // Append the row to the table
     });
 }
 
+// Function to build the table row of a metric
+function renderMetricRow(metric) {
+    const row = document.createElement("tr"); // Create a new table row
+    row.dataset.metricId = metric.id; // Lets live events find the row
+
+    row.innerHTML = `
+        <td>${metric.id}</td> <!-- Display metric ID -->
+        <td>${metric.name}</td> <!-- Display metric name -->
+        <!-- <td>${metric.value}</td> Display metric value -->
+        <td>${metric.unit || "N/A"}</td> <!-- Display unit, or "N/A" if not provided -->
+        <td class="latest-value">${formatLatest(metric.latest_value, metric.breach_status)}</td> <!-- Latest result and its breach status -->
+        <td>${metric.status}</td> <!-- Display metric status -->
+        <td>${new Date(metric.created_at).toLocaleString()}</td> <!-- Format creation date -->
+        <td>
+            <button onclick="deleteMetric(${metric.id})">❌ Delete</button> <!-- Delete button -->
+        </td>
+    `;
+    return row;
+}
+
+// Function to format a latest value with its breach status
+function formatLatest(value, breachStatus) {
+    if (value === null || value === undefined) return "N/A"; // No result yet
+    return breachStatus && breachStatus !== "ok" ? `${value} (${breachStatus})` : `${value}`;
+}
+
+// Function to find the table row of a metric
+function findMetricRow(id) {
+    return document.querySelector(`#metrics-table tbody tr[data-metric-id="${id}"]`);
+}
+
+// Function to fetch one metric and insert or replace its row
+async function refreshMetricRow(id) {
+    const response = await fetch(`${API_URL}${id}`); // Send a GET request for the metric
+    if (!response.ok) return; // Deleted in the meantime, its own event removes the row
+    const row = renderMetricRow(await response.json());
+    const existing = findMetricRow(id);
+    if (existing) {
+        existing.replaceWith(row); // Update the row in place
+    } else {
+        document.querySelector("#metrics-table tbody").appendChild(row); // New metric
+    }
+}
+
+// Function to subscribe to the live events and patch the table
+function listenForChanges() {
+    const source = new EventSource(EVENTS_URL); // Reconnects by itself if the connection drops
+    let connectedBefore = false;
+
+    // Changes made while disconnected were missed, reload the table after a reconnect
+    source.addEventListener("open", () => {
+        if (connectedBefore) fetchMetrics();
+        connectedBefore = true;
+    });
+
+    // A new latest value of a metric
+    source.addEventListener("result", (e) => {
+        const event = JSON.parse(e.data);
+        const row = findMetricRow(event.metric_id);
+        if (row) row.querySelector(".latest-value").textContent = formatLatest(event.value, event.breach_status);
+    });
+
+    // A metric's breach status changed
+    source.addEventListener("breach", (e) => {
+        const event = JSON.parse(e.data);
+        const row = findMetricRow(event.metric_id);
+        if (row) row.querySelector(".latest-value").textContent = formatLatest(event.value, event.status);
+    });
+
+    // A metric was created, updated or deleted
+    source.addEventListener("metric", (e) => {
+        const event = JSON.parse(e.data);
+        if (event.action === "deleted") {
+            const row = findMetricRow(event.metric_id);
+            if (row) row.remove(); // Remove the row of the deleted metric
+        } else {
+            refreshMetricRow(event.metric_id); // Fetch the new version of the metric
+        }
+    });
+
+    // Too many changes at once (or events were missed): reload the whole table
+    source.addEventListener("reload", () => fetchMetrics());
+}
+
 // Function to delete a metric by its ID (optional, for later)
 async function deleteMetric(id) {
     if (confirm("Are you sure you want to delete this metric?")) { // Confirm deletion
@@ -0,0 +1,47 @@
+"""hot path indexes
+
+Revision ID: 041c25f7954e
+Revises: db7ba170d889
+Create Date: 2026-10-18 06:54:00.523822
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '041c25f7954e'
+down_revision: Union[str, None] = 'db7ba170d889'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # metric_results can be very large, build its index without blocking writes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_metric_results_metric_id_uploaded_at",
+            "metric_results",
+            ["metric_id", sa.text("uploaded_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_include=["value"],
+            postgresql_concurrently=True,
+        )
+    op.create_index(op.f("ix_metrics_risk_type_id"), "metrics", ["risk_type_id"], unique=False)
+    op.create_index(op.f("ix_metrics_business_unit_id"), "metrics", ["business_unit_id"], unique=False)
+    op.create_index(op.f("ix_risk_types_parent_id"), "risk_types", ["parent_id"], unique=False)
+    op.create_index(op.f("ix_business_units_parent_id"), "business_units", ["parent_id"], unique=False)
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_business_units_parent_id"), table_name="business_units")
+    op.drop_index(op.f("ix_risk_types_parent_id"), table_name="risk_types")
+    op.drop_index(op.f("ix_metrics_business_unit_id"), table_name="metrics")
+    op.drop_index(op.f("ix_metrics_risk_type_id"), table_name="metrics")
+    op.drop_index("ix_metric_results_metric_id_uploaded_at", table_name="metric_results")
+
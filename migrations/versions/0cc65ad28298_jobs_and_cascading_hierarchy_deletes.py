@@ -0,0 +1,62 @@
+"""jobs and cascading hierarchy deletes
+
+Revision ID: 0cc65ad28298
+Revises: 9d598b07ad2a
+Create Date: 2026-10-18 07:27:35.039510
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0cc65ad28298'
+down_revision: Union[str, None] = '9d598b07ad2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Self-referencing foreign keys of the hierarchies (PostgreSQL default names)
+PARENT_KEYS = [
+    ("risk_types", "risk_types_parent_id_fkey"),
+    ("business_units", "business_units_parent_id_fkey"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Background jobs, see app.jobs
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("params", sa.JSON(), nullable=True),
+        sa.Column("progress", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_jobs_id", "jobs", ["id"])
+    op.create_index("ix_jobs_status_created_at", "jobs", ["status", "created_at"])
+
+    # Deleting a hierarchy node deletes its subtree in the database
+    for table, name in PARENT_KEYS:
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(name, table, table, ["parent_id"], ["id"], ondelete="CASCADE")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, name in PARENT_KEYS:
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(name, table, table, ["parent_id"], ["id"])
+    op.drop_index("ix_jobs_status_created_at", table_name="jobs")
+    op.drop_index("ix_jobs_id", table_name="jobs")
+    op.drop_table("jobs")
@@ -0,0 +1,52 @@
+"""metric search
+
+Revision ID: 2bb9ab55b493
+Revises: 562865864ef8
+Create Date: 2026-10-18 07:50:37.088819
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2bb9ab55b493'
+down_revision: Union[str, None] = '562865864ef8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Same expression as app.search.DOCUMENT, queries must repeat it for the index to be used
+SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filters of GET /metrics/search (risk_type_id and business_unit_id are already indexed)
+    op.create_index(op.f("ix_metrics_type"), "metrics", ["type"], unique=False)
+    op.create_index(op.f("ix_metrics_status"), "metrics", ["status"], unique=False)
+    op.create_index(op.f("ix_metrics_created_by"), "metrics", ["created_by"], unique=False)
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    # Text query: full text on name and description, trigrams for substrings
+    # and typos, and lower(name) prefixes for queries too short for trigrams
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"CREATE INDEX ix_metrics_search_document ON metrics USING gin ({SEARCH_DOCUMENT})")
+    op.execute("CREATE INDEX ix_metrics_name_trgm ON metrics USING gin (name gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_metrics_description_trgm ON metrics USING gin (description gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_metrics_name_lower_prefix ON metrics (lower(name) text_pattern_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == "postgresql":
+        op.drop_index("ix_metrics_name_lower_prefix", table_name="metrics")
+        op.drop_index("ix_metrics_description_trgm", table_name="metrics")
+        op.drop_index("ix_metrics_name_trgm", table_name="metrics")
+        op.drop_index("ix_metrics_search_document", table_name="metrics")
+    op.drop_index(op.f("ix_metrics_created_by"), table_name="metrics")
+    op.drop_index(op.f("ix_metrics_status"), table_name="metrics")
+    op.drop_index(op.f("ix_metrics_type"), table_name="metrics")
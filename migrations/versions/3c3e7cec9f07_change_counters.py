@@ -0,0 +1,34 @@
+"""change counters
+
+Revision ID: 3c3e7cec9f07
+Revises: fc349a5201a6
+Create Date: 2026-10-18 07:13:32.788833
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c3e7cec9f07'
+down_revision: Union[str, None] = 'fc349a5201a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Versions of the tables behind the ETags, incremented by app.etags
+    op.create_table(
+        "change_counters",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("change_counters")
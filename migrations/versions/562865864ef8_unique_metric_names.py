@@ -0,0 +1,34 @@
+"""unique metric names
+
+Revision ID: 562865864ef8
+Revises: 0cc65ad28298
+Create Date: 2026-10-18 07:31:17.376293
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '562865864ef8'
+down_revision: Union[str, None] = '0cc65ad28298'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Metric names are the key of catalog imports (INSERT ... ON CONFLICT (name))
+    duplicates = op.get_bind().execute(
+        sa.text("SELECT name FROM metrics GROUP BY name HAVING count(*) > 1 ORDER BY name LIMIT 20")
+    ).scalars().all() if not context.is_offline_mode() else []
+    if duplicates:
+        raise RuntimeError(f"Rename the metrics sharing a name before upgrading: {duplicates}")
+    op.create_unique_constraint("metrics_name_key", "metrics", ["name"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("metrics_name_key", "metrics", type_="unique")
@@ -0,0 +1,94 @@
+"""initial schema
+
+Revision ID: 5c17372d8d21
+Revises: 
+Create Date: 2026-10-18 06:53:58.840109
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c17372d8d21'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "risk_types",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("parent_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["parent_id"], ["risk_types.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index(op.f("ix_risk_types_id"), "risk_types", ["id"], unique=False)
+    op.create_table(
+        "business_units",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("parent_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["parent_id"], ["business_units.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index(op.f("ix_business_units_id"), "business_units", ["id"], unique=False)
+    op.create_table(
+        "metrics",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("level", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("unit", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("warning_threshold", sa.Float(), nullable=True),
+        sa.Column("limit_threshold", sa.Float(), nullable=True),
+        sa.Column("risk_type_id", sa.Integer(), nullable=False),
+        sa.Column("business_unit_id", sa.Integer(), nullable=False),
+        sa.Column("created_by", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["business_unit_id"], ["business_units.id"]),
+        sa.ForeignKeyConstraint(["risk_type_id"], ["risk_types.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_metrics_id"), "metrics", ["id"], unique=False)
+    op.create_table(
+        "metric_results",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("uploaded_by", sa.String(), nullable=True),
+        sa.Column("uploaded_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_metric_results_id"), "metric_results", ["id"], unique=False)
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_metric_results_id"), table_name="metric_results")
+    op.drop_table("metric_results")
+    op.drop_index(op.f("ix_metrics_id"), table_name="metrics")
+    op.drop_table("metrics")
+    op.drop_index(op.f("ix_business_units_id"), table_name="business_units")
+    op.drop_table("business_units")
+    op.drop_index(op.f("ix_risk_types_id"), table_name="risk_types")
+    op.drop_table("risk_types")
+
@@ -0,0 +1,133 @@
+"""partition metric results
+
+Revision ID: 9d598b07ad2a
+Revises: 3c3e7cec9f07
+Create Date: 2026-10-18 07:21:27.880086
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d598b07ad2a'
+down_revision: Union[str, None] = '3c3e7cec9f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Partition of a month, same naming as app.partitions
+CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    month timestamp;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce((SELECT min(uploaded_at) FROM metric_results_legacy WHERE uploaded_at > '1970-01-01'), now())),
+            date_trunc('month', now()) + interval '3 months',
+            interval '1 month'
+        )
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF metric_results FOR VALUES FROM (%L) TO (%L)',
+            'metric_results_p' || to_char(month, 'YYYYMM'), month, month + interval '1 month'
+        );
+    END LOOP;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("metrics", sa.Column("retention_days", sa.Integer(), nullable=True))
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    # Range partitioning of metric_results on uploaded_at, one partition per
+    # month plus a default partition for anything outside of them. The
+    # partition key has to be part of the primary key, ids stay unique
+    # through the shared sequence. The rows are copied in this transaction,
+    # plan downtime for large tables.
+    op.execute("ALTER TABLE metric_results RENAME TO metric_results_legacy")
+    op.execute("ALTER TABLE metric_results_legacy RENAME CONSTRAINT metric_results_pkey TO metric_results_legacy_pkey")
+    op.execute("ALTER TABLE metric_results_legacy RENAME CONSTRAINT metric_results_metric_id_fkey TO metric_results_legacy_metric_id_fkey")
+    op.drop_index("ix_metric_results_id", table_name="metric_results_legacy")
+    op.drop_index("ix_metric_results_metric_id_uploaded_at", table_name="metric_results_legacy")
+    op.drop_index("ix_metric_results_uploaded_at_id", table_name="metric_results_legacy")
+    # The partition key can't be NULL, undated results go to the default
+    # partition. 1970-01-01 is app.partitions.UNDATED: the retention skips
+    # those rows, they are never purged however old the cutoff.
+    op.execute("UPDATE metric_results_legacy SET uploaded_at = '1970-01-01' WHERE uploaded_at IS NULL")
+
+    op.execute(
+        """
+        CREATE TABLE metric_results (
+            id integer NOT NULL DEFAULT nextval('metric_results_id_seq'),
+            metric_id integer NOT NULL REFERENCES metrics (id) ON DELETE CASCADE,
+            value double precision NOT NULL,
+            uploaded_by varchar,
+            uploaded_at timestamp without time zone NOT NULL DEFAULT now(),
+            CONSTRAINT metric_results_pkey PRIMARY KEY (id, uploaded_at)
+        ) PARTITION BY RANGE (uploaded_at)
+        """
+    )
+    op.execute(CREATE_MONTHLY_PARTITIONS)
+    op.execute("CREATE TABLE metric_results_default PARTITION OF metric_results DEFAULT")
+    op.create_index(
+        "ix_metric_results_metric_id_uploaded_at",
+        "metric_results",
+        ["metric_id", sa.text("uploaded_at DESC"), sa.text("id DESC")],
+        postgresql_include=["value"],
+    )
+    op.create_index("ix_metric_results_uploaded_at_id", "metric_results", ["uploaded_at", "id"])
+
+    op.execute(
+        """
+        INSERT INTO metric_results (id, metric_id, value, uploaded_by, uploaded_at)
+        SELECT id, metric_id, value, uploaded_by, uploaded_at FROM metric_results_legacy
+        """
+    )
+    op.execute("ALTER SEQUENCE metric_results_id_seq OWNED BY metric_results.id")
+    op.drop_table("metric_results_legacy")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == "postgresql":
+        op.execute("ALTER TABLE metric_results RENAME TO metric_results_partitioned")
+        op.execute("ALTER TABLE metric_results_partitioned RENAME CONSTRAINT metric_results_pkey TO metric_results_partitioned_pkey")
+        op.drop_index("ix_metric_results_metric_id_uploaded_at", table_name="metric_results_partitioned")
+        op.drop_index("ix_metric_results_uploaded_at_id", table_name="metric_results_partitioned")
+        op.execute(
+            """
+            CREATE TABLE metric_results (
+                id integer NOT NULL DEFAULT nextval('metric_results_id_seq'),
+                metric_id integer NOT NULL REFERENCES metrics (id) ON DELETE CASCADE,
+                value double precision NOT NULL,
+                uploaded_by varchar,
+                uploaded_at timestamp without time zone,
+                CONSTRAINT metric_results_pkey PRIMARY KEY (id)
+            )
+            """
+        )
+        op.execute(
+            """
+            INSERT INTO metric_results (id, metric_id, value, uploaded_by, uploaded_at)
+            SELECT id, metric_id, value, uploaded_by, uploaded_at FROM metric_results_partitioned
+            """
+        )
+        op.execute("ALTER SEQUENCE metric_results_id_seq OWNED BY metric_results.id")
+        op.drop_table("metric_results_partitioned")
+        op.create_index("ix_metric_results_id", "metric_results", ["id"])
+        op.create_index(
+            "ix_metric_results_metric_id_uploaded_at",
+            "metric_results",
+            ["metric_id", sa.text("uploaded_at DESC"), sa.text("id DESC")],
+            postgresql_include=["value"],
+        )
+        op.create_index("ix_metric_results_uploaded_at_id", "metric_results", ["uploaded_at", "id"])
+    op.drop_column("metrics", "retention_days")
@@ -0,0 +1,35 @@
+"""results keyset index
+
+Revision ID: ba5c2daab7ec
+Revises: 041c25f7954e
+Create Date: 2026-10-18 06:56:30.711671
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ba5c2daab7ec'
+down_revision: Union[str, None] = '041c25f7954e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_metric_results_uploaded_at_id",
+            "metric_results",
+            ["uploaded_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_metric_results_uploaded_at_id", table_name="metric_results")
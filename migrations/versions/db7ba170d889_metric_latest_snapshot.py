@@ -0,0 +1,62 @@
+"""metric latest snapshot
+
+Revision ID: db7ba170d889
+Revises: 5c17372d8d21
+Create Date: 2026-10-18 06:53:59.688385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'db7ba170d889'
+down_revision: Union[str, None] = '5c17372d8d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "metric_latest",
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("result_id", sa.Integer(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("uploaded_at", sa.DateTime(), nullable=True),
+        sa.Column("breach_status", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("metric_id"),
+    )
+
+    # Backfill from the existing history, same rules as app.snapshots.breach_status
+    op.execute(
+        """
+        INSERT INTO metric_latest (metric_id, result_id, value, uploaded_at, breach_status)
+        SELECT DISTINCT ON (r.metric_id)
+            r.metric_id, r.id, r.value, r.uploaded_at,
+            CASE
+                WHEN m.limit_threshold IS NOT NULL AND (
+                    (m.warning_threshold IS NOT NULL AND m.limit_threshold < m.warning_threshold AND r.value <= m.limit_threshold)
+                    OR (NOT (m.warning_threshold IS NOT NULL AND m.limit_threshold < m.warning_threshold) AND r.value >= m.limit_threshold)
+                ) THEN 'breach'
+                WHEN m.warning_threshold IS NOT NULL AND (
+                    (m.limit_threshold IS NOT NULL AND m.limit_threshold < m.warning_threshold AND r.value <= m.warning_threshold)
+                    OR (NOT (m.limit_threshold IS NOT NULL AND m.limit_threshold < m.warning_threshold) AND r.value >= m.warning_threshold)
+                ) THEN 'warning'
+                ELSE 'ok'
+            END
+        FROM metric_results r
+        JOIN metrics m ON m.id = r.metric_id
+        ORDER BY r.metric_id, r.uploaded_at DESC, r.id DESC
+        """
+    )
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("metric_latest")
+
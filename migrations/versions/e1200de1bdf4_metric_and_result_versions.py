@@ -0,0 +1,86 @@
+"""metric and result versions
+
+Revision ID: e1200de1bdf4
+Revises: 2bb9ab55b493
+Create Date: 2026-10-18 07:56:40.180622
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1200de1bdf4'
+down_revision: Union[str, None] = '2bb9ab55b493'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing results keep no recorded_at (they count as recorded at
+    # uploaded_at), only the new ones get the default. On SQLite, where a
+    # column can't be added with a non-constant default, it stays NULL for
+    # results inserted outside the ORM
+    op.add_column("metric_results", sa.Column("recorded_at", sa.DateTime(), nullable=True))
+    if op.get_context().dialect.name == "postgresql":
+        op.alter_column("metric_results", "recorded_at", server_default=sa.text("now()"))
+
+    op.create_table(
+        "metric_versions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("level", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("unit", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("warning_threshold", sa.Float(), nullable=True),
+        sa.Column("limit_threshold", sa.Float(), nullable=True),
+        sa.Column("retention_days", sa.Integer(), nullable=True),
+        sa.Column("risk_type_id", sa.Integer(), nullable=False),
+        sa.Column("business_unit_id", sa.Integer(), nullable=False),
+        sa.Column("created_by", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("valid_from", sa.DateTime(), nullable=False),
+        sa.Column("valid_to", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_metric_versions_metric_id_valid_from", "metric_versions", ["metric_id", "valid_from"], unique=False)
+    op.create_index("ix_metric_versions_valid_to_valid_from", "metric_versions", ["valid_to", "valid_from"], unique=False)
+
+    op.create_table(
+        "metric_result_versions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("result_id", sa.Integer(), nullable=False),
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("uploaded_by", sa.String(), nullable=True),
+        sa.Column("uploaded_at", sa.DateTime(), nullable=False),
+        sa.Column("valid_from", sa.DateTime(), nullable=False),
+        sa.Column("valid_to", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_metric_result_versions_metric_id_uploaded_at",
+        "metric_result_versions",
+        ["metric_id", sa.text("uploaded_at DESC"), sa.text("result_id DESC")],
+        unique=False,
+    )
+    op.create_index("ix_metric_result_versions_result_id_valid_from", "metric_result_versions", ["result_id", "valid_from"], unique=False)
+    op.create_index("ix_metric_result_versions_valid_to_valid_from", "metric_result_versions", ["valid_to", "valid_from"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_metric_result_versions_valid_to_valid_from", table_name="metric_result_versions")
+    op.drop_index("ix_metric_result_versions_result_id_valid_from", table_name="metric_result_versions")
+    op.drop_index("ix_metric_result_versions_metric_id_uploaded_at", table_name="metric_result_versions")
+    op.drop_table("metric_result_versions")
+    op.drop_index("ix_metric_versions_valid_to_valid_from", table_name="metric_versions")
+    op.drop_index("ix_metric_versions_metric_id_valid_from", table_name="metric_versions")
+    op.drop_table("metric_versions")
+    op.drop_column("metric_results", "recorded_at")
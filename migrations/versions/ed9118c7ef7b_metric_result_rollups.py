@@ -0,0 +1,55 @@
+"""metric result rollups
+
+Revision ID: ed9118c7ef7b
+Revises: ba5c2daab7ec
+Create Date: 2026-10-18 06:59:02.312973
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ed9118c7ef7b'
+down_revision: Union[str, None] = 'ba5c2daab7ec'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fill them with `python -m scripts.rebuild_rollups` after upgrading
+    op.create_table(
+        "metric_result_rollups_hourly",
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("bucket", sa.DateTime(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sum", sa.Float(), nullable=False),
+        sa.Column("min", sa.Float(), nullable=False),
+        sa.Column("max", sa.Float(), nullable=False),
+        sa.Column("last_value", sa.Float(), nullable=False),
+        sa.Column("last_uploaded_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("metric_id", "bucket"),
+    )
+    op.create_table(
+        "metric_result_rollups_daily",
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("bucket", sa.DateTime(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sum", sa.Float(), nullable=False),
+        sa.Column("min", sa.Float(), nullable=False),
+        sa.Column("max", sa.Float(), nullable=False),
+        sa.Column("last_value", sa.Float(), nullable=False),
+        sa.Column("last_uploaded_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("metric_id", "bucket"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("metric_result_rollups_daily")
+    op.drop_table("metric_result_rollups_hourly")
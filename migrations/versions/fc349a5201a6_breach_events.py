@@ -0,0 +1,53 @@
+"""breach events
+
+Revision ID: fc349a5201a6
+Revises: ed9118c7ef7b
+Create Date: 2026-10-18 07:10:42.390785
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc349a5201a6'
+down_revision: Union[str, None] = 'ed9118c7ef7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "breach_events",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("metric_id", sa.Integer(), nullable=False),
+        sa.Column("result_id", sa.Integer(), nullable=True),
+        sa.Column("previous_status", sa.String(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.ForeignKeyConstraint(["metric_id"], ["metrics.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_breach_events_id", "breach_events", ["id"])
+    op.create_index(
+        "ix_breach_events_metric_id_created_at",
+        "breach_events",
+        ["metric_id", sa.text("created_at DESC")],
+    )
+    op.create_index(
+        "ix_breach_events_undelivered",
+        "breach_events",
+        ["id"],
+        postgresql_where=sa.text("delivered_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("breach_events")
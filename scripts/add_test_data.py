@@ -1,21 +1,142 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import Metrics
 
-def insert_test_data():
-    db: Session = SessionLocal()
+from app import config, etags, models, rollups, snapshots
+from app.database import Base, SessionLocal, engine
+
+# Synthetic data for benchmarks: a risk type tree and a business unit tree,
+# metrics spread over their nodes and a history of results per metric. The
+# same --seed always produces the same data. Run it on an empty database
+# (`python -m scripts.init_db`, or --create-tables on a SQLite stand-in):
+#
+#   EGRC_DATABASE_URL=sqlite:///bench.db python -m scripts.add_test_data --create-tables \
+#       --metrics 5000 --results-per-metric 400
+#
+# The snapshots and rollups are rebuilt at the end, as after any bulk load.
+
+CHUNK_SIZE = 10000
+
+
+def _tree(db: Session, model, prefix, depth, fanout):
+    """Create a tree of `depth` levels with `fanout` children per node, return the leaf ids."""
+    level_nodes = [None]
+    for level in range(1, depth + 1):
+        nodes = []
+        for parent in level_nodes:
+            for i in range(fanout if parent is not None else max(1, fanout // 2)):
+                name = f"{prefix} {parent.name.split(' ', 1)[1]}.{i + 1}" if parent is not None else f"{prefix} {i + 1}"
+                nodes.append(model(level=level, name=name, parent=parent))
+        db.add_all(nodes)
+        level_nodes = nodes
+    db.flush()
+    return [node.id for node in level_nodes]
+
+
+def _results(rng, metric_id, count, days, now):
+    """A random walk of `count` results over the last `days` days."""
+    step = timedelta(days=days) / count
+    value = rng.uniform(0, 100)
+    for i in range(count):
+        value = min(100.0, max(0.0, value + rng.gauss(0, 3)))
+        yield dict(
+            metric_id=metric_id,
+            value=round(value, 3),
+            uploaded_by="generator",
+            uploaded_at=now - step * (count - i),
+        )
 
-    new_metric = Metrics(
-        name="CPU Usage",
-        value=75.3
-    )
 
-    db.add(new_metric)
+def generate(db: Session, risk_depth=3, risk_fanout=4, bu_depth=3, bu_fanout=4, metrics=1000,
+             results_per_metric=100, days=365, seed=42):
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1) if seed is not None else datetime.now()
+
+    risk_type_ids = _tree(db, models.RiskType, "Risk", risk_depth, risk_fanout)
+    business_unit_ids = _tree(db, models.BusinessUnit, "BU", bu_depth, bu_fanout)
+
+    metric_rows = []
+    for i in range(metrics):
+        warning = rng.choice([60.0, 70.0, 80.0])
+        metric_rows.append(dict(
+            name=f"Metric {i + 1}",
+            type=rng.choice(["KRI", "KPI", "KCI"]),
+            level=str(rng.randint(1, 3)),
+            unit="%",
+            status="active",
+            warning_threshold=warning,
+            limit_threshold=warning + 10,
+            risk_type_id=rng.choice(risk_type_ids),
+            business_unit_id=rng.choice(business_unit_ids),
+            created_by="generator",
+            created_at=now,
+            updated_at=now,
+        ))
+    metric_ids = list(db.scalars(
+        insert(models.Metric).returning(models.Metric.id, sort_by_parameter_order=True), metric_rows
+    ))
+    etags.touch(db, "metrics")
+    db.commit()
+
+    inserted = 0
+    chunk = []
+    for metric_id in metric_ids:
+        chunk.extend(_results(rng, metric_id, results_per_metric, days, now))
+        if len(chunk) >= CHUNK_SIZE:
+            db.execute(insert(models.MetricResult), chunk)
+            db.commit()
+            inserted += len(chunk)
+            chunk = []
+            print(f"  {inserted} results", end="\r", flush=True)
+    if chunk:
+        db.execute(insert(models.MetricResult), chunk)
+        inserted += len(chunk)
     db.commit()
-    db.refresh(new_metric)
-    print(f"✅ Inserted metric: {new_metric.id} - {new_metric.name} = {new_metric.value}")
+    print()
+
+    snapshots.rebuild(db)
+    rollups.rebuild(db)
+    etags.touch(db, "metric_results")
+    db.commit()
+    return dict(
+        risk_types=db.query(models.RiskType).count(),
+        business_units=db.query(models.BusinessUnit).count(),
+        metrics=len(metric_ids),
+        results=inserted,
+    )
 
-    db.close()
 
 if __name__ == "__main__":
-    insert_test_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--risk-depth", type=int, default=3)
+    parser.add_argument("--risk-fanout", type=int, default=4)
+    parser.add_argument("--bu-depth", type=int, default=3)
+    parser.add_argument("--bu-fanout", type=int, default=4)
+    parser.add_argument("--metrics", type=int, default=1000)
+    parser.add_argument("--results-per-metric", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365, help="Time span of the results")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--create-tables", action="store_true", help="Create the tables without migrations (SQLite stand-in)")
+    args = parser.parse_args()
+
+    # Generated history, not live status changes
+    config.BREACH_EVENTS_ENABLED = False
+    if args.create_tables:
+        Base.metadata.create_all(engine)
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        counts = generate(
+            db, args.risk_depth, args.risk_fanout, args.bu_depth, args.bu_fanout,
+            args.metrics, args.results_per_metric, args.days, args.seed,
+        )
+        print(f"✅ Inserted {counts} in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        db.rollback()
+        print("❌ Test data generation failed:", e)
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+import argparse
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import api, config, ingest, models, schemas
+from app.notifications import notifier
+
+# Cost of breach evaluation and event recording on the write path. Results
+# are ingested with EGRC_BREACH_EVENTS_ENABLED off and on, through the single
+# result handler and through bulk ingest, with values alternating across the
+# thresholds so that (with alerting on) every result changes the status. The
+# notification worker runs with a no-op subscriber, as it would in the API.
+#
+#   python -m scripts.bench_alerting --results 2000 --bulk-rows 50000
+#
+# By default it runs on a throwaway SQLite database file, pass
+# --database-url to measure against PostgreSQL (it creates and deletes its
+# own risk type, business unit and metric).
+
+VALUES = (1.0, 7.0, 12.0)  # ok, warning, breach against the thresholds below
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary(latencies):
+    return {
+        "mean": round(statistics.mean(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def single_results(Session, metric_id, count):
+    latencies = []
+    for i in range(count):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            api.create_metric_result_for_specific_metric(
+                schemas.MetricResultCreate(value=VALUES[i % len(VALUES)], uploaded_by="bench"), metric_id, db
+            )
+            latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return {"results": count, "latency_ms": summary(latencies)}
+
+
+def bulk_results(Session, metric_id, rows):
+    lines = "".join(
+        json.dumps({"metric_id": metric_id, "value": VALUES[i % len(VALUES)]}) + "\n" for i in range(rows)
+    )
+    db = Session()
+    try:
+        response = ingest.ingest(db, "ndjson", io.BytesIO(lines.encode()))
+    finally:
+        db.close()
+    return {"rows": response.inserted, "elapsed_seconds": response.elapsed_seconds, "rows_per_second": response.rows_per_second}
+
+
+def run(database_url, results, bulk_rows):
+    if database_url.startswith("sqlite"):
+        engine = create_engine(database_url, connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(engine)
+    else:
+        engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    risk_type = models.RiskType(level=1, name=f"bench-alerting-{time.time_ns()}")
+    business_unit = models.BusinessUnit(level=1, name=risk_type.name)
+    db.add_all([risk_type, business_unit])
+    db.flush()
+    metric = models.Metric(
+        name=risk_type.name, type="KRI", level="1", warning_threshold=5, limit_threshold=10,
+        risk_type_id=risk_type.id, business_unit_id=business_unit.id,
+    )
+    db.add(metric)
+    db.commit()
+    metric_id, risk_type_id, business_unit_id = metric.id, risk_type.id, business_unit.id
+    db.close()
+
+    notifier.session_factory = Session
+    notifier.subscribe(lambda events: None)
+    notifier.start()
+    report = {"database": engine.dialect.name}
+    try:
+        for enabled in (False, True):
+            config.BREACH_EVENTS_ENABLED = enabled
+            report["alerting_on" if enabled else "alerting_off"] = {
+                "single": single_results(Session, metric_id, results),
+                "bulk": bulk_results(Session, metric_id, bulk_rows),
+            }
+    finally:
+        notifier.stop()
+        db = Session()
+        db.query(models.BreachEvent).filter(models.BreachEvent.metric_id == metric_id).delete()
+        db.delete(db.get(models.Metric, metric_id))
+        db.flush()
+        db.delete(db.get(models.RiskType, risk_type_id))
+        db.delete(db.get(models.BusinessUnit, business_unit_id))
+        db.commit()
+        db.close()
+    report["notifications"] = notifier.snapshot()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--results", type=int, default=1000, help="Results posted one by one per run")
+    parser.add_argument("--bulk-rows", type=int, default=20000, help="Rows of the bulk ingest per run")
+    args = parser.parse_args()
+    if args.database_url:
+        report = run(args.database_url, args.results, args.bulk_rows)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            report = run(f"sqlite:///{os.path.join(directory, 'bench.db')}", args.results, args.bulk_rows)
+    print(json.dumps(report, indent=2))
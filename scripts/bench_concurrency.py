@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+# Throughput of a running API under high concurrency, to compare
+# EGRC_DB_MODE=sync and EGRC_DB_MODE=async. Start the server in one mode, run
+#
+#   python -m scripts.bench_concurrency --concurrency 500 --duration 30
+#
+# then restart it in the other mode and run it again.
+
+DEFAULT_PATHS = ["/metrics/", "/metrics/1", "/metrics/1/results/latest/", "/risk_types/"]
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def worker(client, paths, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(base_url, paths, concurrency, duration):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+    return {
+        "base_url": base_url,
+        "paths": paths,
+        "concurrency": concurrency,
+        "duration_seconds": duration,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            "p95": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            "p99": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--path", action="append", dest="paths", help="Path to request (repeatable)")
+    args = parser.parse_args()
+    report = asyncio.run(run(args.base_url, args.paths or DEFAULT_PATHS, args.concurrency, args.duration))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,87 @@
+import argparse
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from pydantic import TypeAdapter
+
+from app import queries, schemas, serialization
+
+# Serialization cost of a /metrics/ listing, per path:
+#
+#   pydantic  - a MetricResponse per row, validated again against
+#               response_model and encoded with the stdlib json module
+#               (what FastAPI does for a handler returning models)
+#   adapter   - plain row dicts validated and dumped by one TypeAdapter
+#               (app.serialization without orjson)
+#   orjson    - plain row dicts dumped by orjson (app.serialization)
+#
+#   python -m scripts.bench_serialization --rows 10000 --rows 100000
+#
+# Rows are generated in memory, the database is not involved.
+
+Row = namedtuple("Row", [column.name for column in queries.metric_rows().selected_columns])
+
+
+def make_rows(count):
+    now = datetime(2025, 1, 1, 12, 30, 15, 123456)
+    return [
+        Row(
+            id=i, name=f"Metric {i}", type="KRI", level=str(i % 4 + 1), description="Synthetic metric",
+            unit="%", status="active", warning_threshold=50.0, limit_threshold=80.0, retention_days=None,
+            risk_type_id=i % 20 + 1, risk_type=f"Risk type {i % 20 + 1}",
+            business_unit_id=i % 50 + 1, business_unit=f"Business unit {i % 50 + 1}",
+            latest_value=(i * 7.3) % 100, breach_status="ok", created_by="bench",
+            created_at=now, updated_at=now + timedelta(seconds=i),
+        )
+        for i in range(count)
+    ]
+
+
+def pydantic_path(rows):
+    content = [schemas.MetricResponse(**serialization.metric_row(row)) for row in rows]
+    adapter = TypeAdapter(list[schemas.MetricResponse])
+    validated = adapter.validate_python(content, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json"), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def adapter_path(rows):
+    orjson, serialization.orjson = serialization.orjson, None
+    try:
+        return serialization.dumps([serialization.metric_row(row) for row in rows], list[schemas.MetricResponse])
+    finally:
+        serialization.orjson = orjson
+
+
+def orjson_path(rows):
+    return serialization.dumps([serialization.metric_row(row) for row in rows], list[schemas.MetricResponse])
+
+
+PATHS = {"pydantic": pydantic_path, "adapter": adapter_path, "orjson": orjson_path}
+
+
+def run(row_counts, repeat):
+    report = {"orjson_installed": serialization.orjson is not None, "runs": []}
+    for count in row_counts:
+        rows = make_rows(count)
+        result = {"rows": count}
+        for name, path in PATHS.items():
+            if name == "orjson" and serialization.orjson is None:
+                continue
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                body = path(rows)
+                timings.append(time.perf_counter() - started)
+            result[name] = {"best_ms": round(min(timings) * 1000, 1), "bytes": len(body)}
+        report["runs"].append(result)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, action="append", help="Payload size in rows (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows or [10000, 100000], args.repeat), indent=2))
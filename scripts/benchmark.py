@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+from datetime import datetime
+from urllib.parse import quote
+
+import httpx
+
+from app import api
+from scripts.bench_concurrency import run
+
+# Latency and throughput of every GET endpoint of app/api.py against a running
+# server, one endpoint at a time. Path parameters are filled with random ids
+# of existing metrics, risk types and business units, so load the database
+# with scripts.add_test_data first:
+#
+#   EGRC_DATABASE_URL=sqlite:///bench.db python -m scripts.add_test_data --create-tables
+#   EGRC_DATABASE_URL=sqlite:///bench.db uvicorn app.main:app --workers 4
+#   python -m scripts.benchmark --concurrency 50 --duration 10 --output results.json
+#
+# The report is JSON (p50/p95/p99 latency, requests per second and errors per
+# endpoint, plus the git commit and settings of the run). Pass a previous
+# report as --baseline to flag endpoints whose p95 got worse by more than
+# --tolerance; the exit status is 1 when there are regressions.
+
+SKIPPED_PREFIXES = ("/status/", "/events")  # Monitoring endpoints and the live event stream, not part of the API load
+ID_SOURCES = {"/metrics/": "/metrics/", "/risk_types/": "/risk_types/", "/business_units/": "/business_units/"}
+PATHS_PER_ENDPOINT = 200  # Distinct concrete paths (random ids) cycled per endpoint
+SEARCH_PATH = "/metrics/search"  # Benchmarked as a typeahead: name prefixes of random metrics
+
+
+def endpoints():
+    """Path templates of the GET routes of app.api."""
+    return [
+        route.path
+        for route in api.router.routes
+        if "GET" in route.methods and not route.path.startswith(SKIPPED_PREFIXES)
+    ]
+
+
+def fetch_ids(base_url):
+    ids = {}
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        for prefix, path in ID_SOURCES.items():
+            response = client.get(path)
+            rows = response.json() if response.status_code == 200 else []
+            ids[prefix] = [row["id"] for row in rows]
+            if prefix == "/metrics/":
+                ids[SEARCH_PATH] = [row["name"] for row in rows]
+    return ids
+
+
+def concrete_paths(template, ids, rng):
+    if template == SEARCH_PATH:
+        names = ids.get(SEARCH_PATH) or ["a"]
+        return [
+            f"{template}?limit=10&q={quote(name[:rng.randint(1, 6)])}"
+            for name in (rng.choice(names) for _ in range(PATHS_PER_ENDPOINT))
+        ]
+    if "{" not in template:
+        return [template]
+    prefix = next((prefix for prefix in ID_SOURCES if template.startswith(prefix)), None)
+    candidates = ids.get(prefix) or [1]
+    return [re.sub(r"\{[^}]+\}", str(rng.choice(candidates)), template) for _ in range(PATHS_PER_ENDPOINT)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(base_url, concurrency, duration, only=None, seed=42):
+    rng = random.Random(seed)
+    ids = fetch_ids(base_url)
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "base_url": base_url,
+        "concurrency": concurrency,
+        "duration_seconds": duration,
+        "dataset": {prefix.strip("/"): len(ids[prefix]) for prefix in ID_SOURCES},
+        "endpoints": {},
+    }
+    for template in endpoints():
+        if only and not any(pattern in template for pattern in only):
+            continue
+        result = asyncio.run(run(base_url, concrete_paths(template, ids, rng), concurrency, duration))
+        report["endpoints"][template] = {
+            key: result[key] for key in ("requests", "errors", "requests_per_second", "latency_ms")
+        }
+        print(f"{template:50} {result['requests_per_second']:>9} req/s  p95 {result['latency_ms']['p95']} ms", file=sys.stderr)
+    return report
+
+
+def regressions(report, baseline, tolerance):
+    """Endpoints whose p95 latency grew by more than `tolerance` (a fraction) over the baseline."""
+    found = []
+    for template, result in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(template)
+        if not before or not before["latency_ms"]["p95"] or result["latency_ms"]["p95"] is None:
+            continue
+        ratio = result["latency_ms"]["p95"] / before["latency_ms"]["p95"]
+        if ratio > 1 + tolerance:
+            found.append({
+                "endpoint": template,
+                "baseline_p95_ms": before["latency_ms"]["p95"],
+                "p95_ms": result["latency_ms"]["p95"],
+                "ratio": round(ratio, 2),
+            })
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per endpoint")
+    parser.add_argument("--endpoint", action="append", dest="only", help="Only endpoints containing this text (repeatable)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Previous JSON report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 increase over the baseline")
+    args = parser.parse_args()
+
+    report = benchmark(args.base_url, args.concurrency, args.duration, args.only, args.seed)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = regressions(report, json.load(f), args.tolerance)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(1 if report.get("regressions") else 0)
@@ -1,7 +1,9 @@
-from app.database import engine, Base
-from app import models  # ✅ Make sure this is imported!
+from alembic import command
+from alembic.config import Config
 
-Base.metadata.drop_all(bind=engine)  # Drop tables (caution: deletes data)
-Base.metadata.create_all(bind=engine)  # Recreate tables
+# Rebuild the schema through the migration chain (caution: deletes data)
+config = Config("alembic.ini")
+command.downgrade(config, "base")  # Drop tables
+command.upgrade(config, "head")  # Recreate tables
 
 print("✅ Tables dropped and recreated successfully!")
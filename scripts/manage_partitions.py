@@ -0,0 +1,20 @@
+import json
+
+from app.database import SessionLocal
+from app import partitions
+
+# Partition maintenance of metric_results, meant to run daily (cron, systemd
+# timer): creates the partitions of the coming months (EGRC_PARTITION_MONTHS_AHEAD),
+# drops or archives the partitions past EGRC_RESULTS_RETENTION_DAYS and deletes
+# the expired results of the metrics with their own retention_days.
+db = SessionLocal()
+
+try:
+    report = partitions.run_maintenance(db)
+    db.commit()
+    print("✅ Partition maintenance done:", json.dumps(report))
+except Exception as e:
+    db.rollback()
+    print("❌ Partition maintenance failed:", e)
+finally:
+    db.close()
@@ -0,0 +1,18 @@
+from app.database import SessionLocal
+from app import config, snapshots
+
+# Rebuild the metric_latest snapshot table from the full metric_results history
+db = SessionLocal()
+
+# Rebuilt snapshots are not status changes, don't record breach events for them
+config.BREACH_EVENTS_ENABLED = False
+
+try:
+    count = snapshots.rebuild(db)
+    db.commit()
+    print(f"✅ Rebuilt latest value snapshot for {count} metrics")
+except Exception as e:
+    db.rollback()
+    print("❌ Snapshot rebuild failed:", e)
+finally:
+    db.close()
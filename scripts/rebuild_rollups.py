@@ -0,0 +1,19 @@
+import sys
+
+from app.database import SessionLocal
+from app import rollups
+
+# Rebuild the hourly and daily rollups of metric_results, for all metrics or
+# for the metric ids given on the command line
+metric_ids = [int(arg) for arg in sys.argv[1:]] or None
+db = SessionLocal()
+
+try:
+    rollups.rebuild(db, metric_ids)
+    db.commit()
+    print(f"✅ Rebuilt rollups for {'all metrics' if metric_ids is None else len(metric_ids)} metrics")
+except Exception as e:
+    db.rollback()
+    print("❌ Rollup rebuild failed:", e)
+finally:
+    db.close()
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import cache, database, models
+from app.api import router
+from app.database import get_db, get_read_db
+
+# The API on an in-memory SQLite database (one connection shared by the
+# sessions), created from the models. Tests needing PostgreSQL features
+# (plans, partitions) use EGRC_TEST_DATABASE_URL and are skipped without it.
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    event.listen(engine, "connect", database._sqlite_foreign_keys)  # ON DELETE CASCADE, as in the app
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+@pytest.fixture
+def client(session_factory):
+    def get_session():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = get_session
+    app.dependency_overrides[get_read_db] = get_session
+    cache.backend.clear()  # Per process, not per database
+    yield TestClient(app)
+    cache.backend.clear()
+
+
+@contextmanager
+def count_queries(engine):
+    """Collect the SQL statements sent to the database in the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,68 @@
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app import config, deletes
+
+# As-of views of a time before a metric was deleted still show the metric
+# and its results, whether it was deleted in the request or by the job.
+
+
+def _metric_with_results(client, values):
+    risk_type = client.post("/risk_types/", json={"level": 1, "name": "Credit"}).json()
+    business_unit = client.post("/business_units/", json={"level": 1, "name": "Retail"}).json()
+    metric = client.post("/metrics/", json={
+        "name": "Exposure",
+        "type": "KRI",
+        "level": 1,
+        "warning_threshold": 5,
+        "limit_threshold": 8,
+        "risk_type_id": risk_type["id"],
+        "business_unit_id": business_unit["id"],
+    }).json()
+    for value in values:
+        response = client.post(f"/metrics/{metric['id']}/results/", json={"value": value})
+        assert response.status_code == 200, response.text
+    time.sleep(0.01)
+    before_delete = datetime.now().isoformat()
+    time.sleep(0.01)
+    return metric["id"], before_delete
+
+
+def _assert_shown_as_of(client, metric_id, before_delete, values):
+    assert client.get(f"/metrics/{metric_id}").status_code == 404
+
+    listing = client.get("/metrics/", params={"as_of": before_delete}).json()
+    assert [metric["id"] for metric in listing] == [metric_id]
+    assert listing[0]["name"] == "Exposure"
+    assert listing[0]["latest_value"] == values[-1]
+
+    metric = client.get(f"/metrics/{metric_id}", params={"as_of": before_delete})
+    assert metric.status_code == 200, metric.text
+    results = client.get(f"/metrics/{metric_id}/results/", params={"as_of": before_delete}).json()
+    assert sorted(result["value"] for result in results) == sorted(values)
+
+
+def test_deleted_metric_as_of_before_delete(client):
+    values = [1.0, 6.0, 9.0]
+    metric_id, before_delete = _metric_with_results(client, values)
+
+    assert client.delete(f"/metrics/{metric_id}").status_code == 200
+
+    _assert_shown_as_of(client, metric_id, before_delete, values)
+
+
+def test_metric_deleted_by_job_as_of_before_delete(client, session_factory, monkeypatch):
+    values = [1.0, 2.0, 3.0, 4.0, 9.0]
+    metric_id, before_delete = _metric_with_results(client, values)
+    monkeypatch.setattr(config, "DELETE_CHUNK_SIZE", 2)
+
+    db = session_factory()
+    try:
+        job = SimpleNamespace(params={"metric_id": metric_id})
+        result = deletes._delete_metric_job(db, job, lambda fraction: None)
+    finally:
+        db.close()
+
+    assert result == {"metric_id": metric_id, "results_deleted": len(values)}
+    _assert_shown_as_of(client, metric_id, before_delete, values)
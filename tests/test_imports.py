@@ -0,0 +1,69 @@
+import io
+
+import openpyxl
+
+from app import imports
+
+# Catalog imports from Excel: the header row maps the columns (in any order,
+# padded names trimmed), empty cells keep the stored values, empty rows are
+# skipped, and the response is the diff report against the stored catalog.
+
+
+def _workbook(rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _import(client, kind, rows, **params):
+    response = client.post(
+        f"/import/{kind}", content=_workbook(rows), params=params, headers={"content-type": imports.XLSX},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _reference_data(client):
+    report = _import(client, "risk_types", [
+        ["name", "level", "parent"],
+        ["Operational", 1, None],
+        ["Fraud", 2, "Operational"],
+    ])
+    assert report["created_names"] == ["Operational", "Fraud"]
+    _import(client, "business_units", [["name", "level"], ["Retail", 1]])
+
+
+def test_xlsx_import_creates_then_reports_the_diff(client):
+    _reference_data(client)
+    header = [" name ", "risk_type", "business_unit", "type", "level", "unit", "warning_threshold", "limit_threshold", None]
+    report = _import(client, "metrics", [
+        header,
+        ["Card fraud losses", "Fraud", "Retail", "KRI", 2, "EUR", 1000, 5000.5, "ignored, no header"],
+        [None] * len(header),
+        ["Phishing incidents", "Fraud", "Retail", "KRI", 2, "count", None, 20, None],
+        ["Unknown", "Market", "Retail", "KRI", 1, None, None, None, None],
+    ])
+    assert report["received"] == 3  # The empty row is skipped
+    assert report["created"] == 2
+    assert report["created_names"] == ["Card fraud losses", "Phishing incidents"]
+    assert report["errors"] == [{"row": 3, "error": "Unknown risk type 'Market'"}]
+
+    metrics = {metric["name"]: metric for metric in client.get("/metrics/").json()}
+    card = metrics["Card fraud losses"]
+    assert (card["level"], card["unit"], card["warning_threshold"], card["limit_threshold"]) == (2, "EUR", 1000, 5000.5)
+    assert card["risk_type"] == "Fraud"
+    assert metrics["Phishing incidents"]["warning_threshold"] is None
+
+    # Empty cells keep the stored values, only the filled ones are compared
+    report = _import(client, "metrics", [
+        ["name", "risk_type", "business_unit", "type", "level", "unit", "limit_threshold"],
+        ["Card fraud losses", "Fraud", "Retail", "KRI", 2, None, 6000],
+        ["Phishing incidents", "Fraud", "Retail", "KRI", 2, None, 20],
+    ], dry_run=True)
+    assert (report["dry_run"], report["created"], report["updated"], report["unchanged"]) == (True, 0, 1, 1)
+    assert report["updates"] == [{"name": "Card fraud losses", "changes": {"limit_threshold": [5000.5, 6000.0]}}]
+    assert client.get(f"/metrics/{card['id']}").json()["limit_threshold"] == 5000.5  # Dry run, nothing written
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from app import models
+
+# The hot queries of app/api.py are planned on the indexes of the migrations,
+# not on sequential scans and sorts. Needs a PostgreSQL database that may be
+# migrated to head: EGRC_TEST_DATABASE_URL. Sequential and bitmap scans are
+# disabled for the session, so the check holds on an empty database too: if
+# a usable index exists the planner picks it. On the partitioned
+# metric_results, the partitions' indexes count as the parent's.
+
+DATABASE_URL = os.getenv("EGRC_TEST_DATABASE_URL", "")
+
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL.startswith("postgresql"), reason="EGRC_TEST_DATABASE_URL is not a PostgreSQL database"
+)
+
+SAMPLE_ID = 1
+
+# name: (statement, index it must be planned on)
+QUERIES = {
+    "results for a metric": (
+        select(models.MetricResult)
+        .where(models.MetricResult.metric_id == SAMPLE_ID)
+        .order_by(models.MetricResult.uploaded_at.desc()),
+        "ix_metric_results_metric_id_uploaded_at",
+    ),
+    "latest result for a metric": (
+        select(models.MetricResult)
+        .where(models.MetricResult.metric_id == SAMPLE_ID)
+        .order_by(models.MetricResult.uploaded_at.desc(), models.MetricResult.id.desc())
+        .limit(1),
+        "ix_metric_results_metric_id_uploaded_at",
+    ),
+    "results page": (
+        select(models.MetricResult).order_by(models.MetricResult.uploaded_at, models.MetricResult.id).limit(1000),
+        "ix_metric_results_uploaded_at_id",
+    ),
+    "metrics by risk type": (
+        select(models.Metric.id).where(models.Metric.risk_type_id == SAMPLE_ID),
+        "ix_metrics_risk_type_id",
+    ),
+    "metrics by business unit": (
+        select(models.Metric.id).where(models.Metric.business_unit_id == SAMPLE_ID),
+        "ix_metrics_business_unit_id",
+    ),
+    "risk type children": (
+        select(models.RiskType.id).where(models.RiskType.parent_id == SAMPLE_ID),
+        "ix_risk_types_parent_id",
+    ),
+    "business unit children": (
+        select(models.BusinessUnit.id).where(models.BusinessUnit.parent_id == SAMPLE_ID),
+        "ix_business_units_parent_id",
+    ),
+}
+
+INDEX_SCANS = ("Index Scan", "Index Only Scan")
+
+# An index and the indexes it is a partition of
+INDEX_ANCESTORS = text("""
+    WITH RECURSIVE chain AS (
+        SELECT oid, relname FROM pg_class WHERE relname = :name AND relkind IN ('i', 'I')
+        UNION ALL
+        SELECT parent.oid, parent.relname
+        FROM chain
+        JOIN pg_inherits ON pg_inherits.inhrelid = chain.oid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    )
+    SELECT relname FROM chain
+""")
+
+
+@pytest.fixture(scope="module")
+def connection():
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        env={**os.environ, "EGRC_DATABASE_URL": DATABASE_URL},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+    )
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as connection:
+        connection.execute(text("SET enable_seqscan = off"))
+        connection.execute(text("SET enable_bitmapscan = off"))
+        yield connection
+    engine.dispose()
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_hot_query_uses_index(connection, name):
+    statement, index = QUERIES[name]
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    plan = connection.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(_plan_nodes(plan[0]["Plan"]))
+
+    problems = [node["Node Type"] for node in nodes if node["Node Type"] in ("Seq Scan", "Sort", "Bitmap Heap Scan")]
+    assert not problems, f"{name}: {problems} in {plan}"
+    scans = [node for node in nodes if "Index Name" in node]
+    assert scans, f"{name}: no index used in {plan}"
+    for node in scans:
+        assert node["Node Type"] in INDEX_SCANS, f"{name}: {node['Node Type']} on {node['Index Name']}"
+        indexes = set(connection.execute(INDEX_ANCESTORS, {"name": node["Index Name"]}).scalars())
+        assert index in indexes, f"{name}: planned on {node['Index Name']}, expected {index}"
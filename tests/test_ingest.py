@@ -0,0 +1,55 @@
+import json
+
+from app import ingest
+
+# JSON array bodies of POST /results/bulk are parsed one element at a time:
+# elements split across reads come out whole, and a syntax error after the
+# first element is reported as a row error, the rows before it ingested.
+
+
+def _metric(client):
+    risk_type = client.post("/risk_types/", json={"level": 1, "name": "Credit"}).json()
+    business_unit = client.post("/business_units/", json={"level": 1, "name": "Retail"}).json()
+    return client.post("/metrics/", json={
+        "name": "Exposure",
+        "type": "KRI",
+        "level": 1,
+        "risk_type_id": risk_type["id"],
+        "business_unit_id": business_unit["id"],
+    }).json()["id"]
+
+
+def _post(client, body):
+    return client.post("/results/bulk", content=body, headers={"content-type": "application/json"})
+
+
+def test_json_array_read_in_pieces(client, monkeypatch):
+    monkeypatch.setattr(ingest, "READ_SIZE", 3)
+    metric_id = _metric(client)
+    rows = [{"metric_id": metric_id, "value": 1000.0 + index, "uploaded_by": "feed"} for index in range(50)]
+    rows.append({"metric_id": metric_id + 1, "value": 1.0})
+
+    report = _post(client, json.dumps(rows, indent=2)).json()
+
+    assert report["received"] == 51
+    assert report["inserted"] == 50
+    assert report["errors"] == [{"row": 50, "error": f"Metric {metric_id + 1} not found"}]
+    values = sorted(result["value"] for result in client.get(f"/metrics/{metric_id}/results/").json())
+    assert values == [1000.0 + index for index in range(50)]
+
+
+def test_json_syntax_error_ends_the_body(client):
+    metric_id = _metric(client)
+    body = f'[{{"metric_id": {metric_id}, "value": 1}}, {{"metric_id": {metric_id}, value: 2}}, {{"value": 3}}]'
+
+    report = _post(client, body).json()
+
+    assert report["inserted"] == 1
+    assert [error["row"] for error in report["errors"]] == [1]
+    assert report["errors"][0]["error"].startswith("Invalid JSON")
+
+
+def test_json_body_not_an_array(client):
+    response = _post(client, '{"metric_id": 1, "value": 1}')
+    assert response.status_code == 400
+    assert response.json()["detail"] == "JSON body must be an array of results"
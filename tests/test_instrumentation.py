@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import instrumentation
+
+# The request stats count the rows actually read (drivers report no rowcount
+# for SELECTs) and written, and a failed statement doesn't leave its start
+# time behind on the connection.
+
+
+@contextmanager
+def _request_stats():
+    stats = instrumentation.RequestStats()
+    token = instrumentation._current.set(stats)
+    try:
+        yield stats
+    finally:
+        instrumentation._current.reset(token)
+
+
+@pytest.fixture
+def instrumented(engine):
+    instrumentation.instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE numbers (value INTEGER)"))
+        conn.execute(text("INSERT INTO numbers VALUES (1), (2), (3), (4), (5)"))
+    return engine
+
+
+def test_rows_read_are_counted_as_fetched(instrumented):
+    with _request_stats() as stats, instrumented.connect() as conn:
+        assert len(conn.execute(text("SELECT value FROM numbers")).all()) == 5
+        result = conn.execute(text("SELECT value FROM numbers"))
+        result.fetchmany(2)
+        result.close()
+    assert stats.queries == 2
+    assert stats.rows == 7
+
+
+def test_rows_written_are_counted(instrumented):
+    with _request_stats() as stats, instrumented.begin() as conn:
+        conn.execute(text("UPDATE numbers SET value = value + 1 WHERE value > 2"))
+    assert stats.rows == 3
+
+
+def test_failed_statement_is_popped(instrumented):
+    with _request_stats() as stats, instrumented.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        assert conn.info["query_started"] == []
+        conn.execute(text("SELECT 1")).all()
+        assert conn.info["query_started"] == []
+    assert stats.queries == 2
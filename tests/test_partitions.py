@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app import models, partitions
+
+# Partition maintenance on the partitioned metric_results: a month partition
+# is created even if the default partition holds rows of that month (they
+# move into it), and the global retention never purges undated results.
+# Needs a PostgreSQL database that may be migrated to head:
+# EGRC_TEST_DATABASE_URL. Each test runs in a transaction rolled back at the
+# end, the partitions it creates (in 2100) included.
+
+DATABASE_URL = os.getenv("EGRC_TEST_DATABASE_URL", "")
+
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL.startswith("postgresql"), reason="EGRC_TEST_DATABASE_URL is not a PostgreSQL database"
+)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        env={**os.environ, "EGRC_DATABASE_URL": DATABASE_URL},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        check=True,
+    )
+    engine = create_engine(DATABASE_URL)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        db = Session(bind=connection, join_transaction_mode="create_savepoint")
+        yield db
+        db.close()
+        transaction.rollback()
+
+
+@pytest.fixture
+def metric(db):
+    risk_type = models.RiskType(level=1, name="Partitions test")
+    business_unit = models.BusinessUnit(level=1, name="Partitions test")
+    metric = models.Metric(name="Partitions test", type="KRI", level=1, risk_type=risk_type, business_unit=business_unit)
+    db.add(metric)
+    db.flush()
+    return metric
+
+
+def _partition_of(db, result_id):
+    return db.execute(
+        text("SELECT tableoid::regclass::text FROM metric_results WHERE id = :id"), {"id": result_id}
+    ).scalar()
+
+
+def test_new_partition_takes_the_rows_of_the_default_partition(db, metric):
+    stranded = models.MetricResult(metric_id=metric.id, value=1.0, uploaded_at=datetime(2100, 1, 15))
+    db.add(stranded)
+    db.flush()
+    assert _partition_of(db, stranded.id) == "metric_results_default"
+
+    created = partitions.ensure_partitions(db, months_ahead=0, now=datetime(2100, 1, 1))
+
+    assert created == ["metric_results_p210001"]
+    assert _partition_of(db, stranded.id) == "metric_results_p210001"
+    attached = db.execute(text(
+        "SELECT 1 FROM pg_inherits WHERE inhrelid = 'metric_results_default'::regclass "
+        "AND inhparent = 'metric_results'::regclass"
+    )).first()
+    assert attached is not None
+
+
+def test_global_retention_keeps_undated_results(db, metric):
+    undated = models.MetricResult(metric_id=metric.id, value=1.0, uploaded_at=partitions.UNDATED)
+    expired = models.MetricResult(metric_id=metric.id, value=2.0, uploaded_at=datetime(1970, 6, 1))
+    db.add_all([undated, expired])
+    db.flush()
+
+    # Cutoff at the end of 1970: no monthly partition is that old, only the default partition's rows expire
+    partitions.apply_global_retention(db, retention_days=1, mode="drop", now=datetime(1971, 1, 1))
+
+    remaining = set(db.scalars(text("SELECT id FROM metric_results WHERE metric_id = :id"), {"id": metric.id}))
+    assert remaining == {undated.id}
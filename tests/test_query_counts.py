@@ -0,0 +1,65 @@
+from conftest import count_queries
+
+# GET /metrics/ and GET /metrics/{id} read metrics, their risk type and
+# business unit names and their latest values in a fixed number of
+# statements, whatever the size of the catalog and of the result history
+# (no lazy loads per metric or per result).
+
+
+def _reference_data(client):
+    risk_type = client.post("/risk_types/", json={"level": 1, "name": "Credit"}).json()
+    business_unit = client.post("/business_units/", json={"level": 1, "name": "Retail"}).json()
+    return risk_type["id"], business_unit["id"]
+
+
+def _add_metrics(client, references, count, results=3, start=0):
+    risk_type_id, business_unit_id = references
+    ids = []
+    for index in range(start, start + count):
+        response = client.post("/metrics/", json={
+            "name": f"Metric {index}",
+            "type": "KRI",
+            "level": 1,
+            "warning_threshold": 5,
+            "limit_threshold": 8,
+            "risk_type_id": risk_type_id,
+            "business_unit_id": business_unit_id,
+        })
+        assert response.status_code == 200, response.text
+        metric_id = response.json()["id"]
+        for value in range(results):
+            client.post(f"/metrics/{metric_id}/results/", json={"value": float(value)})
+        ids.append(metric_id)
+    return ids
+
+
+def _queries(engine, client, path):
+    with count_queries(engine) as statements:
+        response = client.get(path)
+    assert response.status_code == 200, response.text
+    return statements
+
+
+def test_metric_listing_query_count_is_constant(engine, client):
+    references = _reference_data(client)
+    _add_metrics(client, references, 1)
+    few = _queries(engine, client, "/metrics/")
+
+    _add_metrics(client, references, 25, start=1)
+    many = _queries(engine, client, "/metrics/")
+
+    assert len(client.get("/metrics/").json()) == 26
+    assert len(many) == len(few), many
+
+
+def test_metric_query_count_is_constant(engine, client):
+    references = _reference_data(client)
+    (short,) = _add_metrics(client, references, 1, results=1)
+    few = _queries(engine, client, f"/metrics/{short}")
+
+    (long,) = _add_metrics(client, references, 1, results=40, start=1)
+    _add_metrics(client, references, 10, start=2)
+    many = _queries(engine, client, f"/metrics/{long}")
+
+    assert client.get(f"/metrics/{long}").json()["latest_value"] == 39.0
+    assert len(many) == len(few), many
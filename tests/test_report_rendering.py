@@ -0,0 +1,59 @@
+import io
+from datetime import datetime
+
+import openpyxl
+
+from app import report_rendering
+
+# Excel board pack sections load back with the metrics, their chart points,
+# and a line chart per metric with history reading that metric's rows of the
+# History sheet (metrics without history have neither).
+
+
+def _metric(metric_id, name, history, **fields):
+    metric = dict(
+        id=metric_id, name=name, type="KRI", level=1, unit=None, status="active", warning_threshold=None,
+        limit_threshold=None, latest_value=None, breach_status=None, business_unit="Retail", history=history,
+    )
+    metric.update(fields)
+    return metric
+
+
+SECTION = dict(
+    title="Credit",
+    part=1,
+    parts=1,
+    period=["2026-01-01", "2026-01-10"],
+    metrics=[
+        _metric(1, "Exposure", [["2026-01-01", 1.0], ["2026-01-02", 2.0], ["2026-01-03", 9.0]],
+                unit="%", warning_threshold=5, limit_threshold=8, latest_value=9.0, breach_status="breach"),
+        _metric(2, "New metric", []),
+        _metric(3, "Defaults", [["2026-01-05", 2.0], ["2026-01-06", 3.0]], latest_value=3.0, breach_status="ok"),
+    ],
+)
+
+
+def test_xlsx_section_loads_back():
+    workbook = openpyxl.load_workbook(io.BytesIO(report_rendering.render(SECTION, "xlsx")))
+    assert workbook.sheetnames == ["Metrics", "History", "Charts"]
+
+    summary = list(workbook["Metrics"].values)
+    assert summary[0] == report_rendering.COLUMNS
+    assert summary[1] == ("Retail", 1, "Exposure", "KRI", 1, "%", "active", 5, 8, 9, "breach")
+    assert summary[2][-1] == "no_data"
+
+    history = list(workbook["History"].values)
+    assert history[1:] == [
+        (1, "Exposure", datetime(2026, 1, 1), 1),
+        (1, "Exposure", datetime(2026, 1, 2), 2),
+        (1, "Exposure", datetime(2026, 1, 3), 9),
+        (3, "Defaults", datetime(2026, 1, 5), 2),
+        (3, "Defaults", datetime(2026, 1, 6), 3),
+    ]
+
+    charts = workbook["Charts"]._charts
+    references = [(chart.series[0].val.numRef.f, chart.series[0].cat.numRef.f) for chart in charts]
+    assert references == [
+        ("'History'!$D$2:$D$4", "'History'!$C$2:$C$4"),
+        ("'History'!$D$5:$D$6", "'History'!$C$5:$C$6"),
+    ]
@@ -0,0 +1,32 @@
+# Every metric response goes through serialization.metric_row: the hierarchy
+# listings, and the metric returned by create and update, are the same as in
+# GET /metrics/ and GET /metrics/{id}.
+
+
+def test_metric_responses_match_the_listing(client):
+    credit = client.post("/risk_types/", json={"level": 1, "name": "Credit"}).json()
+    retail_credit = client.post("/risk_types/", json={"level": 2, "name": "Retail credit", "parent_id": credit["id"]}).json()
+    market = client.post("/risk_types/", json={"level": 1, "name": "Market"}).json()
+    retail = client.post("/business_units/", json={"level": 1, "name": "Retail"}).json()
+    created = []
+    for name, risk_type in (("Defaults", retail_credit), ("Exposure", credit), ("VaR", market)):
+        response = client.post("/metrics/", json={
+            "name": name, "type": "KRI", "level": 2, "limit_threshold": 8,
+            "risk_type_id": risk_type["id"], "business_unit_id": retail["id"],
+        })
+        assert response.status_code == 200, response.text
+        created.append(response.json())
+    client.post(f"/metrics/{created[0]['id']}/results/", json={"value": 9.0})
+
+    listing = client.get("/metrics/").json()
+    assert created[1] == listing[1]
+    assert created[1]["level"] == 2 and created[1]["latest_value"] == 0.0
+
+    updated = client.put(f"/metrics/{created[0]['id']}", json={"unit": "%"})
+    assert updated.status_code == 200, updated.text
+    assert updated.json() == client.get(f"/metrics/{created[0]['id']}").json()
+    assert updated.json()["breach_status"] == "breach"
+
+    listing = client.get("/metrics/").json()
+    assert client.get(f"/risk_types/{credit['id']}/metrics").json() == listing[:2]
+    assert client.get(f"/business_units/{retail['id']}/metrics").json() == listing